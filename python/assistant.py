@@ -0,0 +1,273 @@
+import time, random, asyncio, threading
+
+from resilience import call, call_async
+
+
+class RunFailedError(Exception):
+    """
+    Assistant Run이 completed 이외의 종료 상태로 끝났거나 제한 시간을 넘겼을 때 발생.
+    """
+    def __init__(self, message, run=None):
+        super().__init__(message)
+        self.run = run
+
+
+# Run이 더 이상 진행되지 않는 상태들
+TERMINAL_STATUSES = {"completed", "failed", "cancelled", "expired", "incomplete"}
+
+
+class RunWaitStats:
+    """
+    Run 대기에 대한 누적 지표 (run 수, 폴링 횟수, 대기 시간).
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.runs = 0
+        self.polls = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.failures = 0
+
+    def record(self, polls, wait_seconds, failed=False):
+        with self._lock:
+            self.runs += 1
+            self.polls += polls
+            self.wait_seconds += wait_seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, wait_seconds)
+            if failed:
+                self.failures += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "runs": self.runs,
+                "polls": self.polls,
+                "avg_polls": self.polls / self.runs if self.runs else 0.0,
+                "wait_seconds": self.wait_seconds,
+                "avg_wait_seconds": self.wait_seconds / self.runs if self.runs else 0.0,
+                "max_wait_seconds": self.max_wait_seconds,
+                "failures": self.failures,
+            }
+
+
+run_wait_stats = RunWaitStats()
+
+
+def wait_for_run(client, thread_id, run, initial_delay=0.5, max_delay=5.0, multiplier=1.6,
+                 jitter=0.25, timeout=120.0, stats=run_wait_stats):
+    """
+    지수 백오프(+지터)로 Run 상태를 조회하며 종료될 때까지 기다린다.
+    Args:
+        client: OpenAI 클라이언트.
+        thread_id (str): Thread ID.
+        run: runs.create가 반환한 Run 객체.
+        timeout (float): 최대 대기 시간(초). 넘기면 Run을 취소하고 RunFailedError 발생.
+    Returns:
+        Run: completed 상태의 Run 객체.
+    Raises:
+        RunFailedError: failed/cancelled/expired/incomplete/requires_action 상태 또는 시간 초과.
+    """
+    started = time.monotonic()
+    deadline = started + timeout
+    delay = initial_delay
+    polls = 0
+    try:
+        while run.status not in TERMINAL_STATUSES:
+            if run.status == "requires_action":
+                # 이 Assistant는 function tool을 쓰지 않으므로 처리할 수 없는 상태다
+                _cancel_quietly(client, thread_id, run)
+                raise RunFailedError(f"Run {run.id}이 requires_action 상태입니다 (지원하지 않는 tool 호출).", run)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                _cancel_quietly(client, thread_id, run)
+                raise RunFailedError(f"Run {run.id}이 {timeout}초 안에 끝나지 않았습니다 (status={run.status}).", run)
+            time.sleep(min(delay * random.uniform(1 - jitter, 1 + jitter), remaining))
+            delay = min(delay * multiplier, max_delay)
+            # 상태 조회는 여러 번 보내도 안전하므로 일시적인 오류는 재시도한다
+            run = call("openai", lambda: client.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run.id))
+            polls += 1
+        if run.status != "completed":
+            error = getattr(run, "last_error", None)
+            raise RunFailedError(f"Run {run.id}이 {run.status} 상태로 종료되었습니다: {error}", run)
+    except RunFailedError:
+        if stats is not None:
+            stats.record(polls, time.monotonic() - started, failed=True)
+        raise
+    if stats is not None:
+        stats.record(polls, time.monotonic() - started)
+    return run
+
+
+async def wait_for_run_async(async_client, thread_id, run, initial_delay=0.5, max_delay=5.0, multiplier=1.6,
+                             jitter=0.25, timeout=120.0, stats=run_wait_stats):
+    """
+    wait_for_run의 비동기 버전 (AsyncOpenAI 클라이언트 사용, 대기 중 이벤트 루프를 막지 않음).
+    """
+    started = time.monotonic()
+    deadline = started + timeout
+    delay = initial_delay
+    polls = 0
+    try:
+        while run.status not in TERMINAL_STATUSES:
+            if run.status == "requires_action":
+                await _cancel_quietly_async(async_client, thread_id, run)
+                raise RunFailedError(f"Run {run.id}이 requires_action 상태입니다 (지원하지 않는 tool 호출).", run)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                await _cancel_quietly_async(async_client, thread_id, run)
+                raise RunFailedError(f"Run {run.id}이 {timeout}초 안에 끝나지 않았습니다 (status={run.status}).", run)
+            await asyncio.sleep(min(delay * random.uniform(1 - jitter, 1 + jitter), remaining))
+            delay = min(delay * multiplier, max_delay)
+            run = await call_async("openai", lambda: async_client.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run.id))
+            polls += 1
+        if run.status != "completed":
+            error = getattr(run, "last_error", None)
+            raise RunFailedError(f"Run {run.id}이 {run.status} 상태로 종료되었습니다: {error}", run)
+    except RunFailedError:
+        if stats is not None:
+            stats.record(polls, time.monotonic() - started, failed=True)
+        raise
+    if stats is not None:
+        stats.record(polls, time.monotonic() - started)
+    return run
+
+
+def stream_run(client, thread_id, assistant_id, stats=run_wait_stats, **run_kwargs):
+    """
+    스트리밍 Runs API로 Run을 실행하고, 답변이 생성되는 즉시 최종 텍스트를 반환한다.
+    폴링이 필요 없으므로 polls는 0으로 기록한다. run_kwargs(response_format 등)는 Run 생성 인자로 전달된다.
+    """
+    started = time.monotonic()
+    try:
+        with client.beta.threads.runs.stream(thread_id=thread_id, assistant_id=assistant_id, **run_kwargs) as stream:
+            stream.until_done()
+            run = stream.get_final_run()
+            if run.status != "completed":
+                raise RunFailedError(f"Run {run.id}이 {run.status} 상태로 종료되었습니다: {run.last_error}", run)
+            messages = stream.get_final_messages()
+    except Exception:
+        if stats is not None:
+            stats.record(0, time.monotonic() - started, failed=True)
+        raise
+    if stats is not None:
+        stats.record(0, time.monotonic() - started)
+    texts = [
+        content.text.value
+        for message in messages if message.role == "assistant"
+        for content in message.content if content.type == "text"
+    ]
+    return run, "\n".join(texts)
+
+
+def _cancel_quietly(client, thread_id, run):
+    try:
+        client.beta.threads.runs.cancel(thread_id=thread_id, run_id=run.id)
+    except Exception as e:
+        print(f"Run 취소 실패: {e}")
+
+
+async def _cancel_quietly_async(async_client, thread_id, run):
+    try:
+        await async_client.beta.threads.runs.cancel(thread_id=thread_id, run_id=run.id)
+    except Exception as e:
+        print(f"Run 취소 실패: {e}")
+
+
+class AssistantThreadPool:
+    """
+    Assistant Thread를 빌려 주는 풀.
+
+    영수증마다 하나의 Thread를 독점적으로 빌려 쓰고(동시에 두 Run이 같은 Thread를 쓰지 않음),
+    max_runs_per_thread 번 사용한 Thread는 삭제(retire)하고 새로 만든다.
+    덕분에 Thread가 끝없이 커지지 않고 동시 처리 중인 영수증끼리 답변이 섞이지 않는다.
+    """
+    def __init__(self, get_client, max_runs_per_thread=20, max_idle=8):
+        self._get_client = get_client  # 클라이언트를 돌려주는 함수 (공유 클라이언트 레지스트리)
+        self.max_runs_per_thread = max_runs_per_thread
+        self.max_idle = max_idle
+        self._idle = []  # [(thread_id, 사용 횟수)]
+        self._lock = threading.Lock()
+        self.stats = {"created": 0, "reused": 0, "retired": 0}
+
+    def acquire(self):
+        with self._lock:
+            if self._idle:
+                self.stats["reused"] += 1
+                return self._idle.pop()
+        thread = self._get_client().beta.threads.create()
+        with self._lock:
+            self.stats["created"] += 1
+        return thread.id, 0
+
+    def release(self, thread_id, runs, healthy=True):
+        """
+        사용이 끝난 Thread를 반납. 사용 횟수를 넘었거나 Run이 실패한 Thread는 폐기한다.
+        """
+        with self._lock:
+            keep = healthy and runs < self.max_runs_per_thread and len(self._idle) < self.max_idle
+            if keep:
+                self._idle.append((thread_id, runs))
+                return
+            self.stats["retired"] += 1
+        self._retire(thread_id)
+
+    def lease(self):
+        return _ThreadLease(self)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+            self.stats["retired"] += len(idle)
+        for thread_id, _ in idle:
+            self._retire(thread_id)
+
+    def _retire(self, thread_id):
+        try:
+            self._get_client().beta.threads.delete(thread_id)
+        except Exception as e:
+            print(f"Thread 삭제 실패 ({thread_id}): {e}")
+
+
+class _ThreadLease:
+    """
+    with pool.lease() as lease: 형태로 Thread(lease.thread_id)를 빌리고 자동으로 반납한다.
+    Run을 만들 때마다 lease.record_run()을 불러 다시 묻기까지 Thread 사용 횟수에 넣는다.
+    """
+    def __init__(self, pool):
+        self._pool = pool
+        self.thread_id = None
+        self.runs = 0
+
+    def record_run(self):
+        self.runs += 1
+
+    def __enter__(self):
+        self.thread_id, self.runs = self._pool.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._pool.release(self.thread_id, self.runs, healthy=exc_type is None)
+        return False
+
+
+def get_run_reply(client, thread_id, run_id):
+    """
+    해당 Run이 생성한 assistant 메시지만 가져와 텍스트로 반환한다.
+    Thread 전체를 나열하지 않으므로 Thread 길이와 무관하게 한 번의 작은 조회로 끝난다.
+    """
+    messages = client.beta.threads.messages.list(thread_id=thread_id, run_id=run_id, order="asc")
+    return _reply_text(messages.data)
+
+
+async def get_run_reply_async(async_client, thread_id, run_id):
+    messages = await async_client.beta.threads.messages.list(thread_id=thread_id, run_id=run_id, order="asc")
+    return _reply_text(messages.data)
+
+
+def _reply_text(messages):
+    texts = [
+        content.text.value
+        for message in messages if message.role == "assistant"
+        for content in message.content if content.type == "text"
+    ]
+    return "\n".join(texts)
@@ -0,0 +1,185 @@
+"""
+영수증 비동기 파이프라인. OCR/검색/비목 판단은 AsyncOpenAI와 aiohttp로, S3와 캐시 같은 동기 작업은
+전용 스레드 풀에서 실행하여 한 프로세스에서 수십 건을 동시에 처리한다.
+
+사용 예:
+    python async_pipeline.py ../image --max-in-flight 24
+    RECEIPT-ASYNC=1 python slack_noti.py   # Slack 봇이 AsyncReceiptRunner로 처리
+"""
+import os, sys, time, asyncio, argparse, threading
+from pathlib import Path
+import config  # .env는 config에서 한 번만 읽는다
+
+from async_utils import (
+    get_http_session, close_http_session, download_file_async, upload_to_s3_async, add_receipt_to_notion_async,
+    run_blocking,
+)
+from notion_sink import receipt_hash
+from utils import ReceiptFile, read_file_bytes
+from worker import QueueFullError
+
+MAX_IN_FLIGHT = int(os.getenv("RECEIPT-MAX-IN-FLIGHT", "24"))  # 동시에 처리할 영수증 수
+RECEIPT_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".heic", ".pdf")
+
+
+async def process_local_receipt_async(image_path):
+    """
+    이미 내려받은 영수증(경로 또는 ReceiptFile)을 처리. S3 업로드는 OCR/분류 체인과 동시에 진행한다.
+    Returns:
+        dict: 체인 결과 (ocr_response, business_category, assistant_response).
+    """
+    # 체인(langchain 등)은 처음 처리할 때 불러온다 (봇 시작 시간을 늘리지 않도록)
+    from pipeline import get_receipt_chain
+    if not isinstance(image_path, ReceiptFile):
+        image_path = Path(image_path)
+    chain_task = asyncio.create_task(get_receipt_chain().ainvoke({"image_path": image_path}))
+    upload_task = asyncio.create_task(upload_to_s3_async(image_path, image_path.name))
+    result, s3_file_url = await asyncio.gather(chain_task, upload_task)
+    file_bytes = await run_blocking(read_file_bytes, image_path)
+    await add_receipt_to_notion_async(
+        result['ocr_response'], s3_file_url, result['business_category'], result['assistant_response'],
+        key=receipt_hash(None, file_bytes),
+    )
+    return result
+
+
+async def process_receipt_async(file_url, file_name, SLACK_BOT_TOKEN):
+    """
+    Slack 파일 URL에서 영수증을 메모리로 내려받아 처리하는 비동기 파이프라인.
+    """
+    session = await get_http_session()
+    receipt_file = await download_file_async(session, file_url, file_name, SLACK_BOT_TOKEN)
+    if receipt_file is None:
+        raise RuntimeError(f"파일 다운로드에 실패했습니다: {file_url}")
+    try:
+        print(f"파일 '{receipt_file.name}'을 성공적으로 다운로드했습니다. ({receipt_file.size:,} bytes)")
+        return await process_local_receipt_async(receipt_file)
+    finally:
+        receipt_file.close()
+
+
+async def process_many_async(image_paths, max_in_flight=MAX_IN_FLIGHT):
+    """
+    여러 영수증을 최대 max_in_flight건까지 동시에 처리. 실패한 영수증은 예외 객체로 반환된다.
+    """
+    semaphore = asyncio.Semaphore(max_in_flight)
+
+    async def run(image_path):
+        async with semaphore:
+            return await process_local_receipt_async(image_path)
+
+    try:
+        return await asyncio.gather(*(run(path) for path in image_paths), return_exceptions=True)
+    finally:
+        await close_http_session()
+
+
+class AsyncReceiptRunner:
+    """
+    백그라운드 스레드의 이벤트 루프에서 영수증 코루틴을 최대 max_in_flight건까지 동시에 실행 (Slack 봇용).
+    ReceiptWorkerPool과 같은 방식으로, 대기 중인 작업이 max_pending건이면 submit이 QueueFullError를 발생시킨다.
+    """
+    def __init__(self, max_in_flight=MAX_IN_FLIGHT, max_pending=100):
+        self.max_in_flight = max_in_flight
+        self.max_pending = max_pending
+        self._loop = None
+        self._thread = None
+        self._semaphore = None
+        self._futures = set()
+        self._lock = threading.Lock()
+        self._accepting = False
+        self.stats = {"submitted": 0, "rejected": 0, "succeeded": 0, "failed": 0}
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return self
+            self._loop = asyncio.new_event_loop()
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+            self._thread = threading.Thread(target=self._loop.run_forever, name="receipt-async", daemon=True)
+            self._thread.start()
+            self._accepting = True
+        return self
+
+    def submit(self, func, *args):
+        """
+        func(*args) 코루틴을 실행하도록 넣고 concurrent.futures.Future를 반환.
+        """
+        with self._lock:
+            if not self._accepting:
+                raise RuntimeError("비동기 영수증 처리기가 실행 중이 아닙니다.")
+            if len(self._futures) >= self.max_pending:
+                self.stats["rejected"] += 1
+                raise QueueFullError(f"처리 대기 중인 영수증이 {self.max_pending}건입니다.")
+            future = asyncio.run_coroutine_threadsafe(self._run(func, *args), self._loop)
+            self._futures.add(future)
+            self.stats["submitted"] += 1
+        future.add_done_callback(self._finished)
+        return future
+
+    async def _run(self, func, *args):
+        async with self._semaphore:
+            return await func(*args)
+
+    def _finished(self, future):
+        with self._lock:
+            self._futures.discard(future)
+            self.stats["failed" if future.cancelled() or future.exception() else "succeeded"] += 1
+
+    def shutdown(self, drain=True, timeout=None):
+        """
+        새 작업을 받지 않고 종료. drain이면 넣어 둔 작업이 끝날 때까지 기다리고, 아니면 취소한다.
+        """
+        with self._lock:
+            self._accepting = False
+            futures = list(self._futures)
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        for future in futures:
+            if drain:
+                try:
+                    future.result(timeout)
+                except Exception:
+                    pass
+            else:
+                future.cancel()
+        asyncio.run_coroutine_threadsafe(close_http_session(), self._loop).result(timeout)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        thread.join(timeout)
+        self._loop.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="로컬 폴더의 영수증을 비동기 파이프라인으로 처리합니다.")
+    parser.add_argument("source", help="영수증 파일 또는 폴더 경로")
+    parser.add_argument("--max-in-flight", type=int, default=MAX_IN_FLIGHT, help="동시에 처리할 영수증 수")
+    args = parser.parse_args(argv)
+
+    source = Path(args.source)
+    if source.is_dir():
+        paths = [path for path in sorted(source.rglob("*")) if path.is_file() and path.suffix.lower() in RECEIPT_EXTENSIONS]
+    else:
+        paths = [source]
+    from pipeline import warm_up
+    from notion_sink import get_notion_writer
+    warm_up()
+    started = time.perf_counter()
+    try:
+        results = asyncio.run(process_many_async(paths, args.max_in_flight))
+    finally:
+        get_notion_writer().close()
+    elapsed = time.perf_counter() - started
+    failed = 0
+    for path, result in zip(paths, results):
+        if isinstance(result, Exception):
+            failed += 1
+            print(f"실패: {path} ({result})")
+        else:
+            print(f"완료: {path} -> {result['assistant_response']}")
+    print(f"처리 완료: 성공 {len(paths) - failed}건, 실패 {failed}건, {elapsed:.1f}초")
+    return 0 if failed == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
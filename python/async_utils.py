@@ -0,0 +1,225 @@
+import os, asyncio, tempfile, threading
+from concurrent.futures import ThreadPoolExecutor
+import config  # .env는 config에서 한 번만 읽는다
+
+from utils import (
+    GOOGLE_API_KEY, SEARCH_ENGINE_ID, OCR_MODEL, OCR_REASK, SPOOL_MAX_BYTES, ReceiptFile,
+    build_ocr_messages, ocr_response_format, reask_messages, encode_image, is_pdf_by_signature, ocr_cache_key,
+    ocr_receipt_file,
+)
+from clients import get_async_openai_client
+from ocr_cache import get_ocr_cache
+from instrumentation import stage, add, record_usage, cache_result, copy_context
+from receipt_schema import RECEIPT_FIELDS, ReceiptValidationError, extract_json, parse_receipt, merge_fields
+from resilience import POLICIES, call_async
+from notion_sink import get_notion_writer
+from object_store import store_receipt
+
+GOOGLE_SEARCH_URL = "https://www.googleapis.com/customsearch/v1"
+NOTION_WAIT_TIMEOUT = 120  # Notion 저장 완료를 기다리는 최대 시간(초)
+# 동기 라이브러리(boto3, SQLite 캐시, 이미지 전처리, PDF 렌더링) 전용 스레드 수.
+# asyncio 기본 executor(CPU 수 + 4)를 쓰면 동시에 처리하는 영수증 수가 그 크기로 묶이므로 따로 둔다.
+ASYNC_BLOCKING_WORKERS = int(os.getenv("ASYNC-BLOCKING-WORKERS", os.getenv("RECEIPT-MAX-IN-FLIGHT", "24")))
+
+_blocking_executor = None
+_blocking_lock = threading.Lock()
+
+
+def _get_blocking_executor():
+    global _blocking_executor
+    if _blocking_executor is None:
+        with _blocking_lock:
+            if _blocking_executor is None:
+                _blocking_executor = ThreadPoolExecutor(max_workers=ASYNC_BLOCKING_WORKERS, thread_name_prefix="async-blocking")
+    return _blocking_executor
+
+
+async def run_blocking(func, *args):
+    """
+    동기 함수를 전용 스레드 풀에서 실행하고 결과를 기다린다. receipt_id 같은 계측 컨텍스트도 넘긴다.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_blocking_executor(), copy_context().run, func, *args)
+
+
+async def download_file_async(session, file_url, file_name, SLACK_BOT_TOKEN, spill_threshold=SPOOL_MAX_BYTES):
+    """
+    download_to_buffer의 비동기 버전. 응답을 조각 단위로 메모리에 받고, spill_threshold를 넘으면 나머지는 임시 파일에 쓴다.
+    Returns:
+        ReceiptFile: 다운로드한 파일. 200이 아닌 응답이면 None.
+    """
+    import aiohttp
+    policy = POLICIES["slack"]
+    # 큰 파일도 받을 수 있도록 전체 시간 대신 연결/조각 읽기 시간에 제한을 둔다
+    timeout = aiohttp.ClientTimeout(total=None, connect=policy.connect_timeout, sock_read=policy.timeout)
+    chunks, size, is_pdf, spill = [], 0, None, None
+    try:
+        async with session.get(file_url, headers={"Authorization": f"Bearer {SLACK_BOT_TOKEN}"}, timeout=timeout) as response:
+            if response.status != 200:
+                return None
+            async for chunk in response.content.iter_chunked(64 * 1024):
+                if is_pdf is None:
+                    is_pdf = chunk[:4] == b'%PDF'
+                size += len(chunk)
+                if spill is None and size > spill_threshold:
+                    spill = tempfile.NamedTemporaryFile(prefix="receipt-", suffix=os.path.splitext(file_name)[1], delete=False)
+                    spill.write(b"".join(chunks))
+                    chunks = []
+                if spill is not None:
+                    spill.write(chunk)
+                else:
+                    chunks.append(chunk)
+    finally:
+        if spill is not None:
+            spill.close()
+    if spill is not None:
+        return ReceiptFile(file_name, path=spill.name, is_pdf=bool(is_pdf))
+    return ReceiptFile(file_name, data=b"".join(chunks), is_pdf=bool(is_pdf))
+
+
+async def request_receipt_json_async(messages, model, stage_name, bytes_sent):
+    """
+    request_receipt_json의 비동기 버전 (AsyncOpenAI). 검증과 잘못된 필드 재질의 방식은 동기 경로와 같다.
+    Raises:
+        ReceiptValidationError: 응답에 JSON이 없거나 재질의 후에도 잘못된 필드가 남았을 때.
+    """
+    client = get_async_openai_client()
+    with stage(stage_name, bytes_sent=bytes_sent):
+        response = await call_async("openai", lambda: client.chat.completions.create(
+            model=model, messages=messages, **ocr_response_format(),
+        ))
+        record_usage(response.usage, model)
+        content = response.choices[0].message.content
+        data = extract_json(content)
+        if data is None:
+            print(f"OCR 응답에서 JSON을 찾을 수 없습니다: {content!r:.200}")
+            raise ReceiptValidationError(RECEIPT_FIELDS, content)
+        receipt, errors = parse_receipt(data)
+        if errors and OCR_REASK:
+            print(f"잘못된 필드만 다시 요청: {errors}")
+            add(reask_fields=errors)
+            response = await call_async("openai", lambda: client.chat.completions.create(
+                model=model,
+                messages=reask_messages(messages, content, errors),
+                response_format={"type": "json_object"},
+            ))
+            record_usage(response.usage, model)
+            content = response.choices[0].message.content
+            receipt, errors = merge_fields(receipt, extract_json(content), errors)
+    if errors:
+        print(f"영수증 필드 검증 실패: {errors}")
+        raise ReceiptValidationError(errors, content)
+    return receipt.to_dict()
+
+
+async def request_receipt_ocr_async(base64_image):
+    """
+    request_receipt_ocr의 비동기 버전. 응답을 기다리는 동안 스레드를 쓰지 않는다.
+    """
+    return await request_receipt_json_async(build_ocr_messages(base64_image), OCR_MODEL, "openai.ocr", len(base64_image))
+
+
+async def ocr_receipt_file_async(image_path, use_cache=True):
+    """
+    ocr_receipt_file의 비동기 버전. 캐시 조회와 이미지 전처리(CPU)만 전용 스레드 풀에서 하고 OCR 요청은 AsyncOpenAI로 보낸다.
+    PDF는 페이지 렌더링/병합을 포함한 동기 경로(ocr_pdf)를 전용 스레드 풀에서 그대로 실행한다.
+    """
+    cache = get_ocr_cache() if use_cache else None
+    if cache is not None:
+        key = await run_blocking(ocr_cache_key, image_path)
+        cached = await run_blocking(cache.get, key)
+        cache_result(cached is not None)
+        if cached is not None:
+            print(f"OCR 캐시 적중: {image_path}")
+            return cached
+    if await run_blocking(is_pdf_by_signature, image_path):
+        result = await run_blocking(ocr_receipt_file, image_path, False)
+    else:
+        result = await request_receipt_ocr_async(await run_blocking(encode_image, image_path))
+    # 검증에 실패하면 위에서 예외가 나므로 여기까지 온 결과만 캐시된다
+    if cache is not None:
+        await run_blocking(cache.put, key, result)
+    return result
+
+
+async def search_with_google_api_async(session, query, num_results=10):
+    """
+    search_with_google_api의 비동기 버전 (Custom Search REST API 직접 호출).
+    실패하면 예외를 발생시킨다 (오류 문자열을 검색 결과처럼 돌려주지 않는다).
+    """
+    import aiohttp
+    params = {"key": GOOGLE_API_KEY, "cx": SEARCH_ENGINE_ID, "q": query, "num": num_results}
+    policy = POLICIES["search"]
+
+    async def request():
+        timeout = aiohttp.ClientTimeout(total=policy.timeout, connect=policy.connect_timeout)
+        async with session.get(GOOGLE_SEARCH_URL, params=params, timeout=timeout) as response:
+            response.raise_for_status()
+            return await response.json()
+
+    results = await call_async("search", request)
+    return [
+        {"title": item["title"], "snippet": item.get("snippet")}
+        for item in results.get("items", [])
+        if item.get("snippet") is not None
+    ]
+
+
+async def upload_to_s3_async(file_path, file_name):
+    # boto3는 동기 라이브러리이므로 전용 스레드 풀에서 실행
+    return await run_blocking(store_receipt, file_path, file_name)
+
+
+async def wait_ticket_async(ticket, timeout=NOTION_WAIT_TIMEOUT):
+    """
+    NotionWriteTicket이 끝날 때까지 스레드 없이 기다리고 상태를 반환 (시간 안에 끝나지 않으면 queued).
+    """
+    loop = asyncio.get_running_loop()
+    done = loop.create_future()
+
+    def notify(ticket):
+        def resolve():
+            if not done.done():
+                done.set_result(ticket.status)
+        try:
+            loop.call_soon_threadsafe(resolve)
+        except RuntimeError:
+            pass  # 기다리던 이벤트 루프가 이미 닫힘
+
+    ticket.add_done_callback(notify)
+    await asyncio.wait({done}, timeout=timeout)
+    return ticket.status
+
+
+async def add_receipt_to_notion_async(data, file_url, business_category, account, key=None, timeout=NOTION_WAIT_TIMEOUT):
+    """
+    add_receipt_to_notion의 비동기 버전. 속도 제한/재시도/중복 방지를 하는 공유 writer에 넣고
+    저장이 끝날 때까지 기다린다. created/duplicate가 아니면 (시간 초과 포함) 예외를 발생시킨다.
+    """
+    ticket = get_notion_writer().write(data, file_url, business_category, account, key=key)
+    status = await wait_ticket_async(ticket, timeout)
+    if status not in ("created", "duplicate"):
+        raise RuntimeError(f"Notion 저장 실패 ({status}): {ticket.error}")
+    print("데이터가 성공적으로 Notion에 저장되었습니다:", ticket.page_id)
+    return ticket
+
+
+_session = None
+
+
+async def get_http_session():
+    """
+    이벤트 루프 안에서 공유하는 aiohttp 세션 (연결 재사용).
+    """
+    import aiohttp  # 비동기 경로에서만 쓰므로 봇 시작 시에는 불러오지 않는다
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=60))
+    return _session
+
+
+async def close_http_session():
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
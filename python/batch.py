@@ -0,0 +1,313 @@
+"""
+영수증 일괄 처리(backfill) 명령.
+
+사용 예:
+    python batch.py ../image --output results.jsonl
+    python batch.py s3://receipts/2024/ --endpoint-url http://localhost:9000 --output notion --concurrency 4 --rate 2
+"""
+import os, sys, json, time, argparse, tempfile, threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from pipeline import run_receipt_chain, warm_up
+from instrumentation import receipt_scope, percentile
+from resilience import service_stats
+from receipt_knn import get_receipt_knn, KNN_ENABLED
+
+RECEIPT_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".heic", ".pdf")
+
+
+class RateLimiter:
+    """
+    초당 rate 건 이하로 작업 시작 간격을 맞춘다. rate가 0 이하이면 제한하지 않는다.
+    """
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+class Checkpoint:
+    """
+    처리를 마친 영수증 ID를 JSONL 파일에 한 줄씩 기록하여 중단 후 이어서 실행할 수 있게 한다.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        self.done.add(json.loads(line)["id"])
+
+    def mark(self, receipt_ids):
+        """
+        sink가 저장을 마쳤다고 돌려준 영수증 ID들을 기록한다.
+        """
+        if not receipt_ids:
+            return
+        with self._lock:
+            self.done.update(receipt_ids)
+            if self.path:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    for receipt_id in receipt_ids:
+                        f.write(json.dumps({"id": receipt_id, "at": time.time()}) + "\n")
+
+
+def list_local(directory):
+    for path in sorted(Path(directory).rglob("*")):
+        if path.is_file() and path.suffix.lower() in RECEIPT_EXTENSIONS:
+            yield str(path), path
+
+
+def list_s3(url, endpoint_url=None):
+    """
+    s3://bucket/prefix 아래의 영수증 객체를 (ID, 다운로드 함수) 형태로 나열.
+    endpoint_url로 MinIO 같은 S3 호환 저장소를 지정할 수 있다. 인증 정보는 clients의 S3 설정을 그대로 쓴다.
+    """
+    from clients import get_s3_client
+    bucket, _, prefix = url[len("s3://"):].partition("/")
+    s3_client = get_s3_client(endpoint_url)
+    paginator = s3_client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get("Contents", []):
+            key = obj["Key"]
+            if key.lower().endswith(RECEIPT_EXTENSIONS):
+                yield f"s3://{bucket}/{key}", (s3_client, bucket, key)
+
+
+def fetch(source, workdir):
+    """
+    로컬 파일이면 경로를 그대로, S3 객체면 임시 폴더에 내려받은 경로를 반환.
+    """
+    if isinstance(source, Path):
+        return source
+    s3_client, bucket, key = source
+    local_path = Path(workdir) / key.replace("/", "_")
+    s3_client.download_file(bucket, key, str(local_path))
+    return local_path
+
+
+class JsonlSink:
+    """
+    결과를 JSONL 파일에 한 줄씩 덧붙인다. write는 디스크에 내려쓴 영수증 ID 목록을 반환한다.
+    """
+    def __init__(self, path):
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def write(self, receipt_id, image_path, result):
+        record = {
+            "id": receipt_id,
+            "ocr_response": result["ocr_response"],
+            "business_category": result["business_category"],
+            "assistant_response": result["assistant_response"],
+        }
+        with self._lock:
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        return [receipt_id]
+
+    def close(self):
+        self._file.close()
+        return []
+
+
+class ParquetSink:
+    """
+    결과를 row_group_size건씩 모아 path 폴더 아래 Parquet 조각 파일(part-00000.parquet, ...)로 저장 (pyarrow 필요).
+    Parquet 파일은 footer까지 써야 읽을 수 있으므로 한 파일에 이어 쓰지 않고, 조각마다 임시 파일에 완성한 뒤
+    이름을 바꾼다. write/close는 이렇게 저장을 마친 영수증 ID만 반환하므로, 중간에 죽어도 체크포인트에는
+    실제로 파일에 남은 결과만 기록된다. 폴더 전체는 pyarrow.parquet.read_table(path) 또는 pandas.read_parquet(path)로 읽는다.
+    """
+    row_group_size = int(os.getenv("BATCH-PARQUET-ROWS", "100"))
+
+    def __init__(self, path):
+        import pyarrow.parquet  # 없으면 처리를 시작하기 전에 실패한다
+        self._pq = pyarrow.parquet
+        if os.path.isfile(path):
+            raise ValueError(f"{path}는 이전 형식의 단일 Parquet 파일입니다. 다른 출력 경로를 지정하세요.")
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self._parts = len([name for name in os.listdir(path) if name.endswith(".parquet")])
+        self._rows = []
+        self._lock = threading.Lock()
+
+    def write(self, receipt_id, image_path, result):
+        ocr = result["ocr_response"] if isinstance(result["ocr_response"], dict) else {}
+        with self._lock:
+            self._rows.append({
+                "id": receipt_id,
+                "상호명": ocr.get("상호명"),
+                "날짜": ocr.get("날짜"),
+                "총액": ocr.get("총액"),
+                "항목": json.dumps(ocr.get("항목", []), ensure_ascii=False),
+                "업종": result["business_category"],
+                "비목": result["assistant_response"],
+            })
+            if len(self._rows) < self.row_group_size:
+                return []
+            return self._flush()
+
+    def _flush(self):
+        if not self._rows:
+            return []
+        import pyarrow as pa
+        part = os.path.join(self.path, f"part-{self._parts:05d}.parquet")
+        self._pq.write_table(pa.Table.from_pylist(self._rows), part + ".tmp")
+        os.replace(part + ".tmp", part)
+        self._parts += 1
+        flushed = [row["id"] for row in self._rows]
+        self._rows = []
+        return flushed
+
+    def close(self):
+        with self._lock:
+            return self._flush()
+
+
+class NotionSink:
+    """
+    Notion writer 대기열에 넣고 저장이 끝날 때까지 기다린다. 속도 제한, 재시도, 중복 방지는 writer가 처리한다.
+    저장에 실패하면 예외를 내므로 체크포인트에 기록되지 않고 다음 실행에서 다시 처리된다.
+    """
+    wait_timeout = 120  # 저장 완료를 기다리는 최대 시간(초)
+
+    def __init__(self):
+        from notion_sink import get_notion_writer
+        self.writer = get_notion_writer()
+
+    def write(self, receipt_id, image_path, result):
+        from utils import read_file_bytes
+        from object_store import store_receipt
+        from notion_sink import receipt_hash
+        s3_file_url = store_receipt(str(image_path), Path(image_path).name)
+        ticket = self.writer.write(
+            result['ocr_response'], s3_file_url, result['business_category'], result['assistant_response'],
+            key=receipt_hash(None, read_file_bytes(image_path)),
+        )
+        status = ticket.wait(timeout=self.wait_timeout)
+        if status not in ("created", "duplicate"):
+            raise RuntimeError(f"Notion 저장 실패 ({status}): {ticket.error}")
+        return [receipt_id]
+
+    def close(self):
+        self.writer.close()
+        print(f"Notion 저장 결과: {self.writer.stats}")
+        return []
+
+
+def make_sink(output):
+    if output == "notion":
+        return NotionSink()
+    if output.endswith(".parquet"):
+        return ParquetSink(output)
+    return JsonlSink(output)
+
+
+def print_report(stage_timings, succeeded, failed, skipped, elapsed):
+    print("=" * 60)
+    print(f"처리 완료: 성공 {succeeded}건, 실패 {failed}건, 건너뜀 {skipped}건, {elapsed:.1f}초")
+    if elapsed > 0:
+        print(f"처리량: {succeeded / elapsed * 60:.1f}건/분")
+    print(f"{'단계':<28}{'건수':>6}{'평균':>9}{'p50':>9}{'p95':>9}")
+    for stage, values in stage_timings.items():
+        print(f"{stage:<28}{len(values):>6}{sum(values) / len(values):>9.2f}"
+              f"{percentile(values, 50):>9.2f}{percentile(values, 95):>9.2f}")
+    print(f"{'서비스':<10}{'호출':>7}{'실패':>6}{'재시도':>7}{'타임아웃':>9}{'차단':>6}{'hedge':>7}  서킷")
+    for service, stats in service_stats().items():
+        print(f"{service:<10}{stats['calls']:>7}{stats['failures']:>6}{stats['retries']:>7}{stats['timeouts']:>9}"
+              f"{stats['short_circuits']:>6}{stats['hedged']:>7}  {stats['circuit']}")
+    if KNN_ENABLED:
+        knn = get_receipt_knn().stats()
+        print(f"k-NN 분류: 적중률 {knn['hit_rate']:.1%} ({knn['hits']}/{knn['lookups']}), "
+              f"정확도 {knn['accuracy']:.1%} ({knn['correct']}/{knn['evaluated']}), 저장 {knn['entries']}건")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="영수증 폴더 또는 S3 prefix를 일괄 처리합니다.")
+    parser.add_argument("source", help="로컬 폴더 경로 또는 s3://bucket/prefix")
+    parser.add_argument("--endpoint-url", help="S3 호환 저장소 주소 (예: http://localhost:9000)")
+    parser.add_argument("--output", default="results.jsonl", help="notion, *.jsonl 또는 *.parquet (조각 파일을 담는 폴더)")
+    parser.add_argument("--concurrency", type=int, default=4, help="동시에 처리할 영수증 수")
+    parser.add_argument("--rate", type=float, default=0, help="초당 최대 시작 건수 (0이면 제한 없음)")
+    parser.add_argument("--checkpoint", default="batch_checkpoint.jsonl", help="진행 상황 기록 파일")
+    parser.add_argument("--limit", type=int, default=0, help="처리할 최대 건수 (0이면 전체)")
+    args = parser.parse_args(argv)
+
+    if args.source.startswith("s3://"):
+        sources = list(list_s3(args.source, args.endpoint_url))
+    else:
+        sources = list(list_local(args.source))
+    checkpoint = Checkpoint(args.checkpoint)
+    pending = [(receipt_id, source) for receipt_id, source in sources if receipt_id not in checkpoint.done]
+    skipped = len(sources) - len(pending)
+    if args.limit:
+        pending = pending[:args.limit]
+    print(f"대상 {len(sources)}건 중 {len(pending)}건 처리 (이미 처리됨 {skipped}건)")
+
+    try:
+        sink = make_sink(args.output)
+    except (ImportError, ValueError) as e:
+        parser.error(f"출력 {args.output}을 열 수 없습니다: {e}")
+    warm_up()
+    limiter = RateLimiter(args.rate)
+    stage_timings = {}
+    timings_lock = threading.Lock()
+    # S3에서 내려받은 파일은 끝나면(실패해도) 지운다
+    workdir = tempfile.TemporaryDirectory(prefix="receipt-batch-")
+
+    def process(receipt_id, source):
+        limiter.wait()
+        with receipt_scope(receipt_id):
+            process_receipt(receipt_id, source)
+
+    def process_receipt(receipt_id, source):
+        timings = {}
+        started = time.perf_counter()
+        image_path = fetch(source, workdir.name)
+        timings["fetch"] = time.perf_counter() - started
+        result = run_receipt_chain({"image_path": image_path}, timings)
+        started = time.perf_counter()
+        written = sink.write(receipt_id, image_path, result)
+        timings["write"] = time.perf_counter() - started
+        with timings_lock:
+            for stage, seconds in timings.items():
+                stage_timings.setdefault(stage, []).append(seconds)
+        # 버퍼에만 들어간 결과는 sink가 파일에 내려쓴 뒤(이번 또는 이후 write, close)에 기록된다
+        checkpoint.mark(written)
+
+    succeeded = failed = 0
+    started = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            futures = {executor.submit(process, receipt_id, source): receipt_id for receipt_id, source in pending}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                    succeeded += 1
+                    print(f"[{succeeded + failed}/{len(pending)}] 완료: {futures[future]}")
+                except Exception as e:
+                    failed += 1
+                    print(f"[{succeeded + failed}/{len(pending)}] 실패: {futures[future]} ({e})")
+    finally:
+        checkpoint.mark(sink.close())
+        workdir.cleanup()
+    print_report(stage_timings, succeeded, failed, skipped, time.perf_counter() - started)
+    return 0 if failed == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,66 @@
+"""
+클라이언트 생성 비용 벤치마크.
+
+예전 코드처럼 호출마다 boto3/Notion/Google/OpenAI 클라이언트를 새로 만드는 경우와
+clients.py 레지스트리에서 재사용하는 경우의 호출당 오버헤드를 비교한다. 네트워크 요청은 보내지 않는다.
+
+사용법: python bench_clients.py [반복 횟수]
+"""
+import sys, time
+
+import clients
+
+
+def per_call_s3():
+    import boto3
+    return boto3.client(
+        "s3",
+        aws_access_key_id=clients.AWS_ACCESS_KEY or "bench",
+        aws_secret_access_key=clients.AWS_SECRET_KEY or "bench",
+        region_name=clients.S3_REGION or "ap-northeast-2",
+    )
+
+
+def per_call_notion():
+    from notion_client import Client
+    return Client(auth=clients.NOTION_API_KEY or "bench")
+
+
+def per_call_search():
+    from googleapiclient.discovery import build
+    return build("customsearch", "v1", developerKey=clients.GOOGLE_API_KEY or "bench")
+
+
+def per_call_openai():
+    from openai import OpenAI
+    return OpenAI(api_key=clients.OPEN_AI_KEY or "bench")
+
+
+def measure(func, repeat):
+    func()  # import 비용 제외
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main(repeat=20):
+    # 키가 없는 환경에서도 클라이언트를 만들 수 있도록 더미 값 사용
+    for name in ("AWS_ACCESS_KEY", "AWS_SECRET_KEY", "NOTION_API_KEY", "GOOGLE_API_KEY", "OPEN_AI_KEY"):
+        setattr(clients, name, getattr(clients, name) or "bench")
+    clients.S3_REGION = clients.S3_REGION or "ap-northeast-2"
+    cases = [
+        ("s3", per_call_s3),
+        ("notion", per_call_notion),
+        ("search", per_call_search),
+        ("openai", per_call_openai),
+    ]
+    print(f"{'client':<10}{'per-call (ms)':>16}{'registry (ms)':>16}{'saved (ms)':>14}")
+    for name, per_call in cases:
+        fresh = measure(per_call, repeat)
+        pooled = measure(lambda: clients.get_client(name), repeat * 100)
+        print(f"{name:<10}{fresh:>16.3f}{pooled:>16.4f}{fresh - pooled:>14.3f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
@@ -0,0 +1,242 @@
+"""
+통합(fused) 모드와 기존 다단계 체인의 A/B 비교.
+
+같은 영수증을 두 경로(A: OCR → 검색 → 업종 분석 → 비목 판단, B: 한 번의 vision 요청 + 필요할 때만 검색 도구)로
+차례로 처리해 영수증당 지연 시간(p50/p95), 원격 호출 수, 토큰, 추정 비용과 두 결과의 일치율
+(상호명/날짜/총액/업종/비목)을 보여 준다. 캐시와 k-NN 분류기는 두 경로 모두 끈 채로 잰다.
+
+기본은 bench_pipeline과 같은 카세트 재생이라 API 키 없이 실행되지만, 재생 응답은 고정이므로 일치율은 실제 값이 아니고
+업종 분석(CassetteLLM)의 토큰/비용도 0으로 잡힌다. 실제 비교는 --live로 실제 API를 호출한다 (비용 발생).
+
+사용법:
+    python bench_fused.py                                          # 카세트 재생, ../image 샘플 + 합성 영수증
+    python bench_fused.py --live ../image/a.jpg ../image/b.pdf --save ab.json
+    python bench_fused.py --live --samples ../image --category-backend assistant
+"""
+import os, sys, json, time, argparse
+
+os.environ.setdefault("METRICS-PATH", "")  # 벤치마크 결과가 운영 계측 파일에 섞이지 않도록
+
+import instrumentation
+import pipeline
+import ocr_cache
+import merchant_cache
+import notion_sink
+import guideline_index
+from utils import ReceiptFile
+from instrumentation import MetricsRecorder, receipt_scope, percentile
+from resilience import service_stats
+from receipt_schema import extract_json, parse_decision
+from bench_pipeline import (
+    Cassette, CassetteLLM, NoCache, install, load_samples, make_synthetic, DEFAULT_CASSETTE, SAMPLE_DIR,
+)
+
+ARMS = ("chain", "fused")
+AGREEMENT_FIELDS = ("상호명", "날짜", "총액", "업종", "비목")
+
+
+class SpanCollector(MetricsRecorder):
+    """
+    계측 구간을 메모리에 모아 영수증(receipt_id)별 토큰/비용을 합산한다.
+    """
+    def __init__(self):
+        super().__init__(path="")
+        self.spans = []
+
+    def emit(self, record):
+        super().emit(record)
+        with self._lock:
+            self.spans.append(record)
+
+    def usage(self, receipt_id):
+        with self._lock:
+            spans = [span for span in self.spans if span.get("receipt_id") == receipt_id]
+        return {
+            "prompt_tokens": sum(span.get("prompt_tokens", 0) for span in spans),
+            "completion_tokens": sum(span.get("completion_tokens", 0) for span in spans),
+            "cost_usd": sum(span.get("cost_usd", 0) for span in spans),
+        }
+
+
+def service_calls():
+    return {name: stats["calls"] for name, stats in service_stats().items()}
+
+
+def summarize(outputs):
+    """
+    두 경로의 결과를 같은 형태로: 상호명/날짜/총액/업종/비목.
+    """
+    ocr = outputs.get("ocr_response")
+    ocr = ocr if isinstance(ocr, dict) else {}
+    decision, _ = parse_decision(extract_json(outputs.get("assistant_response", "")))
+    return {
+        "상호명": " ".join(str(ocr.get("상호명") or "").split()),
+        "날짜": ocr.get("날짜"),
+        "총액": ocr.get("총액"),
+        "업종": (outputs.get("business_category") or "").strip(),
+        "비목": decision.account,
+    }
+
+
+def run_arm(chain, arm, receipt_file, collector):
+    """
+    한 경로로 영수증 하나를 처리하고 지연 시간, 원격 호출 수, 토큰/비용, 결과 요약을 반환.
+    """
+    receipt_id = f"{arm}:{receipt_file.name}"
+    before = service_calls()
+    started = time.perf_counter()
+    error = None
+    try:
+        with receipt_scope(receipt_id):
+            outputs = chain.invoke({"image_path": receipt_file})
+    except Exception as e:
+        outputs, error = {}, f"{type(e).__name__}: {e}"
+    seconds = time.perf_counter() - started
+    after = service_calls()
+    return {
+        "seconds": seconds,
+        "calls": {name: after[name] - before[name] for name in after if after[name] - before[name]},
+        **collector.usage(receipt_id),
+        "result": summarize(outputs),
+        "error": error,
+    }
+
+
+def load_receipts(args):
+    receipts = []
+    for path in args.paths:
+        with open(path, "rb") as f:
+            data = f.read()
+        receipts.append(ReceiptFile(os.path.basename(path), data=data, is_pdf=data[:4] == b"%PDF"))
+    if not receipts:
+        receipts = load_samples(args.samples) + make_synthetic(args.synthetic, seed=args.seed)
+    return receipts
+
+
+def build_chains(args):
+    """
+    비교할 두 체인. 재생이면 카세트 클라이언트를 끼우고, 실제 호출이면 캐시만 끈다.
+    """
+    if args.live:
+        ocr_cache._cache = NoCache()
+        merchant_cache._cache = NoCache()
+        guideline_index._embedding_cache = NoCache()
+        analysis_llm = None
+        cassette = None
+    else:
+        cassette = Cassette.load(args.cassette, speed=args.speed)
+        install(cassette, category_backend=args.category_backend, receipt_mode="fused")
+        analysis_llm = CassetteLLM(cassette=cassette)
+    chains = {
+        "chain": pipeline.build_receipt_chain(analysis_llm=analysis_llm, category_backend=args.category_backend, use_knn=False),
+        "fused": pipeline.build_receipt_chain(mode="fused"),
+    }
+    for chain in chains.values():
+        chain.verbose = False
+    return chains, cassette
+
+
+def aggregate(rows, arm):
+    samples = [row[arm] for row in rows if row[arm]["error"] is None]
+    seconds = [sample["seconds"] for sample in samples]
+    calls = {}
+    for sample in samples:
+        for name, count in sample["calls"].items():
+            calls[name] = calls.get(name, 0) + count
+    count = len(samples) or 1
+    return {
+        "receipts": len(samples),
+        "failed": len(rows) - len(samples),
+        "p50": percentile(seconds, 50),
+        "p95": percentile(seconds, 95),
+        "calls_per_receipt": {name: total / count for name, total in calls.items()},
+        "tokens_per_receipt": sum(s["prompt_tokens"] + s["completion_tokens"] for s in samples) / count,
+        "cost_per_receipt": sum(s["cost_usd"] for s in samples) / count,
+    }
+
+
+def agreement(rows):
+    """
+    두 경로가 모두 성공한 영수증에서 필드별로 값이 같은 비율.
+    """
+    both = [row for row in rows if row["chain"]["error"] is None and row["fused"]["error"] is None]
+    rates = {
+        field: sum(row["chain"]["result"][field] == row["fused"]["result"][field] for row in both) / len(both) if both else 0.0
+        for field in AGREEMENT_FIELDS
+    }
+    return {**rates, "compared": len(both)}
+
+
+def print_report(results):
+    header = f"{'arm':<7}{'n':>4}{'fail':>5}{'p50':>8}{'p95':>8}{'tokens':>9}{'cost($)':>10}  calls/receipt"
+    print(header)
+    print("-" * (len(header) + 20))
+    for arm in ARMS:
+        summary = results["arms"][arm]
+        calls = ", ".join(f"{name}={value:.1f}" for name, value in sorted(summary["calls_per_receipt"].items()))
+        print(f"{arm:<7}{summary['receipts']:>4}{summary['failed']:>5}{summary['p50']:>8.2f}{summary['p95']:>8.2f}"
+              f"{summary['tokens_per_receipt']:>9.0f}{summary['cost_per_receipt']:>10.4f}  {calls}")
+    chain, fused = results["arms"]["chain"], results["arms"]["fused"]
+    if chain["p50"] and chain["cost_per_receipt"]:
+        print(f"fused/chain: p50 {fused['p50'] / chain['p50'] - 1:+.1%}, 비용 {fused['cost_per_receipt'] / chain['cost_per_receipt'] - 1:+.1%}")
+    match = results["agreement"]
+    print(f"일치율 ({match['compared']}건): " + ", ".join(f"{field} {match[field]:.0%}" for field in AGREEMENT_FIELDS))
+    for row in results["receipts"]:
+        different = [field for field in AGREEMENT_FIELDS if row["chain"]["result"][field] != row["fused"]["result"][field]]
+        if different and row["chain"]["error"] is None and row["fused"]["error"] is None:
+            print(f"  {row['name']}: " + ", ".join(
+                f"{field} {row['chain']['result'][field]!r} ≠ {row['fused']['result'][field]!r}" for field in different))
+        for arm in ARMS:
+            if row[arm]["error"]:
+                print(f"  {row['name']} ({arm}) 실패: {row[arm]['error']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="통합(fused) 모드와 다단계 체인의 지연 시간/비용/일치율을 비교합니다.")
+    parser.add_argument("paths", nargs="*", help="영수증 파일 (없으면 --samples 폴더와 합성 영수증)")
+    parser.add_argument("--live", action="store_true", help="카세트 대신 실제 API 호출")
+    parser.add_argument("--cassette", default=DEFAULT_CASSETTE)
+    parser.add_argument("--speed", type=float, default=1.0, help="기록된 지연 시간 배율 (재생할 때)")
+    parser.add_argument("--samples", default=SAMPLE_DIR, help="샘플 영수증 폴더")
+    parser.add_argument("--synthetic", type=int, default=2, help="합성 영수증 수")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--category-backend", choices=("guideline", "assistant"), default=pipeline.CATEGORY_BACKEND,
+                        help="A 경로의 비목 판단 방식")
+    parser.add_argument("--save", help="결과 JSON 저장 경로")
+    args = parser.parse_args(argv)
+
+    collector = SpanCollector()
+    instrumentation.recorder = collector
+    chains, cassette = build_chains(args)
+    receipts = load_receipts(args)
+    print(f"영수증 {len(receipts)}건, {'실제 API' if args.live else '카세트 재생'}, A 경로 비목 판단 {args.category_backend}")
+    rows = []
+    for receipt_file in receipts:
+        # 순서 효과(연결 재사용 등)가 한쪽에만 몰리지 않도록 영수증마다 먼저 실행할 경로를 바꾼다
+        order = ARMS if len(rows) % 2 == 0 else ARMS[::-1]
+        row = {"name": receipt_file.name}
+        for arm in order:
+            row[arm] = run_arm(chains[arm], arm, receipt_file, collector)
+        rows.append(row)
+        print(f"{receipt_file.name}: chain {row['chain']['seconds']:.2f}초, fused {row['fused']['seconds']:.2f}초")
+    results = {
+        "label": time.strftime("%Y-%m-%d %H:%M"),
+        "live": args.live,
+        "category_backend": args.category_backend,
+        "arms": {arm: aggregate(rows, arm) for arm in ARMS},
+        "agreement": agreement(rows),
+        "receipts": rows,
+    }
+    if cassette is not None:
+        results["cassette_calls"] = cassette.calls
+        notion_sink.get_notion_writer().close()
+    print_report(results)
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2, default=str)
+        print(f"결과 저장: {args.save}")
+    return 0 if all(results["arms"][arm]["failed"] == 0 for arm in ARMS) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,481 @@
+"""
+오프라인 영수증 파이프라인 벤치마크.
+
+OpenAI(chat/assistant/embedding), Google CSE, S3, Notion 호출을 카세트(bench_fixtures/cassette.json)에 기록된
+응답과 지연 시간으로 재생하고, ../image 의 샘플과 합성 영수증을 Slack 봇과 같은 DAG
+(download → upload / ocr → category → assistant → notion)로 처리한다.
+동시 처리 수별로 처리량, 영수증당 지연 시간 분포, 메모리(tracemalloc 최대치, 최대 RSS)를 측정하므로
+API 키 없이 노트북에서 변경 전후를 비교할 수 있다.
+
+사용법:
+    python bench_pipeline.py run --concurrency 1,4,8 --receipts 24 --save after.json --compare before.json
+    python bench_pipeline.py run --speed 0.1           # 기록된 지연 시간을 10%로 줄여 빠르게 실행
+    python bench_pipeline.py run --category-backend assistant --save assistant.json   # 원격 Assistant와 비교
+    python bench_pipeline.py run --receipt-mode fused --compare after.json             # 통합(fused) 모드와 비교
+    python bench_pipeline.py record ../image/example.jpg --output bench_fixtures/cassette.json
+
+record는 실제 API를 호출하고 S3/Notion에도 저장하므로 키가 설정된 환경에서만 실행한다.
+--category-backend assistant일 때 Assistant Run 폴링 간격(wait_for_run의 백오프)은 --speed와 관계없이 실제 시간만큼 기다린다.
+"""
+import os, io, sys, json, time, random, argparse, resource, threading, tracemalloc
+from typing import Any
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("METRICS-PATH", "")  # 벤치마크 결과가 운영 계측 파일에 섞이지 않도록
+
+from langchain.llms.base import LLM
+from botocore.exceptions import ClientError
+
+import numpy as np
+
+import clients
+import pipeline
+import guideline_index
+import receipt_knn
+import ocr_cache
+import merchant_cache
+import notion_sink
+from utils import ReceiptFile
+from object_store import store_receipt, get_object_store
+from notion_sink import NotionWriter, NOTION_RATE, receipt_hash
+from scheduler import Stage, StageScheduler
+from instrumentation import percentile
+from resilience import service_stats
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_fixtures")
+DEFAULT_CASSETTE = os.path.join(FIXTURE_DIR, "cassette.json")
+SAMPLE_DIR = "../image"
+SERVICES = ("openai", "search", "s3", "notion")
+NOTION_WAIT_TIMEOUT = 120
+PLAIN_TYPES = (str, int, float, bool, bytes, dict, list, tuple, type(None))
+# 재생할 때 쓰는 작은 지침 인덱스의 청크 (벡터는 카세트의 임베딩 응답으로 만든다)
+BENCH_GUIDELINE_CHUNKS = [
+    {"source": "grant_guideline.pdf", "page": 12, "text": "회의비는 연구개발과제 수행을 위한 회의 개최 시 다과비, 식대 등으로 집행한다."},
+    {"source": "grant_guideline.pdf", "page": 13, "text": "식비는 연구 수행 중 야근, 출장 등으로 인한 연구원의 식대로 집행한다."},
+    {"source": "grant_guideline.pdf", "page": 15, "text": "교통비는 연구 수행을 위한 시내 교통비(택시, 대중교통)로 증빙을 갖추어 집행한다."},
+]
+
+
+def call_key(path, kwargs, schema=True):
+    """
+    카세트 키. 같은 API라도 모델이 다르면(OCR gpt-4o / 텍스트 OCR gpt-4o-mini) 다른 응답을 쓰고,
+    json_schema 응답 형식이면 스키마 이름(receipt / category_decision / receipt_category)까지 구분한다.
+    schema=False이면 스키마 이름을 뺀 키 (스키마 이름 없이 기록된 이전 카세트용).
+    """
+    model = kwargs.get("model")
+    key = f"{path}[{model}]" if isinstance(model, str) else path
+    response_format = kwargs.get("response_format")
+    if schema and isinstance(response_format, dict) and response_format.get("type") == "json_schema":
+        key += f"[{response_format['json_schema']['name']}]"
+    return key
+
+
+def to_plain(value):
+    if hasattr(value, "model_dump"):
+        return value.model_dump(mode="json")
+    return value
+
+
+class Record(dict):
+    """
+    dict로도(Notion, Google) 속성으로도(OpenAI) 읽을 수 있는 재생 응답.
+    """
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+def wrap(value):
+    if isinstance(value, dict):
+        return Record({key: wrap(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return [wrap(item) for item in value]
+    return value
+
+
+class Cassette:
+    """
+    서비스/호출별로 기록된 응답과 지연 시간 목록. 재생할 때는 기록된 순서대로 돌아가며 사용한다.
+    """
+    def __init__(self, data=None, speed=1.0):
+        self.data = data or {}
+        self.speed = speed
+        self.calls = {}
+        self._positions = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path, speed=1.0):
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f), speed)
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, ensure_ascii=False, indent=2, default=str)
+
+    def has(self, service, key):
+        return key in self.data.get(service, {})
+
+    def record(self, service, key, latency_ms, response=None, error=None, operation=None):
+        entry = {"latency_ms": round(latency_ms, 1)}
+        if error is not None:
+            entry["error"], entry["operation"] = error, operation
+        else:
+            entry["response"] = response
+        with self._lock:
+            self.data.setdefault(service, {}).setdefault(key, []).append(entry)
+
+    def replay(self, service, key):
+        entries = self.data[service][key]
+        with self._lock:
+            position = self._positions.get((service, key), 0)
+            self._positions[(service, key)] = position + 1
+            self.calls[f"{service}.{key}"] = self.calls.get(f"{service}.{key}", 0) + 1
+        entry = entries[position % len(entries)]
+        time.sleep(entry["latency_ms"] / 1000 * self.speed)
+        if "error" in entry:
+            if entry.get("operation"):
+                raise ClientError({"Error": entry["error"]}, entry["operation"])
+            raise RuntimeError(entry["error"])
+        # 호출마다 새 객체를 돌려줘야 호출한 쪽에서 값을 바꿔도 다른 호출에 영향이 없다
+        return wrap(json.loads(json.dumps(entry["response"])))
+
+
+class ReplayClient:
+    """
+    clients 레지스트리에 넣는 가짜 클라이언트. client.chat.completions.create(...) 같은 호출 경로를
+    카세트 키로 바꿔 기록된 응답을 돌려준다. 카세트에 없는 호출(cse() 등 중간 단계)은 자기 자신을 반환한다.
+    """
+    def __init__(self, cassette, service, path=""):
+        self._cassette = cassette
+        self._service = service
+        self._path = path
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return ReplayClient(self._cassette, self._service, f"{self._path}.{name}" if self._path else name)
+
+    def __call__(self, *args, **kwargs):
+        for key in (call_key(self._path, kwargs), call_key(self._path, kwargs, schema=False)):
+            if self._cassette.has(self._service, key):
+                return self._cassette.replay(self._service, key)
+        return self
+
+
+class RecordingClient:
+    """
+    실제 클라이언트를 감싸 응답과 지연 시간을 카세트에 기록한다 (record 명령용).
+    """
+    def __init__(self, target, cassette, service, path=""):
+        self._target = target
+        self._cassette = cassette
+        self._service = service
+        self._path = path
+
+    def __getattr__(self, name):
+        value = getattr(self._target, name)
+        if isinstance(value, PLAIN_TYPES):
+            return value
+        return RecordingClient(value, self._cassette, self._service, f"{self._path}.{name}" if self._path else name)
+
+    def __call__(self, *args, **kwargs):
+        key = call_key(self._path, kwargs)
+        started = time.perf_counter()
+        try:
+            result = self._target(*args, **kwargs)
+        except ClientError as e:
+            latency_ms = (time.perf_counter() - started) * 1000
+            self._cassette.record(self._service, key, latency_ms, error=e.response["Error"], operation=e.operation_name)
+            raise
+        latency_ms = (time.perf_counter() - started) * 1000
+        if isinstance(result, PLAIN_TYPES) or hasattr(result, "model_dump"):
+            self._cassette.record(self._service, key, latency_ms, response=to_plain(result))
+            return result
+        return RecordingClient(result, self._cassette, self._service, self._path)
+
+
+class CassetteLLM(LLM):
+    """
+    업종 분석 LLMChain에 넣는 LLM. delegate가 있으면 실제 모델을 호출하며 기록하고, 없으면 재생한다.
+    """
+    cassette: Any
+    delegate: Any = None
+
+    @property
+    def _llm_type(self):
+        return "cassette"
+
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+        if self.delegate is None:
+            return self.cassette.replay("analysis", "predict")
+        started = time.perf_counter()
+        text = self.delegate.predict(prompt)
+        self.cassette.record("analysis", "predict", (time.perf_counter() - started) * 1000, response=text)
+        return text
+
+
+class NoCache:
+    """
+    OCR/업종/임베딩 캐시를 끄고 매번 API를 부르는 경로(캐시 미스)를 재기 위한 빈 캐시.
+    """
+    def get(self, *args, **kwargs):
+        return None
+
+    def put(self, *args, **kwargs):
+        pass
+
+    def get_many(self, keys):
+        return {}
+
+    def put_many(self, *args, **kwargs):
+        pass
+
+    def stats(self):
+        return {}
+
+
+def load_samples(directory=SAMPLE_DIR):
+    samples = []
+    for name in sorted(os.listdir(directory)):
+        if name.lower().endswith((".jpg", ".jpeg", ".png", ".pdf")):
+            with open(os.path.join(directory, name), "rb") as f:
+                data = f.read()
+            samples.append(ReceiptFile(name, data=data, is_pdf=data[:4] == b"%PDF"))
+    return samples
+
+
+def make_synthetic(count, seed=0, size=(1240, 2480)):
+    """
+    휴대폰 사진 크기의 합성 영수증 JPEG. 번호마다 내용이 달라 해시 기반 캐시/중복 검사에 걸리지 않는다.
+    """
+    from PIL import Image, ImageDraw
+    rng = random.Random(seed)
+    receipts = []
+    for index in range(count):
+        noise = Image.effect_noise(size, 40).convert("RGB")
+        image = Image.blend(Image.new("RGB", size, (235, 232, 225)), noise, 0.25)
+        draw = ImageDraw.Draw(image)
+        y = 120
+        draw.text((200, y), f"SYNTHETIC STORE #{index:04d}", fill=(20, 20, 20))
+        for _ in range(rng.randint(4, 14)):
+            y += 80
+            draw.text((200, y), f"ITEM-{rng.randint(100, 999)}    {rng.randint(1, 50) * 500:>8,}", fill=(30, 30, 30))
+        draw.text((200, y + 160), f"TOTAL    {rng.randint(5, 200) * 500:>8,}", fill=(10, 10, 10))
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG", quality=88)
+        receipts.append(ReceiptFile(f"synthetic_{index:04d}.jpg", data=buffer.getvalue()))
+    return receipts
+
+
+def install(cassette, notion_rate=NOTION_RATE, warm_cache=False, analysis_llm=None, recording=False,
+            category_backend=pipeline.CATEGORY_BACKEND, use_knn=False, receipt_mode=pipeline.RECEIPT_MODE):
+    """
+    공유 클라이언트, 캐시, Notion writer, 체인을 벤치마크용으로 바꿔 끼운다.
+    recording이면 실제 클라이언트를 감싸 기록하고, 아니면 카세트를 재생하는 가짜 클라이언트를 넣는다.
+    지침 인덱스는 기록할 때는 실제 인덱스를, 재생할 때는 BENCH_GUIDELINE_CHUNKS로 만든 작은 인덱스를 쓴다.
+    use_knn이면 빈 메모리 k-NN 분류기로 시작해 실행 중에 학습한 판단으로 적중 여부를 측정한다.
+    """
+    uses_guideline = category_backend == "guideline" or receipt_mode == "fused"
+    if recording and uses_guideline:
+        guideline_index.get_guideline_index()  # 인덱스 빌드 요청은 카세트에 기록하지 않는다
+    for service in SERVICES:
+        if recording:
+            client = RecordingClient(clients.get_client(service), cassette, service)
+        else:
+            client = ReplayClient(cassette, service)
+        clients.override_client(service, client)
+    if not warm_cache:
+        ocr_cache._cache = NoCache()
+        merchant_cache._cache = NoCache()
+    # 질의 임베딩이 매번 카세트에 기록/재생되도록 디스크 임베딩 캐시는 쓰지 않는다
+    guideline_index._embedding_cache = guideline_index.EmbeddingCache(":memory:") if warm_cache else NoCache()
+    if not recording and uses_guideline:
+        vectors = np.vstack([guideline_index.embed_texts([chunk["text"]]) for chunk in BENCH_GUIDELINE_CHUNKS])
+        guideline_index.set_guideline_index(guideline_index.GuidelineIndex.from_vectors(BENCH_GUIDELINE_CHUNKS, vectors))
+    receipt_knn._knn = receipt_knn.ReceiptKnn(":memory:")
+    get_object_store()  # 지연 import(boto3)가 첫 영수증 지연에 섞이지 않도록 미리 만든다
+    # 카세트에는 pages.create만 기록되어 있으므로 해시 속성 조회/중복 검사는 하지 않는다
+    notion_sink._writer = NotionWriter(rate=notion_rate, dead_letter_path=None, hash_property="").start()
+    pipeline._pipeline = pipeline.build_receipt_chain(
+        analysis_llm=analysis_llm or CassetteLLM(cassette=cassette), category_backend=category_backend,
+        use_knn=use_knn, mode=receipt_mode,
+    )
+
+
+def process(receipt_file):
+    """
+    slack_noti.process_shared_file과 같은 DAG로 영수증 하나를 처리하고 단계별 타이밍을 반환.
+    """
+    def upload(download):
+        return store_receipt(download, download.name)
+
+    def notion(download, assistant, upload):
+        ticket = notion_sink.get_notion_writer().write(
+            assistant['ocr_response'], upload, assistant['business_category'], assistant['assistant_response'],
+            key=receipt_hash(None, download.getvalue()),
+        )
+        status = ticket.wait(timeout=NOTION_WAIT_TIMEOUT)
+        if status not in ("created", "duplicate"):
+            raise RuntimeError(f"Notion 저장 실패 ({status}): {ticket.error}")
+
+    scheduler = StageScheduler([
+        Stage("download", lambda: receipt_file),
+        Stage("upload", upload, ["download"]),
+        *pipeline.receipt_stages(source="download"),
+        Stage("notion", notion, ["download", "assistant", "upload"]),
+    ])
+    _, timings = scheduler.run()
+    return timings
+
+
+def run_level(receipts, concurrency):
+    latencies, stage_seconds, failures = [], {}, []
+    lock = threading.Lock()
+
+    def timed(receipt_file):
+        started = time.perf_counter()
+        try:
+            timings = process(receipt_file)
+        except Exception as e:
+            with lock:
+                failures.append(f"{receipt_file.name}: {e}")
+            return
+        with lock:
+            latencies.append(time.perf_counter() - started)
+            for name, timing in timings.items():
+                stage_seconds.setdefault(name, []).append(timing["seconds"])
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(timed, receipts))
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    for failure in failures[:5]:
+        print(f"  실패: {failure}")
+    return {
+        "concurrency": concurrency,
+        "receipts": len(receipts),
+        "failed": len(failures),
+        "seconds": elapsed,
+        "per_minute": len(latencies) / elapsed * 60 if elapsed else 0.0,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "max": max(latencies, default=0.0),
+        "peak_traced_mb": peak / 1024 / 1024,
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,  # Linux에서는 KB 단위
+        "stages_p50": {name: percentile(values, 50) for name, values in stage_seconds.items()},
+    }
+
+
+def print_results(results, baseline=None):
+    header = f"{'conc':>5}{'n':>5}{'fail':>5}{'sec':>8}{'rcpt/min':>10}{'p50':>8}{'p95':>8}{'p99':>8}{'peakMB':>9}{'rssMB':>8}"
+    print(header)
+    print("-" * len(header))
+    for level in results["levels"]:
+        print(f"{level['concurrency']:>5}{level['receipts']:>5}{level['failed']:>5}{level['seconds']:>8.1f}"
+              f"{level['per_minute']:>10.1f}{level['p50']:>8.2f}{level['p95']:>8.2f}{level['p99']:>8.2f}"
+              f"{level['peak_traced_mb']:>9.1f}{level['max_rss_mb']:>8.0f}")
+    last = results["levels"][-1]
+    print("단계별 p50(초, 마지막 동시 처리 수준): " + ", ".join(f"{name}={seconds:.2f}" for name, seconds in last["stages_p50"].items()))
+    if baseline is None:
+        return
+    print(f"\n기준 결과 대비 변화 ({baseline.get('label', '')})")
+    base_levels = {level["concurrency"]: level for level in baseline["levels"]}
+    for level in results["levels"]:
+        base = base_levels.get(level["concurrency"])
+        if base is None:
+            continue
+        changes = []
+        for field in ("per_minute", "p50", "p95", "peak_traced_mb"):
+            if base[field]:
+                changes.append(f"{field} {(level[field] - base[field]) / base[field]:+.1%}")
+        print(f"  conc={level['concurrency']}: " + ", ".join(changes))
+
+
+def run(args):
+    cassette = Cassette.load(args.cassette, speed=args.speed)
+    install(cassette, notion_rate=args.notion_rate, warm_cache=args.warm_cache, category_backend=args.category_backend,
+            use_knn=args.knn, receipt_mode=args.receipt_mode)
+    corpus = load_samples(args.samples) + make_synthetic(args.synthetic, seed=args.seed)
+    receipts = [corpus[index % len(corpus)] for index in range(args.receipts)]
+    print(f"영수증 {len(receipts)}건 (샘플 {len(corpus) - args.synthetic}종 + 합성 {args.synthetic}종), "
+          f"지연 배율 {args.speed}, 캐시 {'사용' if args.warm_cache else '끔'}, 비목 판단 {args.category_backend}"
+          f"{', k-NN 사용' if args.knn else ''}, 처리 방식 {args.receipt_mode}")
+    levels = []
+    for concurrency in [int(value) for value in args.concurrency.split(",")]:
+        print(f"동시 처리 {concurrency} 실행 중...")
+        levels.append(run_level(receipts, concurrency))
+    notion_sink.get_notion_writer().close()
+    results = {"label": args.label or time.strftime("%Y-%m-%d %H:%M"), "speed": args.speed,
+               "category_backend": args.category_backend, "receipt_mode": args.receipt_mode, "levels": levels,
+               "calls": cassette.calls, "services": service_stats()}
+    if args.knn:
+        results["knn"] = receipt_knn.get_receipt_knn().stats()
+        print(f"k-NN 분류 지표: {results['knn']}")
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"결과 저장: {args.save}")
+    return 0 if all(level["failed"] == 0 for level in levels) else 1
+
+
+def record(args):
+    from langchain.chat_models import ChatOpenAI
+    cassette = Cassette()
+    delegate = ChatOpenAI(model="gpt-4", temperature=0, openai_api_key=pipeline.OPEN_AI_KEY)
+    install(cassette, analysis_llm=CassetteLLM(cassette=cassette, delegate=delegate), recording=True,
+            category_backend=args.category_backend, receipt_mode=args.receipt_mode)
+    for path in args.paths:
+        with open(path, "rb") as f:
+            data = f.read()
+        timings = process(ReceiptFile(os.path.basename(path), data=data, is_pdf=data[:4] == b"%PDF"))
+        print(f"{path}: { {name: round(timing['seconds'], 2) for name, timing in timings.items()} }")
+    notion_sink.get_notion_writer().close()
+    cassette.save(args.output)
+    print(f"카세트 저장: {args.output}")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="기록된 API 응답으로 영수증 파이프라인 성능을 측정합니다.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="카세트를 재생하며 벤치마크 실행")
+    run_parser.add_argument("--cassette", default=DEFAULT_CASSETTE)
+    run_parser.add_argument("--samples", default=SAMPLE_DIR, help="샘플 영수증 폴더")
+    run_parser.add_argument("--synthetic", type=int, default=8, help="합성 영수증 수")
+    run_parser.add_argument("--receipts", type=int, default=16, help="동시 처리 수준마다 처리할 영수증 수")
+    run_parser.add_argument("--concurrency", default="1,4,8", help="쉼표로 구분한 동시 처리 수")
+    run_parser.add_argument("--speed", type=float, default=1.0, help="기록된 지연 시간 배율")
+    run_parser.add_argument("--notion-rate", type=float, default=NOTION_RATE)
+    run_parser.add_argument("--warm-cache", action="store_true", help="OCR/업종/임베딩 캐시를 켠 채로 측정")
+    run_parser.add_argument("--category-backend", choices=("guideline", "assistant"), default=pipeline.CATEGORY_BACKEND,
+                            help="비목 판단 방식 (로컬 지침 인덱스 / 원격 Assistant)")
+    run_parser.add_argument("--knn", action="store_true", help="k-NN 분류기를 켠 채로 측정 (빈 상태에서 시작, 재생 임베딩은 고정 벡터라 적중률이 실제보다 높다)")
+    run_parser.add_argument("--receipt-mode", choices=("chain", "fused"), default=pipeline.RECEIPT_MODE,
+                            help="처리 방식 (다단계 체인 / 한 번의 vision 요청)")
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--label", help="결과에 붙일 이름")
+    run_parser.add_argument("--save", help="결과 JSON 저장 경로")
+    run_parser.add_argument("--compare", help="비교할 이전 결과 JSON")
+    record_parser = commands.add_parser("record", help="실제 API를 호출하며 카세트 기록")
+    record_parser.add_argument("paths", nargs="+")
+    record_parser.add_argument("--output", default=DEFAULT_CASSETTE)
+    record_parser.add_argument("--category-backend", choices=("guideline", "assistant"), default=pipeline.CATEGORY_BACKEND)
+    record_parser.add_argument("--receipt-mode", choices=("chain", "fused"), default=pipeline.RECEIPT_MODE)
+    args = parser.parse_args(argv)
+    return run(args) if args.command == "run" else record(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,16 +1,37 @@
-import os, openai
-from openai import OpenAI
+import os, random, asyncio
 from langchain.chains.base import Chain
 from langchain.prompts import PromptTemplate
 
 from typing import Dict
-from typing import Dict
-from dotenv import load_dotenv
-from utils import is_pdf_by_signature, encode_image, pdf_to_image, extract_json_from_string
+import config  # .env는 config에서 한 번만 읽는다
+from utils import ocr_receipt_file
+from async_utils import ocr_receipt_file_async
+from clients import get_openai_client, get_async_openai_client
+from instrumentation import stage, add, record_usage, cache_result
+from receipt_schema import extract_json, parse_decision, decision_reask_prompt, DECISION_JSON_SCHEMA
+from prompts import guideline_system_prompt
+from guideline_index import get_guideline_index, format_hits, GUIDELINE_TOP_K
+from receipt_knn import get_receipt_knn, KNN_SHADOW_RATE
+from fused import fused_receipt_file, guideline_context
+from resilience import call, call_async
+from assistant import (
+    wait_for_run, wait_for_run_async, stream_run, get_run_reply, get_run_reply_async, AssistantThreadPool,
+)
 
-load_dotenv('../.env')
 
-client = OpenAI(api_key=os.getenv("OPEN-AI"))
+ASSISTANT_ID = os.getenv("ASSISTANT-ID", 'asst_az9m2hNBZWYkpNZiiFELc4Dc')
+# json_object로 설정하면 Run을 JSON 모드로 실행 (Assistant의 도구 구성이 허용하는 경우)
+ASSISTANT_RESPONSE_FORMAT = os.getenv("ASSISTANT-RESPONSE-FORMAT", "")
+ASSISTANT_REASK = os.getenv("ASSISTANT-REASK", "1") != "0"  # 판단 값이 잘못되면 같은 Thread에서 한 번 더 묻기
+# 로컬 지침 검색 + 한 번의 chat 호출로 비목을 판단할 때 쓰는 모델과 응답 형식 (json_schema / json_object / text)
+GUIDELINE_MODEL = os.getenv("GUIDELINE-MODEL", "gpt-4o")
+GUIDELINE_RESPONSE_FORMAT = os.getenv("GUIDELINE-RESPONSE-FORMAT", "json_schema")
+UNKNOWN_CATEGORY = "알 수 없음"  # 검색이 실패했을 때의 업종
+# 영수증마다 Thread를 빌려 쓰는 풀 (프로세스 전체에서 공유)
+thread_pool = AssistantThreadPool(
+    get_openai_client,
+    max_runs_per_thread=int(os.getenv("ASSISTANT-THREAD-RUNS", "20")),
+)
 
 class OCRChain(Chain):
     """
@@ -29,59 +50,18 @@ class OCRChain(Chain):
 
     def _call(self, inputs: Dict[str, str]) -> Dict[str, str]:
         image_path = inputs["image_path"]
-        # print(f"Image path: {image_path}")
-        try:
-            # 이미지 파일 열기
-            if is_pdf_by_signature(image_path):
-                base64_image = pdf_to_image(image_path)
-            else:
-                base64_image = encode_image(image_path)
-            response = openai.chat.completions.create(
-                model="gpt-4o",  # GPT-4 Vision 모델 사용
-                messages=[
-                    {
-                        "role": "system", 
-                        "content": "You are an assistant that extracts information from receipt images."
-                    },
-                    {
-                        "role": "user", 
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": '''다음 텍스트는 영수증의 정보입니다. 이 텍스트에서 가게 이름, 날짜, 항목, 총액을 분석하고, 아래의 JSON형식으로 결과를 반환해 주세요.
-                                JSON 형식:
-                                {
-                                    "상호명": "가게 이름",
-                                    "날짜": "YYYY-MM-DD",
-                                    "항목": [
-                                        {"이름": "상품1", "가격": 상품1 가격},
-                                        {"이름": "상품2", "가격": 상품2 가격}
-                                    ],
-                                    "총액": 총액
-                                }
-                                반환할 JSON 형식은 반드시 위의 구조와 일치해야 하며, 불필요한 설명은 포함하지 마세요.
-                                영수증 텍스트:
-                                """
-                                [여기에 영수증의 텍스트 또는 OCR로 추출한 내용이 들어갑니다]
-                                """
-                                결과:''' 
-                            },{
-                                "type": "image_url",
-                                "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"},
-                            }
-                        ],
-                    },
-                ],
-            )
-            
-            # 응답 파싱
-            raw_response = extract_json_from_string(response.choices[0].message.content)
-            print(f'raw_response = {raw_response}')
-            return {"ocr_response": raw_response}
-        except Exception as e:
-            
-            return {"ocr_response": f"Error during OpenAI API call: {e}"}
-        
+        # 같은 파일은 OCR 캐시에서 바로 가져온다.
+        # 실패(재시도 소진, 회로 차단, 검증 실패)는 예외로 올려 보내 StageError로 'chain' 단계 실패를 알린다
+        raw_response = ocr_receipt_file(image_path)
+        print(f'raw_response = {raw_response}')
+        return {"ocr_response": raw_response}
+
+    async def _acall(self, inputs: Dict[str, str], **kwargs) -> Dict[str, str]:
+        image_path = inputs["image_path"]
+        raw_response = await ocr_receipt_file_async(image_path)
+        print(f'raw_response = {raw_response}')
+        return {"ocr_response": raw_response}
+
 
 class SearchChain(Chain):
     def __init__(self, tool):
@@ -96,7 +76,7 @@ class SearchChain(Chain):
     def output_keys(self):
         return ["search_results", "business_name"]
 
-    def _call(self, inputs, **kwargs):
+    def _build_query(self, inputs):
         business_name = inputs['ocr_response']["상호명"]
         item = ','.join([x["이름"] for x in inputs['ocr_response']['항목']])
         print('business_name = ', business_name)
@@ -106,17 +86,31 @@ class SearchChain(Chain):
         else:
             query = business_name
         print('query = ', query)
+        return business_name, query
+
+    def _call(self, inputs, **kwargs):
+        business_name, query = self._build_query(inputs)
         search_results = self._tool.func(query)
         return {"search_results": search_results, "business_name": business_name}
+
+    async def _acall(self, inputs, **kwargs):
+        business_name, query = self._build_query(inputs)
+        if self._tool.coroutine is not None:
+            search_results = await self._tool.coroutine(query)
+        else:
+            search_results = await asyncio.to_thread(self._tool.func, query)
+        return {"search_results": search_results, "business_name": business_name}
     
     
 class CategoryAssistantChain(Chain):
     """
     OpenAI Assistant에 질의하는 사용자 정의 체인.
     """
-    def __init__(self, prompt: PromptTemplate):
+    def __init__(self, prompt: PromptTemplate, stream: bool = False, run_timeout: float = 120.0):
         super().__init__()
         self._prompt = prompt
+        self._stream = stream  # True이면 스트리밍 Runs API 사용
+        self._run_timeout = run_timeout
 
 
     @property
@@ -129,33 +123,380 @@ class CategoryAssistantChain(Chain):
         return ["assistant_response"]
     
 
+    def _run_kwargs(self):
+        if ASSISTANT_RESPONSE_FORMAT:
+            return {"response_format": {"type": ASSISTANT_RESPONSE_FORMAT}}
+        return {}
+
+    def _ask(self, client, thread_id, content):
+        # 메시지/Run 생성은 두 번 보내면 중복되므로 재시도하지 않는다 (서킷 브레이커와 통계만 적용)
+        call("openai", lambda: client.beta.threads.messages.create(
+            thread_id=thread_id,
+            role="user",
+            content=content
+        ), retries=0)
+        if self._stream:
+            # 스트리밍으로 실행하면 답변이 생성되는 즉시 받을 수 있다
+            run, response = call("openai", lambda: stream_run(client, thread_id, ASSISTANT_ID, **self._run_kwargs()), retries=0)
+        else:
+            # Run 생성 및 실행
+            run = call("openai", lambda: client.beta.threads.runs.create(
+                thread_id=thread_id,
+                assistant_id=ASSISTANT_ID,
+                **self._run_kwargs()
+            ), retries=0)
+            # Run 완료 대기 (백오프 폴링, 실패/만료 시 예외)
+            run = wait_for_run(client, thread_id, run, timeout=self._run_timeout)
+            # 이번 Run이 만든 메시지만 가져오기
+            response = call("openai", lambda: get_run_reply(client, thread_id, run.id))
+        record_usage(getattr(run, "usage", None), getattr(run, "model", ""))
+        return response
+
+    async def _ask_async(self, async_client, thread_id, content):
+        await call_async("openai", lambda: async_client.beta.threads.messages.create(
+            thread_id=thread_id,
+            role="user",
+            content=content
+        ), retries=0)
+        run = await call_async("openai", lambda: async_client.beta.threads.runs.create(
+            thread_id=thread_id,
+            assistant_id=ASSISTANT_ID,
+            **self._run_kwargs()
+        ), retries=0)
+        run = await wait_for_run_async(async_client, thread_id, run, timeout=self._run_timeout)
+        record_usage(getattr(run, "usage", None), getattr(run, "model", ""))
+        return await call_async("openai", lambda: get_run_reply_async(async_client, thread_id, run.id))
+
+    def _outputs(self, inputs, response, decision, errors):
+        return decision_outputs(inputs, response, decision, errors)
+
     def _call(self, inputs: Dict[str, str]) -> Dict[str, str]:
+        if inputs.get('knn_response'):
+            return knn_outputs(inputs)
         formatted_prompt = self._prompt.format(**inputs)
+        client = get_openai_client()
         print('ocr_response = ', inputs['ocr_response'])
         print('business_category = ', inputs['business_category'])
-        # OpenAI API 호출
-        thread_id = 'thread_tN3lfcgGLhP56xQuwpTPS11L'
-        assistant_id = 'asst_az9m2hNBZWYkpNZiiFELc4Dc'
-        message = client.beta.threads.messages.create(
-            thread_id=thread_id,
-            role="user",
-            content= formatted_prompt
-        )
-        # Run 생성 및 실행
-        run = client.beta.threads.runs.create(
-            thread_id=thread_id,
-            assistant_id=assistant_id
-        )
-        # Run 완료 대기
-        while run.status != "completed":
-            run = client.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run.id)
-        # 결과 메시지 가져오기
-        messages = client.beta.threads.messages.list(thread_id=thread_id)
-        # 결과 출력
-        for i, message in enumerate(messages):
-            if message.role == "assistant":
-                if i == 0:
-                    response = message.content[0].text.value
-        response = response.strip().replace('```','').replace('json','').replace('\n','')
-        return {"assistant_response": response, "business_category": inputs['business_category'], "ocr_response": inputs['ocr_response']}
-    
\ No newline at end of file
+        # OpenAI API 호출 (영수증마다 Thread를 독점적으로 빌려 씀)
+        with stage("openai.assistant", bytes_sent=len(formatted_prompt.encode('utf-8'))), thread_pool.lease() as lease:
+            lease.record_run()
+            response = self._ask(client, lease.thread_id, formatted_prompt)
+            decision, errors = parse_decision(extract_json(response))
+            if errors and ASSISTANT_REASK:
+                # 같은 Thread에 이어서 판단 값만 다시 묻는다 (앞 단계는 다시 실행하지 않음)
+                print(f"비목 판단 형식 오류, 다시 요청: {errors}")
+                add(reask_fields=errors)
+                lease.record_run()
+                decision, errors = parse_decision(extract_json(self._ask(client, lease.thread_id, decision_reask_prompt(errors))))
+        return self._outputs(inputs, response, decision, errors)
+
+    async def _acall(self, inputs: Dict[str, str], **kwargs) -> Dict[str, str]:
+        if inputs.get('knn_response'):
+            return knn_outputs(inputs)
+        formatted_prompt = self._prompt.format(**inputs)
+        async_client = get_async_openai_client()
+        # 동기 경로와 같은 구간 이름/지표로 기록한다
+        with stage("openai.assistant", bytes_sent=len(formatted_prompt.encode('utf-8'))):
+            # Thread 생성/삭제는 동기 클라이언트를 쓰므로 스레드에서 빌리고 반납한다
+            thread_id, runs = await asyncio.to_thread(thread_pool.acquire)
+            healthy = False
+            try:
+                runs += 1
+                response = await self._ask_async(async_client, thread_id, formatted_prompt)
+                decision, errors = parse_decision(extract_json(response))
+                if errors and ASSISTANT_REASK:
+                    print(f"비목 판단 형식 오류, 다시 요청: {errors}")
+                    add(reask_fields=errors)
+                    runs += 1
+                    retry = await self._ask_async(async_client, thread_id, decision_reask_prompt(errors))
+                    decision, errors = parse_decision(extract_json(retry))
+                healthy = True
+            finally:
+                await asyncio.to_thread(thread_pool.release, thread_id, runs, healthy)
+        return self._outputs(inputs, response, decision, errors)
+    
+
+class GuidelineCategoryChain(Chain):
+    """
+    로컬 지침 인덱스(guideline_index)에서 찾은 청크를 근거로 한 번의 chat 호출로 비목을 판단하는 체인.
+    CategoryAssistantChain과 입력/출력이 같고, Thread/Run 생성과 폴링이 없다.
+    """
+    def __init__(self, prompt: PromptTemplate, get_index=get_guideline_index, model: str = GUIDELINE_MODEL,
+                 top_k: int = GUIDELINE_TOP_K):
+        super().__init__()
+        self._prompt = prompt
+        self._get_index = get_index
+        self._model = model
+        self._top_k = top_k
+
+    @property
+    def input_keys(self):
+        return self._prompt.input_variables
+
+    @property
+    def output_keys(self):
+        return ["assistant_response"]
+
+    def _query(self, inputs):
+        # 업종만으로 질의하므로 같은 업종의 질의 임베딩은 캐시에서 나온다
+        return f"{inputs['business_category']} 지출의 비목 판단 기준 (회의비, 식비, 교통비)"
+
+    def _messages(self, inputs):
+        with stage("guideline.search"):
+            hits = self._get_index().search(self._query(inputs), self._top_k)
+        return [
+            {"role": "system", "content": guideline_system_prompt.format(context=format_hits(hits))},
+            {"role": "user", "content": self._prompt.format(**inputs)},
+        ]
+
+    def _request_kwargs(self, messages):
+        kwargs = {"model": self._model, "messages": messages, "temperature": 0}
+        if GUIDELINE_RESPONSE_FORMAT == "json_schema":
+            kwargs["response_format"] = {
+                "type": "json_schema",
+                "json_schema": {"name": "category_decision", "strict": True, "schema": DECISION_JSON_SCHEMA},
+            }
+        elif GUIDELINE_RESPONSE_FORMAT == "json_object":
+            kwargs["response_format"] = {"type": "json_object"}
+        return kwargs
+
+    def _reply(self, response):
+        record_usage(response.usage, self._model)
+        return response.choices[0].message.content or ""
+
+    def _call(self, inputs: Dict[str, str]) -> Dict[str, str]:
+        if inputs.get('knn_response'):
+            return knn_outputs(inputs)
+        client = get_openai_client()
+        print('business_category = ', inputs['business_category'])
+        messages = self._messages(inputs)
+        with stage("openai.guideline", bytes_sent=sum(len(m["content"].encode('utf-8')) for m in messages)):
+            response = self._reply(call("openai", lambda: client.chat.completions.create(**self._request_kwargs(messages))))
+            decision, errors = parse_decision(extract_json(response))
+            if errors and ASSISTANT_REASK:
+                # 앞의 대화를 그대로 붙여 판단 값만 다시 묻는다
+                print(f"비목 판단 형식 오류, 다시 요청: {errors}")
+                add(reask_fields=errors)
+                retry = messages + [{"role": "assistant", "content": response}, {"role": "user", "content": decision_reask_prompt(errors)}]
+                decision, errors = parse_decision(extract_json(self._reply(
+                    call("openai", lambda: client.chat.completions.create(**self._request_kwargs(retry)))
+                )))
+        return decision_outputs(inputs, response, decision, errors)
+
+    async def _acall(self, inputs: Dict[str, str], **kwargs) -> Dict[str, str]:
+        if inputs.get('knn_response'):
+            return knn_outputs(inputs)
+        async_client = get_async_openai_client()
+        # 질의 임베딩은 동기 클라이언트와 SQLite 캐시를 쓰므로 스레드에서 실행한다
+        messages = await asyncio.to_thread(self._messages, inputs)
+        response = self._reply(await call_async("openai", lambda: async_client.chat.completions.create(**self._request_kwargs(messages))))
+        decision, errors = parse_decision(extract_json(response))
+        if errors and ASSISTANT_REASK:
+            print(f"비목 판단 형식 오류, 다시 요청: {errors}")
+            retry = messages + [{"role": "assistant", "content": response}, {"role": "user", "content": decision_reask_prompt(errors)}]
+            decision, errors = parse_decision(extract_json(self._reply(
+                await call_async("openai", lambda: async_client.chat.completions.create(**self._request_kwargs(retry)))
+            )))
+        return decision_outputs(inputs, response, decision, errors)
+
+
+class FusedReceiptChain(Chain):
+    """
+    한 번의 vision 요청으로 영수증 정보, 업종, 비목 판단을 함께 받는 체인 (fused.py).
+    OCRChain → 업종 판단 → 비목 판단 체인을 합친 것과 입력/출력이 같으므로 SequentialChain에 혼자 넣어 쓴다.
+    """
+    def __init__(self, get_index=get_guideline_index, top_k: int = GUIDELINE_TOP_K):
+        super().__init__()
+        self._get_index = get_index
+        self._top_k = top_k
+
+    @property
+    def input_keys(self):
+        return ["image_path"]
+
+    @property
+    def output_keys(self):
+        return ["ocr_response", "search_results", "business_name", "business_category", "assistant_response"]
+
+    def _call(self, inputs: Dict[str, str]) -> Dict[str, str]:
+        result = fused_receipt_file(inputs["image_path"], guideline_context(self._get_index, self._top_k))
+        print(f'fused_response = {result["response"]}')
+        decision, errors = parse_decision(result["decision"])
+        return {
+            "ocr_response": result["ocr_response"],
+            "search_results": result["search_results"],
+            "business_name": result["ocr_response"]["상호명"],
+            "business_category": result["business_category"] or UNKNOWN_CATEGORY,
+            # 판단 값이 잘못되었으면 다른 체인처럼 모델 답변을 그대로 돌려준다
+            "assistant_response": result["response"].strip() if errors else decision.to_json(),
+        }
+
+    async def _acall(self, inputs: Dict[str, str], **kwargs) -> Dict[str, str]:
+        # 검색 도구와 캐시가 동기 코드이므로 요청 전체를 스레드에서 실행한다
+        return await asyncio.to_thread(self._call, inputs)
+
+
+def decision_outputs(inputs, response, decision, errors):
+    """
+    비목 판단 체인의 공통 출력. 검증된 판단은 항상 같은 JSON 형태로, 검증에 실패하면 모델 답변 그대로 돌려준다.
+    앞 단계에서 k-NN 분류기가 적중하지 못했으면(knn_response == "") 검증된 판단을 학습 데이터로 저장한다.
+    """
+    if errors:
+        print(f"비목 판단 검증 실패: {errors}")
+        assistant_response = response.strip()
+    else:
+        assistant_response = decision.to_json()
+        if inputs.get('knn_response') == "" and inputs['business_category'] != UNKNOWN_CATEGORY:
+            try:
+                get_receipt_knn().learn(inputs['ocr_response'], inputs['business_category'], decision)
+            except Exception as e:
+                print(f"k-NN 학습 실패: {e}")
+    return {"assistant_response": assistant_response, "business_category": inputs['business_category'], "ocr_response": inputs['ocr_response']}
+
+
+def knn_outputs(inputs):
+    # KnnCategoryChain이 이미 비목까지 정한 영수증
+    return {"assistant_response": inputs['knn_response'], "business_category": inputs['business_category'], "ocr_response": inputs['ocr_response']}
+
+
+class KnnCategoryChain(Chain):
+    """
+    이전에 판단한 비슷한 영수증(receipt_knn)으로 업종과 비목을 바로 정하는 체인.
+    신뢰도가 기준을 넘으면 검색/업종 분석을 건너뛰고 비목 판단(knn_response)까지 채워 뒤의 비목 판단 체인도 건너뛰게 하며,
+    아니면 fallback 체인(BusinessCategoryChain)을 그대로 실행한다. 적중 건의 KNN_SHADOW_RATE만큼은
+    정확도 측정을 위해 일부러 fallback 경로로 보낸다.
+    """
+    def __init__(self, knn, fallback: Chain, shadow_rate: float = KNN_SHADOW_RATE):
+        super().__init__()
+        self._knn = knn
+        self._fallback = fallback
+        self._shadow_rate = shadow_rate
+
+    @property
+    def input_keys(self):
+        return ["ocr_response"]
+
+    @property
+    def output_keys(self):
+        return ["search_results", "business_name", "business_category", "knn_response"]
+
+    def _lookup(self, inputs):
+        with stage("knn.classify"):
+            try:
+                _, _, prediction = self._knn.classify(inputs['ocr_response'])
+            except Exception as e:
+                # 분류기 오류는 LLM 경로로 넘긴다
+                print(f"k-NN 분류 실패: {e}")
+                return None
+            add(knn_hit=prediction is not None)
+            if prediction is not None and random.random() < self._shadow_rate:
+                self._knn.count_shadow()
+                add(knn_shadow=True)
+                return None
+        return prediction
+
+    def _outputs(self, inputs, prediction):
+        print(f"k-NN 적중: {inputs['ocr_response']['상호명']} -> {prediction.business_category} / {prediction.account} "
+              f"(신뢰도 {prediction.confidence:.2f}, 유사도 {prediction.similarity:.2f})")
+        return {
+            "search_results": "",
+            "business_name": inputs['ocr_response']["상호명"],
+            "business_category": prediction.business_category,
+            "knn_response": prediction.decision().to_json(),
+        }
+
+    def _call(self, inputs, **kwargs):
+        prediction = self._lookup(inputs)
+        if prediction is not None:
+            return self._outputs(inputs, prediction)
+        outputs = self._fallback.invoke(inputs)
+        return {**{key: outputs[key] for key in self._fallback.output_keys}, "knn_response": ""}
+
+    async def _acall(self, inputs, **kwargs):
+        prediction = await asyncio.to_thread(self._lookup, inputs)
+        if prediction is not None:
+            return self._outputs(inputs, prediction)
+        outputs = await self._fallback.ainvoke(inputs)
+        return {**{key: outputs[key] for key in self._fallback.output_keys}, "knn_response": ""}
+
+
+class BusinessCategoryChain(Chain):
+    """
+    상호명 → 업종 캐시를 앞에 둔 업종 판단 체인.
+    캐시에 있는 상호명이면 Google 검색과 업종 분석 LLM을 모두 건너뛴다.
+    """
+    def __init__(self, search_chain: Chain, analysis_chain: Chain, cache):
+        super().__init__()
+        self._search_chain = search_chain
+        self._analysis_chain = analysis_chain
+        self._cache = cache
+
+    @property
+    def input_keys(self):
+        return ["ocr_response"]
+
+    @property
+    def output_keys(self):
+        return ["search_results", "business_name", "business_category"]
+
+    def _call(self, inputs, **kwargs):
+        business_name = inputs['ocr_response']["상호명"]
+        cached = self._cache.get(business_name)
+        cache_result(cached is not None)
+        if cached is not None:
+            business_category, search_results = cached
+            print(f'업종 캐시 적중: {business_name} -> {business_category}')
+            return {
+                "search_results": search_results or "",
+                "business_name": business_name,
+                "business_category": business_category,
+            }
+        try:
+            search_outputs = self._search_chain.invoke(inputs)
+        except Exception as e:
+            return self._search_failed(business_name, e)
+        with stage("openai.analysis"):
+            # LangChain 클라이언트가 자체적으로 재시도하므로 여기서는 서킷 브레이커와 통계만 적용
+            analysis_outputs = call("openai", lambda: self._analysis_chain.invoke(search_outputs), retries=0)
+        business_category = analysis_outputs["business_category"].strip()
+        self._cache.put(business_name, business_category, search_outputs["search_results"])
+        return {
+            "search_results": search_outputs["search_results"],
+            "business_name": business_name,
+            "business_category": business_category,
+        }
+
+    async def _acall(self, inputs, **kwargs):
+        business_name = inputs['ocr_response']["상호명"]
+        cached = await asyncio.to_thread(self._cache.get, business_name)
+        cache_result(cached is not None)
+        if cached is not None:
+            business_category, search_results = cached
+            print(f'업종 캐시 적중: {business_name} -> {business_category}')
+            return {
+                "search_results": search_results or "",
+                "business_name": business_name,
+                "business_category": business_category,
+            }
+        try:
+            search_outputs = await self._search_chain.ainvoke(inputs)
+        except Exception as e:
+            return self._search_failed(business_name, e)
+        with stage("openai.analysis"):
+            analysis_outputs = await call_async("openai", lambda: self._analysis_chain.ainvoke(search_outputs), retries=0)
+        business_category = analysis_outputs["business_category"].strip()
+        await asyncio.to_thread(self._cache.put, business_name, business_category, search_outputs["search_results"])
+        return {
+            "search_results": search_outputs["search_results"],
+            "business_name": business_name,
+            "business_category": business_category,
+        }
+
+    def _search_failed(self, business_name, error):
+        # 오류 메시지를 검색 결과처럼 분석 프롬프트에 넣지 않고, 업종을 '알 수 없음'으로 둔 채 진행한다 (캐시하지 않음)
+        print(f"업종 검색 실패 ({business_name}): {error}")
+        return {
+            "search_results": "",
+            "business_name": business_name,
+            "business_category": UNKNOWN_CATEGORY,
+        }
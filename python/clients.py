@@ -0,0 +1,162 @@
+import os, threading
+import config  # .env는 config에서 한 번만 읽는다
+
+from resilience import POLICIES
+
+OPEN_AI_KEY = os.getenv("OPEN-AI")
+GOOGLE_API_KEY = os.getenv("GOOGLE-SEARCH-API-KEY")
+NOTION_API_KEY = os.getenv("NOTION")
+AWS_ACCESS_KEY = os.getenv("AWS-ACCESS-KEY")
+AWS_SECRET_KEY = os.getenv("AWS-SECRET-KEY")
+S3_REGION = os.getenv("S3-BUCKET-REGION")
+S3_ENDPOINT_URL = os.getenv("S3-ENDPOINT-URL")  # MinIO 등 S3 호환 저장소를 쓸 때 지정
+HTTP_POOL_SIZE = int(os.getenv("HTTP-POOL-SIZE", "20"))  # 서비스별 최대 동시 연결 수
+
+
+def _make_openai():
+    import httpx
+    from openai import OpenAI
+    return OpenAI(
+        api_key=OPEN_AI_KEY,
+        max_retries=0,  # 재시도는 resilience.call이 담당
+        http_client=httpx.Client(
+            limits=httpx.Limits(max_connections=HTTP_POOL_SIZE, max_keepalive_connections=HTTP_POOL_SIZE),
+            timeout=httpx.Timeout(POLICIES["openai"].timeout, connect=POLICIES["openai"].connect_timeout),
+        ),
+    )
+
+
+def _make_async_openai():
+    import httpx
+    from openai import AsyncOpenAI
+    return AsyncOpenAI(
+        api_key=OPEN_AI_KEY,
+        max_retries=0,  # 재시도는 resilience.call이 담당
+        http_client=httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=HTTP_POOL_SIZE, max_keepalive_connections=HTTP_POOL_SIZE),
+            timeout=httpx.Timeout(POLICIES["openai"].timeout, connect=POLICIES["openai"].connect_timeout),
+        ),
+    )
+
+
+def _make_s3(endpoint_url=S3_ENDPOINT_URL):
+    import boto3
+    from botocore.config import Config
+    # boto3 세션은 스레드 안전하지 않지만 만들어진 client는 여러 스레드에서 공유할 수 있다
+    session = boto3.session.Session(
+        aws_access_key_id=AWS_ACCESS_KEY,
+        aws_secret_access_key=AWS_SECRET_KEY,
+        region_name=S3_REGION,
+    )
+    return session.client(
+        "s3",
+        endpoint_url=endpoint_url,
+        config=Config(
+            max_pool_connections=HTTP_POOL_SIZE, tcp_keepalive=True, retries={"mode": "standard"},
+            connect_timeout=POLICIES["s3"].connect_timeout, read_timeout=POLICIES["s3"].timeout,
+        ),
+    )
+
+
+def _make_notion():
+    from notion_client import Client
+    return Client(auth=NOTION_API_KEY, timeout_ms=int(POLICIES["notion"].timeout * 1000))
+
+
+def _make_async_notion():
+    from notion_client import AsyncClient
+    return AsyncClient(auth=NOTION_API_KEY, timeout_ms=int(POLICIES["notion"].timeout * 1000))
+
+
+def _make_search_service():
+    import httplib2
+    from googleapiclient.discovery import build
+    # 라이브러리에 포함된 discovery 문서를 사용하므로 네트워크로 받아 오지 않는다
+    return build(
+        "customsearch", "v1", developerKey=GOOGLE_API_KEY, static_discovery=True, cache_discovery=False,
+        http=httplib2.Http(timeout=POLICIES["search"].timeout),
+    )
+
+
+_factories = {
+    "openai": _make_openai,
+    "async_openai": _make_async_openai,
+    "s3": _make_s3,
+    "notion": _make_notion,
+    "async_notion": _make_async_notion,
+}
+# httplib2 기반인 Google API 서비스 객체는 스레드 안전하지 않으므로 스레드마다 하나씩 만든다
+_per_thread_factories = {
+    "search": _make_search_service,
+}
+_clients = {}
+_local = threading.local()
+_lock = threading.Lock()
+_generation = 0  # override/reset 때마다 증가시켜 스레드별 캐시를 무효화
+
+
+def get_client(name):
+    """
+    이름에 해당하는 장기 클라이언트를 반환. 처음 요청될 때 한 번 만들고 이후에는 재사용한다.
+    """
+    if name in _per_thread_factories:
+        if getattr(_local, "generation", None) != _generation:
+            _local.clients, _local.generation = {}, _generation
+        clients = _local.clients
+        if name not in clients:
+            clients[name] = _clients.get(name) or _per_thread_factories[name]()
+        return clients[name]
+    client = _clients.get(name)
+    if client is None:
+        with _lock:
+            client = _clients.get(name)
+            if client is None:
+                client = _factories[name]()
+                _clients[name] = client
+    return client
+
+
+def override_client(name, client):
+    """
+    클라이언트를 직접 지정 (벤치마크/테스트용 대체 객체 주입). 스레드별 클라이언트도 이 값으로 대체된다.
+    """
+    global _generation
+    with _lock:
+        _clients[name] = client
+        _generation += 1
+
+
+def reset_clients():
+    global _generation
+    with _lock:
+        _clients.clear()
+        _generation += 1
+
+
+def get_openai_client():
+    return get_client("openai")
+
+
+def get_async_openai_client():
+    return get_client("async_openai")
+
+
+def get_s3_client(endpoint_url=None):
+    """
+    공유 S3 클라이언트. endpoint_url로 다른 S3 호환 저장소를 지정하면 같은 인증/연결 설정으로 새로 만든다.
+    """
+    if endpoint_url is None or endpoint_url == S3_ENDPOINT_URL:
+        return get_client("s3")
+    return _make_s3(endpoint_url)
+
+
+def get_notion_client():
+    return get_client("notion")
+
+
+def get_async_notion_client():
+    return get_client("async_notion")
+
+
+def get_search_service():
+    return get_client("search")
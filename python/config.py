@@ -0,0 +1,12 @@
+"""
+환경 설정(.env)을 프로세스에서 한 번만 읽는다.
+
+각 모듈은 load_dotenv를 직접 부르지 않고 `import config`만 한 뒤 os.getenv로 값을 읽는다.
+.env 위치는 실행 위치와 관계없이 저장소 루트(python/의 상위 폴더)이며, 환경 변수 ENV-FILE로 바꿀 수 있다.
+이미 설정된 환경 변수는 .env 값으로 덮어쓰지 않는다.
+"""
+import os
+from dotenv import load_dotenv
+
+ENV_FILE = os.environ.get("ENV-FILE", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".env"))
+load_dotenv(ENV_FILE)
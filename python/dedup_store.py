@@ -0,0 +1,159 @@
+"""
+Slack 이벤트 중복 제거 저장소.
+
+Slack은 리스너 응답이 늦으면 같은 이벤트(같은 event_id)를 다시 보내고, 같은 파일이 여러 채널에 공유되면
+file_id가 같은 file_shared 이벤트가 여러 번 온다. 이미 받은 event_id/file_id를 기억해 두었다가
+OCR/업로드/Notion 저장 같은 비싼 작업 전에 메모리 조회(O(1))만으로 걸러 낸다.
+봇을 다시 시작해도 걸러지도록 SQLite에도 저장하고, TTL이 지난 항목은 지운다.
+SQLite 쓰기는 Slack 리스너가 아니라 백그라운드 스레드가 모아서 하므로, 비정상 종료 직전
+EVENT-DEDUP-FLUSH-INTERVAL 동안 등록한 키는 재시작 후 잊힐 수 있다.
+"""
+import os, time, atexit, sqlite3, threading
+from collections import OrderedDict
+import config  # .env는 config에서 한 번만 읽는다
+
+EVENT_DEDUP_PATH = os.getenv("EVENT-DEDUP-PATH", "../cache/slack_events.sqlite3")
+EVENT_DEDUP_TTL = float(os.getenv("EVENT-DEDUP-TTL", str(24 * 3600)))  # Slack 재전송과 재공유를 막을 기간(초)
+EVENT_DEDUP_SIZE = int(os.getenv("EVENT-DEDUP-SIZE", "50000"))  # 메모리에 둘 최대 키 수
+EVENT_DEDUP_FLUSH_INTERVAL = float(os.getenv("EVENT-DEDUP-FLUSH-INTERVAL", "0.5"))  # 등록/취소를 SQLite에 모아 쓰는 주기(초)
+
+
+class DedupStore:
+    """
+    처리하기로 한 키(event_id, file_id 등)의 집합.
+    메모리의 OrderedDict(키 → 등록 시각, 등록 순서 = 시각 순서)가 기준이고 SQLite는 재시작 시 복원용이다.
+    claim/release는 메모리만 바꾸고 변경 내용은 백그라운드 스레드가 flush_interval마다 모아서 SQLite에 쓴다
+    (MetricsRecorder와 같은 방식). 따라서 리스너는 조회와 등록 모두 디스크 I/O를 기다리지 않는다.
+    """
+    def __init__(self, path=EVENT_DEDUP_PATH, ttl=EVENT_DEDUP_TTL, max_entries=EVENT_DEDUP_SIZE,
+                 flush_interval=EVENT_DEDUP_FLUSH_INTERVAL):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.flush_interval = flush_interval
+        self.claimed = 0
+        self.duplicates = 0
+        self._seen = OrderedDict()  # key -> 등록 시각
+        self._pending = {}  # 아직 SQLite에 쓰지 않은 변경: key -> 등록 시각 (None이면 삭제)
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()  # SQLite 쓰기는 한 번에 하나만
+        self._thread = None
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS seen_keys (key TEXT PRIMARY KEY, created REAL NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS seen_keys_created ON seen_keys (created)")
+        self._conn.execute("DELETE FROM seen_keys WHERE created < ?", (time.time() - ttl,))
+        self._conn.commit()
+        # 아직 만료되지 않은 키를 오래된 것부터 메모리에 올린다 (최근 max_entries개)
+        rows = self._conn.execute(
+            "SELECT key, created FROM (SELECT key, created FROM seen_keys ORDER BY created DESC LIMIT ?) ORDER BY created",
+            (max_entries,),
+        ).fetchall()
+        self._seen.update(rows)
+        atexit.register(self.flush)
+
+    def claim(self, *keys):
+        """
+        keys 중 하나라도 이미 등록되어 있으면 False (중복). 아니면 모두 등록하고 True를 반환.
+        확인과 등록을 한 번에 하므로 같은 이벤트가 동시에 두 번 와도 한 번만 True가 된다.
+        """
+        keys = [key for key in keys if key]
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            if any(key in self._seen for key in keys):
+                self.duplicates += 1
+                return False
+            for key in keys:
+                self._seen[key] = now
+                self._pending[key] = now
+            self._expire(now)
+            self.claimed += 1
+            self._start_writer()
+        return True
+
+    def release(self, *keys):
+        """
+        등록을 취소한다. 작업을 대기열에 넣지 못했거나 처리에 실패해서 다시 받아야 하는 키에 쓴다.
+        """
+        with self._lock:
+            for key in keys:
+                if key:
+                    self._seen.pop(key, None)
+                    self._pending[key] = None
+            self._start_writer()
+
+    def flush(self):
+        """
+        모아 둔 등록/취소를 SQLite에 쓰고 만료된 행을 지운다. 백그라운드 스레드와 종료 시(atexit)에 불린다.
+        """
+        with self._write_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO seen_keys (key, created) VALUES (?, ?)",
+                    [(key, created) for key, created in pending.items() if created is not None],
+                )
+                self._conn.executemany(
+                    "DELETE FROM seen_keys WHERE key = ?", [(key,) for key, created in pending.items() if created is None]
+                )
+                self._conn.execute("DELETE FROM seen_keys WHERE created < ?", (time.time() - self.ttl,))
+                self._conn.commit()
+            except sqlite3.Error:
+                self._conn.rollback()
+                with self._lock:
+                    # 그 사이에 들어온 변경이 더 최신이므로 덮어쓰지 않는다
+                    self._pending = {**pending, **self._pending}
+                raise
+
+    def _start_writer(self):
+        # self._lock을 잡은 상태에서 호출
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="dedup-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                print(f"이벤트 중복 제거 기록 저장 실패 (다음 주기에 다시 시도): {e}")
+
+    def __contains__(self, key):
+        with self._lock:
+            self._expire(time.time())
+            return key in self._seen
+
+    def stats(self):
+        with self._lock:
+            return {"claimed": self.claimed, "duplicates": self.duplicates, "memory_entries": len(self._seen)}
+
+    def _expire(self, now):
+        # 오래된 키가 앞에 있으므로 앞에서부터 만료/초과분만 지운다 (SQLite의 만료 행은 flush가 지운다)
+        while self._seen:
+            key, created = next(iter(self._seen.items()))
+            if now - created <= self.ttl and len(self._seen) <= self.max_entries:
+                break
+            self._seen.popitem(last=False)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_dedup_store():
+    """
+    프로세스 전체에서 공유하는 이벤트 중복 제거 저장소를 반환.
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = DedupStore()
+    return _store
@@ -0,0 +1,215 @@
+"""
+통합(fused) 모드: 영수증 한 장을 한 번의 vision 요청으로 보내 상호명/날짜/항목/총액, 업종, 비목 판단(판단/근거)을
+하나의 구조화된 응답(FUSED_JSON_SCHEMA)으로 받는다.
+
+기존 경로는 영수증 하나에 OCR(gpt-4o) → Google 검색 → 업종 분석(gpt-4) → 비목 판단으로 원격 호출이 여러 번 이어지지만,
+통합 모드는 지침 인덱스에서 찾은 비목 기준을 system 메시지에 미리 넣어 두고 검색은 모델이 업종을 확신하지 못할 때만
+search_business 도구(function calling)로 부른다. 기존 경로와의 지연 시간/비용/일치율 비교는 bench_fused.py로 한다.
+"""
+import os, json
+import config  # .env는 config에서 한 번만 읽는다
+from ocr_cache import get_ocr_cache, make_cache_key
+from instrumentation import stage, add, record_usage, cache_result
+from clients import get_openai_client
+from preprocess import preprocess_signature
+from resilience import call, hedged_call
+from utils import encode_image, is_pdf_by_signature, read_file_bytes, search_with_google_api
+from receipt_schema import (
+    FUSED_JSON_SCHEMA, RECEIPT_FIELDS, ReceiptValidationError, extract_json, parse_fused, fused_reask_prompt,
+)
+from prompts import fused_system_prompt
+from guideline_index import get_guideline_index, format_hits, GUIDELINE_TOP_K
+
+FUSED_MODEL = os.getenv("FUSED-MODEL", "gpt-4o")
+FUSED_MAX_SEARCHES = int(os.getenv("FUSED-MAX-SEARCHES", "1"))  # 한 영수증에서 허용하는 검색 도구 호출 횟수
+FUSED_MAX_PAGES = int(os.getenv("FUSED-MAX-PAGES", "4"))  # PDF는 앞에서부터 이 쪽수까지 이미지로 보낸다
+FUSED_REASK = os.getenv("FUSED-REASK", "1") != "0"  # 잘못된 필드만 다시 묻기
+# 업종을 모르는 상태에서 찾으므로 세 비목의 기준을 한꺼번에 가져오는 질의 (임베딩은 캐시에서 나온다)
+FUSED_GUIDELINE_QUERY = "연구비 비목 판단 기준: 회의비, 식비, 교통비의 집행 대상과 증빙"
+FUSED_USER_PROMPT = "영수증을 읽고 상호명, 날짜(YYYY-MM-DD), 항목, 총액, 업종, 판단, 근거를 JSON으로 답해 주세요."
+
+SEARCH_TOOL = {
+    "type": "function",
+    "function": {
+        "name": "search_business",
+        "description": "상호명을 웹에서 검색해 업종 정보를 가져온다. 영수증만으로 업종을 확신할 수 없을 때만 호출한다.",
+        "parameters": {
+            "type": "object",
+            "properties": {"query": {"type": "string", "description": "상호명 (필요하면 대표 품목을 쉼표로 덧붙임)"}},
+            "required": ["query"],
+            "additionalProperties": False,
+        },
+        "strict": True,
+    },
+}
+
+_context = (None, "")  # (지침 인덱스, 찾은 내용) — 인덱스가 바뀌면 다시 찾는다
+
+
+def guideline_context(get_index=get_guideline_index, top_k=GUIDELINE_TOP_K):
+    """
+    system 메시지에 넣을 비목 기준. 질의가 고정이므로 인덱스마다 한 번만 검색한다.
+    """
+    global _context
+    index = get_index()
+    if _context[0] is not index:
+        with stage("guideline.search"):
+            _context = (index, format_hits(index.search(FUSED_GUIDELINE_QUERY, top_k)))
+    return _context[1]
+
+
+def receipt_content(image_path, max_pages=FUSED_MAX_PAGES):
+    """
+    user 메시지에 넣을 영수증 내용 목록. 이미지는 base64 JPEG로, PDF는 텍스트 레이어가 있으면 텍스트만,
+    없으면 앞에서부터 max_pages쪽까지 렌더링해 한 요청에 함께 보낸다.
+    """
+    if not is_pdf_by_signature(image_path):
+        return [image_content(encode_image(image_path))]
+    # 순환 import를 피하기 위해 여기서 불러온다 (pdf_ingest가 utils를 사용)
+    from pdf_ingest import extract_pdf_text, has_text_layer, render_page, PDF_TEXT_MODE
+    page_texts = extract_pdf_text(image_path)
+    if PDF_TEXT_MODE != "off" and has_text_layer(page_texts):
+        return [{"type": "text", "text": "영수증 텍스트:\n" + "\n\n".join(page_texts)}]
+    pages = min(len(page_texts), max_pages)
+    return [image_content(render_page(image_path, page)) for page in range(1, pages + 1)]
+
+
+def image_content(base64_image):
+    return {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}}
+
+
+def build_fused_messages(content, context):
+    return [
+        {"role": "system", "content": fused_system_prompt.format(context=context)},
+        {"role": "user", "content": [{"type": "text", "text": FUSED_USER_PROMPT}] + content},
+    ]
+
+
+def content_bytes(content):
+    return sum(len(part["image_url"]["url"] if part["type"] == "image_url" else part["text"].encode('utf-8')) for part in content)
+
+
+def fused_request_kwargs(messages, allow_search):
+    kwargs = {
+        "model": FUSED_MODEL,
+        "messages": messages,
+        "temperature": 0,
+        "response_format": {
+            "type": "json_schema",
+            "json_schema": {"name": "receipt_category", "strict": True, "schema": FUSED_JSON_SCHEMA},
+        },
+    }
+    if FUSED_MAX_SEARCHES > 0:
+        # 검색 횟수를 다 쓴 뒤에도 대화에 도구 호출 기록이 있으므로 tools는 그대로 두고 호출만 막는다
+        kwargs["tools"] = [SEARCH_TOOL]
+        kwargs["tool_choice"] = "auto" if allow_search else "none"
+    return kwargs
+
+
+def run_search_tool(tool_call, search_results):
+    """
+    모델이 요청한 검색을 실행하고 tool 메시지를 반환. 검색 실패도 모델에게 그대로 알려 판단하게 한다.
+    """
+    try:
+        query = json.loads(tool_call.function.arguments)["query"]
+        snippets = [x['snippet'] for x in search_with_google_api(query)]
+        search_results.extend(snippets)
+        result = "\n".join(snippets) or "검색 결과 없음"
+        print(f"통합 모드 검색: {query}")
+    except Exception as e:
+        print(f"통합 모드 검색 실패: {e}")
+        result = f"검색 실패: {e}"
+    return {"role": "tool", "tool_call_id": tool_call.id, "content": result}
+
+
+def assistant_tool_message(message):
+    return {
+        "role": "assistant",
+        "content": message.content,
+        "tool_calls": [
+            {"id": tool_call.id, "type": "function",
+             "function": {"name": tool_call.function.name, "arguments": tool_call.function.arguments}}
+            for tool_call in message.tool_calls
+        ],
+    }
+
+
+def request_fused(content, context):
+    """
+    영수증 내용(receipt_content)과 지침 내용을 한 번에 보내 영수증 정보/업종/비목 판단을 받는다.
+    모델이 search_business를 부르면 검색 결과를 붙여 이어서 묻고 (최대 FUSED_MAX_SEARCHES번),
+    검증에 실패한 필드가 있으면 그 필드만 한 번 더 묻는다.
+    Returns:
+        dict: {"ocr_response", "business_category", "decision", "search_results", "errors", "response"}.
+            업종/판단 필드의 오류는 errors에 남기고 호출한 쪽이 처리한다.
+    Raises:
+        ReceiptValidationError: 응답에 JSON이 없거나 재질의 후에도 영수증 필드(상호명/날짜/항목/총액)가 잘못되었을 때.
+    """
+    client = get_openai_client()
+    messages = build_fused_messages(content, context)
+    search_results = []
+    with stage("openai.fused", bytes_sent=content_bytes(content)):
+        for searches in range(FUSED_MAX_SEARCHES + 1):
+            kwargs = fused_request_kwargs(messages, allow_search=searches < FUSED_MAX_SEARCHES)
+            # 부수 효과가 없는 요청이므로 느리면 OCR처럼 한 번 더 보낸다
+            response = hedged_call("openai", lambda: client.chat.completions.create(**kwargs))
+            record_usage(response.usage, FUSED_MODEL)
+            message = response.choices[0].message
+            tool_calls = getattr(message, "tool_calls", None)
+            if not tool_calls:
+                break
+            add(tool_searches=searches + 1)
+            messages = messages + [assistant_tool_message(message)]
+            messages += [run_search_tool(tool_call, search_results) for tool_call in tool_calls]
+        reply = message.content
+        data = extract_json(reply)
+        if data is None:
+            print(f"통합 응답에서 JSON을 찾을 수 없습니다: {reply!r:.200}")
+            raise ReceiptValidationError(RECEIPT_FIELDS, reply)
+        receipt, business_category, decision, errors = parse_fused(data)
+        if errors and FUSED_REASK:
+            print(f"잘못된 필드만 다시 요청: {errors}")
+            add(reask_fields=errors)
+            retry = messages + [{"role": "assistant", "content": reply}, {"role": "user", "content": fused_reask_prompt(errors)}]
+            kwargs = {**fused_request_kwargs(retry, allow_search=False), "response_format": {"type": "json_object"}}
+            response = call("openai", lambda: client.chat.completions.create(**kwargs))
+            record_usage(response.usage, FUSED_MODEL)
+            fixed = extract_json(response.choices[0].message.content)
+            if isinstance(fixed, dict):
+                data = {**data, **{name: fixed[name] for name in errors if name in fixed}}
+            receipt, business_category, decision, errors = parse_fused(data)
+    if errors:
+        print(f"통합 응답 검증 실패: {errors}")
+        receipt_fields = [name for name in errors if name in RECEIPT_FIELDS]
+        if receipt_fields:
+            raise ReceiptValidationError(receipt_fields, reply)
+    return {
+        "ocr_response": receipt.to_dict(),
+        "business_category": business_category,
+        "decision": decision.to_dict(),
+        "search_results": "\n".join(search_results),
+        "errors": errors,
+        "response": reply,
+    }
+
+
+def fused_receipt_file(image_path, context, use_cache=True):
+    """
+    영수증 파일을 통합 모드로 처리. 같은 파일/모델/프롬프트(지침 내용 포함)면 OCR 캐시에 저장된 결과를 돌려준다.
+    """
+    cache = get_ocr_cache() if use_cache else None
+    if cache is not None:
+        key = make_cache_key(
+            read_file_bytes(image_path), FUSED_MODEL,
+            fused_system_prompt.format(context=context) + FUSED_USER_PROMPT + preprocess_signature(),
+        )
+        cached = cache.get(key)
+        cache_result(cached is not None)
+        if cached is not None:
+            print(f"통합 모드 캐시 적중: {image_path}")
+            return cached
+    result = request_fused(receipt_content(image_path), context)
+    # 업종/판단 검증을 통과하지 못한 결과는 캐시하지 않는다 (영수증 필드 오류는 예외로 끝난다)
+    if cache is not None and not result["errors"]:
+        cache.put(key, result)
+    return result
@@ -0,0 +1,404 @@
+"""
+연구비 집행 지침 PDF의 로컬 벡터 검색 (원격 Assistant 파일 검색 대체).
+
+- pdfplumber로 페이지별 텍스트를 뽑아 겹치는 청크로 나누고, OpenAI 임베딩으로 FAISS 인덱스를 만든다.
+- 임베딩은 (모델, 청크 내용) 해시를 키로 SQLite에 캐시하므로 같은 청크는 다시 임베딩하지 않는다.
+- PDF별 내용 해시를 manifest.json에 기록해 두고, 바뀌거나 추가된 PDF만 다시 추출/임베딩한다.
+  삭제된 PDF의 청크는 인덱스에서 빠진다.
+- 인덱스 파일은 메모리 매핑으로 열어 여러 워커 프로세스가 같은 페이지를 공유한다.
+
+사용법:
+    python guideline_index.py build              # 바뀐 PDF만 다시 인덱싱
+    python guideline_index.py build --rebuild    # 전체 다시 추출 (임베딩은 캐시 사용)
+    python guideline_index.py search "회의 다과 구입" -k 4
+"""
+import os, sys, json, time, sqlite3, hashlib, argparse, threading
+import config  # .env는 config에서 한 번만 읽는다
+import numpy as np
+
+from clients import get_openai_client
+from instrumentation import stage, add, record_usage
+from resilience import call
+
+GUIDELINE_PDF_DIR = os.getenv("GUIDELINE-PDF-DIR", "../pdf")
+GUIDELINE_INDEX_DIR = os.getenv("GUIDELINE-INDEX-DIR", "../cache/guideline_index")
+GUIDELINE_AUTO_BUILD = os.getenv("GUIDELINE-AUTO-BUILD", "1") != "0"  # 인덱스가 없거나 PDF가 바뀌었으면 처음 쓸 때 만든다
+EMBEDDING_MODEL = os.getenv("EMBEDDING-MODEL", "text-embedding-3-small")
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING-CACHE-PATH", "../cache/embedding_cache.sqlite3")
+EMBEDDING_BATCH = int(os.getenv("EMBEDDING-BATCH", "64"))  # 한 번의 embeddings 요청에 넣을 청크 수
+CHUNK_SIZE = int(os.getenv("GUIDELINE-CHUNK-SIZE", "1000"))
+CHUNK_OVERLAP = int(os.getenv("GUIDELINE-CHUNK-OVERLAP", "150"))
+GUIDELINE_TOP_K = int(os.getenv("GUIDELINE-TOP-K", "4"))
+
+INDEX_FILE = "index.faiss"
+CHUNKS_FILE = "chunks.jsonl"
+MANIFEST_FILE = "manifest.json"
+INDEX_VERSION = 1
+
+
+def _faiss():
+    # faiss는 import 비용이 크므로 인덱스를 처음 다룰 때 불러온다
+    import faiss
+    return faiss
+
+
+def _mmap_flag():
+    # 평면(flat) 인덱스의 벡터까지 메모리 매핑으로 읽는 플래그 (구 버전 faiss에는 IO_FLAG_MMAP만 있다)
+    faiss = _faiss()
+    return getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_text(text, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP):
+    """
+    줄 단위로 chunk_size 글자까지 모아 청크를 만들고, 다음 청크는 앞 청크의 마지막 chunk_overlap 글자로 시작한다.
+    한 줄이 chunk_size보다 길면 글자 수로 자른다.
+    """
+    lines = []
+    for line in text.splitlines():
+        line = line.strip()
+        while len(line) > chunk_size:
+            lines.append(line[:chunk_size])
+            line = line[chunk_size - chunk_overlap:]
+        if line:
+            lines.append(line)
+    chunks, current = [], ""
+    for line in lines:
+        if current and len(current) + 1 + len(line) > chunk_size:
+            chunks.append(current)
+            current = current[-chunk_overlap:] if chunk_overlap else ""
+            if len(current) + 1 + len(line) > chunk_size:
+                current = ""
+        current = f"{current}\n{line}" if current else line
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def split_pdf(path, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP):
+    """
+    PDF 하나를 청크 목록으로. 청크마다 출처(파일 이름, 페이지)를 함께 기록해 판단 근거에 쓸 수 있게 한다.
+    """
+    import pdfplumber
+    source = os.path.basename(path)
+    chunks = []
+    with pdfplumber.open(path) as pdf:
+        for page_number, page in enumerate(pdf.pages, start=1):
+            for text in chunk_text(page.extract_text() or "", chunk_size, chunk_overlap):
+                chunks.append({"source": source, "page": page_number, "text": text})
+    return chunks
+
+
+def embedding_key(model, text):
+    return hashlib.sha256(f"{model}\0{text}".encode('utf-8')).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    (모델, 텍스트) 해시 → 임베딩 벡터 캐시 (SQLite, float32 바이트로 저장).
+    지침 청크뿐 아니라 반복되는 질의(같은 업종 등)의 임베딩도 다시 요청하지 않는다.
+    """
+    def __init__(self, path=EMBEDDING_CACHE_PATH):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embedding ("
+            " key TEXT PRIMARY KEY, model TEXT NOT NULL, vector BLOB NOT NULL, created REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get_many(self, keys):
+        """
+        캐시에 있는 키만 {키: 벡터}로 반환.
+        """
+        found = {}
+        with self._lock:
+            for key in keys:
+                row = self._conn.execute("SELECT vector FROM embedding WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    found[key] = np.frombuffer(row[0], dtype=np.float32)
+            self.hits += len(found)
+            self.misses += len(set(keys)) - len(found)
+        return found
+
+    def put_many(self, model, items):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embedding (key, model, vector, created) VALUES (?, ?, ?, ?)",
+                [(key, model, np.asarray(vector, dtype=np.float32).tobytes(), now) for key, vector in items],
+            )
+            self._conn.commit()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0}
+
+
+_embedding_cache = None
+_embedding_cache_lock = threading.Lock()
+
+
+def get_embedding_cache():
+    global _embedding_cache
+    if _embedding_cache is None:
+        with _embedding_cache_lock:
+            if _embedding_cache is None:
+                _embedding_cache = EmbeddingCache()
+    return _embedding_cache
+
+
+def embed_texts(texts, model=EMBEDDING_MODEL, cache=None):
+    """
+    텍스트 목록을 L2 정규화된 임베딩 행렬(n x dim, float32)로. 캐시에 없는 텍스트만 묶어서 요청한다.
+    정규화했으므로 내적(IndexFlatIP)이 곧 코사인 유사도다.
+    """
+    cache = cache or get_embedding_cache()
+    keys = [embedding_key(model, text) for text in texts]
+    vectors = cache.get_many(keys)
+    missing = list(dict.fromkeys(key for key in keys if key not in vectors))
+    add(cache_hits=len(texts) - len(missing), cache_misses=len(missing))
+    if missing:
+        text_by_key = dict(zip(keys, texts))
+        client = get_openai_client()
+        for start in range(0, len(missing), EMBEDDING_BATCH):
+            batch = missing[start:start + EMBEDDING_BATCH]
+            inputs = [text_by_key[key] for key in batch]
+            with stage("openai.embedding", bytes_sent=sum(len(text.encode('utf-8')) for text in inputs)):
+                response = call("openai", lambda: client.embeddings.create(model=model, input=inputs))
+                record_usage(getattr(response, "usage", None), model)
+            fetched = [(key, np.asarray(item.embedding, dtype=np.float32)) for key, item in zip(batch, response.data)]
+            cache.put_many(model, fetched)
+            vectors.update(fetched)
+    matrix = np.vstack([vectors[key] for key in keys]).astype(np.float32) if keys else np.zeros((0, 0), np.float32)
+    if len(matrix):
+        _faiss().normalize_L2(matrix)
+    return matrix
+
+
+class GuidelineIndex:
+    """
+    지침 청크와 FAISS 인덱스. index의 i번째 벡터가 chunks[i]에 해당한다.
+    """
+    def __init__(self, index, chunks, model=EMBEDDING_MODEL):
+        self.index = index
+        self.chunks = chunks
+        self.model = model
+
+    def __len__(self):
+        return len(self.chunks)
+
+    @classmethod
+    def from_vectors(cls, chunks, vectors, model=EMBEDDING_MODEL):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        index = _faiss().IndexFlatIP(vectors.shape[1])
+        index.add(vectors)
+        return cls(index, chunks, model)
+
+    @classmethod
+    def load(cls, directory=GUIDELINE_INDEX_DIR, mmap=True):
+        """
+        저장된 인덱스를 연다. 없으면 None.
+        """
+        manifest = read_manifest(directory)
+        index_path = os.path.join(directory, INDEX_FILE)
+        if manifest is None or not os.path.exists(index_path):
+            return None
+        index = _faiss().read_index(index_path, _mmap_flag() if mmap else 0)
+        return cls(index, read_chunks(directory), manifest["model"])
+
+    def save(self, directory, manifest):
+        """
+        인덱스 → 청크 → manifest 순서로 임시 파일에 쓰고 이름을 바꾼다.
+        manifest가 마지막이므로 중간에 멈추면 다음 빌드가 전체를 다시 맞춘다.
+        이미 메모리 매핑으로 열린 이전 인덱스는 파일이 교체되어도 그대로 읽을 수 있다.
+        """
+        os.makedirs(directory, exist_ok=True)
+        index_path = os.path.join(directory, INDEX_FILE)
+        _faiss().write_index(self.index, index_path + ".tmp")
+        os.replace(index_path + ".tmp", index_path)
+        chunks_path = os.path.join(directory, CHUNKS_FILE)
+        with open(chunks_path + ".tmp", "w", encoding="utf-8") as f:
+            for chunk in self.chunks:
+                f.write(json.dumps(chunk, ensure_ascii=False) + "\n")
+        os.replace(chunks_path + ".tmp", chunks_path)
+        manifest_path = os.path.join(directory, MANIFEST_FILE)
+        with open(manifest_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(manifest_path + ".tmp", manifest_path)
+
+    def search(self, query, k=GUIDELINE_TOP_K):
+        """
+        질의와 가까운 청크 k개를 [(유사도, 청크)]로 반환.
+        """
+        if not self.chunks:
+            return []
+        query_vector = embed_texts([query], self.model)
+        scores, ids = self.index.search(query_vector, min(k, len(self.chunks)))
+        return [(float(score), self.chunks[i]) for score, i in zip(scores[0], ids[0]) if i >= 0]
+
+
+def format_hits(hits):
+    """
+    search() 결과를 프롬프트에 넣을 "[파일 p.쪽] 본문" 목록으로.
+    """
+    context = "\n\n".join(f"[{chunk['source']} p.{chunk['page']}]\n{chunk['text']}" for _, chunk in hits)
+    return context or "(찾은 내용 없음)"
+
+
+def read_manifest(directory=GUIDELINE_INDEX_DIR):
+    try:
+        with open(os.path.join(directory, MANIFEST_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def read_chunks(directory=GUIDELINE_INDEX_DIR):
+    try:
+        with open(os.path.join(directory, CHUNKS_FILE), encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except OSError:
+        return []
+
+
+def _settings(model, chunk_size, chunk_overlap):
+    return {"version": INDEX_VERSION, "model": model, "chunk_size": chunk_size, "chunk_overlap": chunk_overlap}
+
+
+def build_index(pdf_dir=GUIDELINE_PDF_DIR, index_dir=GUIDELINE_INDEX_DIR, model=EMBEDDING_MODEL,
+                chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, rebuild=False):
+    """
+    PDF 폴더와 저장된 manifest를 비교해 바뀐 PDF만 다시 청크로 나누고 인덱스를 갱신한다.
+    바뀐 것이 없으면 저장된 인덱스를 그대로 연다.
+    Returns:
+        (GuidelineIndex, 요약 dict): 요약에는 added/changed/removed/unchanged 파일 이름 목록이 들어간다.
+    """
+    settings = _settings(model, chunk_size, chunk_overlap)
+    manifest = read_manifest(index_dir)
+    reusable = not rebuild and manifest is not None and all(manifest.get(k) == v for k, v in settings.items())
+    old_files = manifest.get("files", {}) if reusable else {}
+    old_chunks = {}
+    if reusable:
+        for chunk in read_chunks(index_dir):
+            old_chunks.setdefault(chunk["source"], []).append(chunk)
+
+    paths = sorted(os.path.join(pdf_dir, name) for name in os.listdir(pdf_dir) if name.lower().endswith(".pdf")) \
+        if os.path.isdir(pdf_dir) else []
+    summary = {"added": [], "changed": [], "removed": [], "unchanged": []}
+    files, chunks = {}, []
+    for path in paths:
+        name = os.path.basename(path)
+        digest = file_hash(path)
+        previous = old_files.get(name)
+        if previous is not None and previous["sha256"] == digest and name in old_chunks:
+            summary["unchanged"].append(name)
+            file_chunks = old_chunks[name]
+        else:
+            summary["changed" if previous is not None else "added"].append(name)
+            print(f"지침 PDF 인덱싱: {name}")
+            file_chunks = split_pdf(path, chunk_size, chunk_overlap)
+        files[name] = {"sha256": digest, "chunks": len(file_chunks)}
+        chunks.extend(file_chunks)
+    summary["removed"] = sorted(set(old_files) - set(files))
+
+    if reusable and not (summary["added"] or summary["changed"] or summary["removed"]):
+        index = GuidelineIndex.load(index_dir)
+        if index is not None:
+            return index, summary
+
+    with stage("guideline.index", chunks=len(chunks)):
+        # 바뀌지 않은 청크의 벡터는 임베딩 캐시에서 나오므로 새 청크만 API로 요청된다
+        vectors = embed_texts([chunk["text"] for chunk in chunks], model)
+    if len(chunks):
+        index = GuidelineIndex.from_vectors(chunks, vectors, model)
+    else:
+        index = GuidelineIndex(_faiss().IndexFlatIP(1), [], model)
+    index.save(index_dir, {**settings, "files": files, "updated": time.time()})
+    print(f"지침 인덱스 저장: {len(files)}개 PDF, {len(chunks)}개 청크 ({index_dir})")
+    # 저장한 파일을 메모리 매핑으로 다시 열어, 빌드한 프로세스도 다른 워커와 같은 방식으로 쓴다
+    return GuidelineIndex.load(index_dir) or index, summary
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_guideline_index():
+    """
+    프로세스 전체에서 공유하는 지침 인덱스를 반환. 처음 호출될 때 한 번만 연다 (GUIDELINE_AUTO_BUILD이면 갱신 후 연다).
+    """
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                if GUIDELINE_AUTO_BUILD:
+                    index, _ = build_index()
+                else:
+                    index = GuidelineIndex.load() or GuidelineIndex(_faiss().IndexFlatIP(1), [])
+                if not len(index):
+                    print(f"지침 인덱스가 비어 있습니다. {GUIDELINE_PDF_DIR} 에 지침 PDF를 넣고 'python guideline_index.py build'를 실행하세요.")
+                _index = index
+    return _index
+
+
+def set_guideline_index(index):
+    """
+    공유 인덱스를 직접 지정 (벤치마크용 대체 인덱스 주입).
+    """
+    global _index
+    with _index_lock:
+        _index = index
+
+
+def reset_guideline_index():
+    """
+    PDF를 바꾼 뒤 다음 호출에서 인덱스를 다시 열도록 캐시를 비운다.
+    """
+    set_guideline_index(None)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="연구비 지침 PDF 로컬 인덱스")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser("build", help="바뀐 PDF만 다시 인덱싱")
+    build_parser.add_argument("--pdf-dir", default=GUIDELINE_PDF_DIR)
+    build_parser.add_argument("--index-dir", default=GUIDELINE_INDEX_DIR)
+    build_parser.add_argument("--rebuild", action="store_true", help="모든 PDF를 다시 추출 (임베딩은 캐시 사용)")
+    search_parser = commands.add_parser("search", help="인덱스 검색")
+    search_parser.add_argument("query")
+    search_parser.add_argument("-k", type=int, default=GUIDELINE_TOP_K)
+    search_parser.add_argument("--index-dir", default=GUIDELINE_INDEX_DIR)
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        index, summary = build_index(args.pdf_dir, args.index_dir, rebuild=args.rebuild)
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+        print(f"청크 {len(index)}개, 임베딩 캐시 {get_embedding_cache().stats()}")
+        return 0
+    index = GuidelineIndex.load(args.index_dir)
+    if index is None:
+        print(f"인덱스가 없습니다: {args.index_dir}")
+        return 1
+    for score, chunk in index.search(args.query, args.k):
+        print(f"[{score:.3f}] {chunk['source']} p.{chunk['page']}")
+        print(chunk["text"][:300])
+        print("--")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
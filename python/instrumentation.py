@@ -0,0 +1,292 @@
+"""
+영수증 처리 단계별 계측 (소요 시간, 전송 바이트, 토큰, 비용, 재시도, 캐시 적중).
+
+코드에서는 with stage("ocr.request"): 로 구간을 감싸고 add()/record_usage()로 값을 더한다.
+기록은 METRICS-PATH(JSON lines)에 쌓이고, prometheus_text()로 Prometheus 형식으로 내보낼 수 있다.
+
+요약 보고서: python instrumentation.py report [metrics.jsonl]
+"""
+import os, sys, json, time, atexit, threading, contextvars
+from contextlib import contextmanager
+import config  # .env는 config에서 한 번만 읽는다
+
+METRICS_PATH = os.getenv("METRICS-PATH", "../cache/metrics.jsonl")
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS-FLUSH-INTERVAL", "1.0"))  # 모아 둔 기록을 파일에 쓰는 간격(초)
+METRICS_MAX_BYTES = int(os.getenv("METRICS-MAX-BYTES", str(50 * 1024 * 1024)))  # 넘으면 .1, .2 ...로 돌린다 (0이면 제한 없음)
+METRICS_BACKUPS = int(os.getenv("METRICS-BACKUPS", "3"))  # 보관할 이전 파일 수
+METRICS_BUFFER_SIZE = 1000  # 버퍼가 이만큼 차면 간격을 기다리지 않고 바로 쓴다
+
+# 모델별 100만 토큰당 가격 (USD, 입력/출력)
+MODEL_PRICES = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4": (30.00, 60.00),
+    "text-embedding-3-small": (0.02, 0.0),
+}
+
+# 값을 더해 가는 수치 필드
+SUM_FIELDS = ("bytes_sent", "prompt_tokens", "completion_tokens", "cost_usd", "retries", "cache_hits", "cache_misses")
+
+_receipt_id = contextvars.ContextVar("receipt_id", default=None)
+_current_span = contextvars.ContextVar("span", default=None)
+
+
+class MetricsRecorder:
+    """
+    단계 기록을 JSON lines 파일에 남기고, Prometheus용 누적 값을 메모리에 유지한다.
+    emit()은 메모리 버퍼에 넣기만 하고 파일 쓰기는 백그라운드 스레드가 flush_interval마다 모아서 한다.
+    파일이 max_bytes를 넘으면 RotatingFileHandler처럼 path.1, path.2 ...로 돌려 backups개까지만 남긴다.
+    """
+    def __init__(self, path=METRICS_PATH, flush_interval=METRICS_FLUSH_INTERVAL,
+                 max_bytes=METRICS_MAX_BYTES, backups=METRICS_BACKUPS):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()  # 파일 쓰기/교체는 한 번에 하나만
+        self._totals = {}  # stage -> {"count", "errors", "seconds", 수치 필드...}
+        self._buffer = []  # 아직 파일에 쓰지 않은 JSON 줄
+        self._wakeup = threading.Event()
+        self._thread = None
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            atexit.register(self.flush)
+
+    def emit(self, record):
+        with self._lock:
+            totals = self._totals.setdefault(record["stage"], {"count": 0, "errors": 0, "seconds": 0.0})
+            totals["count"] += 1
+            totals["errors"] += 1 if record.get("error") else 0
+            totals["seconds"] += record["seconds"]
+            for field in SUM_FIELDS:
+                if field in record:
+                    totals[field] = totals.get(field, 0) + record[field]
+            if not self.path:
+                return
+            self._buffer.append(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            if len(self._buffer) >= METRICS_BUFFER_SIZE:
+                self._wakeup.set()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="metrics-writer", daemon=True)
+                self._thread.start()
+
+    def flush(self):
+        """
+        버퍼에 모인 기록을 파일에 쓴다. 백그라운드 스레드와 종료 시(atexit)에 불린다.
+        """
+        with self._write_lock:
+            with self._lock:
+                lines, self._buffer = self._buffer, []
+            if not lines or not self.path:
+                return
+            if self.max_bytes and os.path.exists(self.path) and os.path.getsize(self.path) >= self.max_bytes:
+                self._rotate()
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.writelines(lines)
+
+    def _rotate(self):
+        if self.backups <= 0:
+            os.remove(self.path)
+            return
+        for index in range(self.backups - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except OSError as e:
+                print(f"계측 기록 저장 실패: {e}")
+
+    def prometheus_text(self):
+        """
+        누적 값을 Prometheus text exposition 형식으로 반환.
+        """
+        lines = []
+        with self._lock:
+            totals = {stage: dict(values) for stage, values in self._totals.items()}
+        metrics = [("count", "receipt_stage_total"), ("errors", "receipt_stage_errors_total"),
+                   ("seconds", "receipt_stage_seconds_total")]
+        metrics += [(field, f"receipt_stage_{field}_total") for field in SUM_FIELDS]
+        for field, metric in metrics:
+            lines.append(f"# TYPE {metric} counter")
+            for stage, values in sorted(totals.items()):
+                if field in values:
+                    lines.append(f'{metric}{{stage="{stage}"}} {values[field]}')
+        return "\n".join(lines) + "\n"
+
+
+recorder = MetricsRecorder()
+
+
+@contextmanager
+def receipt_scope(receipt_id):
+    """
+    이 안에서 기록되는 모든 단계에 receipt_id를 붙인다.
+    """
+    token = _receipt_id.set(receipt_id)
+    try:
+        yield
+    finally:
+        _receipt_id.reset(token)
+
+
+@contextmanager
+def stage(name, **fields):
+    """
+    구간의 소요 시간을 재고, 구간 안에서 add()로 더한 값과 함께 한 줄로 기록한다.
+    """
+    span = {"stage": name, "receipt_id": _receipt_id.get(), **fields}
+    token = _current_span.set(span)
+    started = time.perf_counter()
+    span["ts"] = time.time()
+    try:
+        yield span
+    except Exception as e:
+        span["error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        span["seconds"] = time.perf_counter() - started
+        _current_span.reset(token)
+        recorder.emit(span)
+
+
+def add(**fields):
+    """
+    현재 구간에 값을 더한다 (수치 필드는 합산, 나머지는 덮어씀). 구간 밖에서는 무시된다.
+    """
+    span = _current_span.get()
+    if span is None:
+        return
+    for key, value in fields.items():
+        if key in SUM_FIELDS and value is not None:
+            span[key] = span.get(key, 0) + value
+        else:
+            span[key] = value
+
+
+def record_usage(usage, model):
+    """
+    OpenAI 응답의 usage(토큰 수)와 추정 비용을 현재 구간에 더한다.
+    """
+    if usage is None:
+        return
+    if isinstance(usage, dict):
+        prompt_tokens = usage.get("prompt_tokens") or 0
+        completion_tokens = usage.get("completion_tokens") or 0
+    else:
+        prompt_tokens = getattr(usage, "prompt_tokens", None) or 0
+        completion_tokens = getattr(usage, "completion_tokens", None) or 0
+    input_price, output_price = MODEL_PRICES.get(model, (0.0, 0.0))
+    add(
+        model=model,
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        cost_usd=(prompt_tokens * input_price + completion_tokens * output_price) / 1_000_000,
+    )
+
+
+def cache_result(hit):
+    if hit:
+        add(cache_hits=1)
+    else:
+        add(cache_misses=1)
+
+
+def copy_context():
+    """
+    다른 스레드에서 실행할 함수에 현재 receipt_id/구간을 넘기기 위한 컨텍스트 복사본.
+    """
+    return contextvars.copy_context()
+
+
+_token_usage_handler = None
+
+
+def _make_token_usage_handler():
+    try:
+        from langchain.callbacks.base import BaseCallbackHandler
+    except ImportError:  # langchain 없이 보고서만 볼 때
+        BaseCallbackHandler = object
+
+    class TokenUsageHandler(BaseCallbackHandler):
+        """
+        LangChain LLMChain 호출의 토큰 사용량을 현재 구간에 기록하는 콜백.
+        """
+        def on_llm_end(self, response, **kwargs):
+            output = response.llm_output or {}
+            record_usage(output.get("token_usage") or {}, output.get("model_name", ""))
+
+    return TokenUsageHandler
+
+
+def __getattr__(name):
+    # langchain은 import 비용이 크므로 TokenUsageHandler를 처음 가져갈 때 클래스를 만든다
+    global _token_usage_handler
+    if name == "TokenUsageHandler":
+        if _token_usage_handler is None:
+            _token_usage_handler = _make_token_usage_handler()
+        return _token_usage_handler
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, int(round(q / 100 * (len(values) - 1)))))
+    return values[index]
+
+
+def report(path=METRICS_PATH):
+    """
+    JSON lines 기록을 읽어 단계별 p50/p95 소요 시간과 토큰/비용/캐시 적중을 출력.
+    기록 파일이 아직 없으면 빈 보고서를 출력한다.
+    """
+    recorder.flush()
+    stages = {}
+    receipts = set()
+    # 돌려 둔 이전 파일(path.N ... path.1)부터 시간 순서대로 읽는다
+    backups = [f"{path}.{index}" for index in range(METRICS_BACKUPS, 0, -1) if os.path.exists(f"{path}.{index}")]
+    current = [path] if os.path.exists(path) else []
+    for file_path in backups + current:
+        with open(file_path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                stages.setdefault(record["stage"], []).append(record)
+                if record.get("receipt_id"):
+                    receipts.add(record["receipt_id"])
+    print(f"영수증 {len(receipts)}건, 단계 기록 {sum(len(v) for v in stages.values())}건 ({path})")
+    header = f"{'stage':<24}{'n':>6}{'err':>5}{'p50(s)':>9}{'p95(s)':>9}{'total(s)':>10}{'tokens':>10}{'cost($)':>10}{'hit%':>7}"
+    print(header)
+    print("-" * len(header))
+    rows = []
+    for name, records in stages.items():
+        seconds = [record["seconds"] for record in records]
+        tokens = sum(record.get("prompt_tokens", 0) + record.get("completion_tokens", 0) for record in records)
+        cost = sum(record.get("cost_usd", 0) for record in records)
+        hits = sum(record.get("cache_hits", 0) for record in records)
+        lookups = hits + sum(record.get("cache_misses", 0) for record in records)
+        errors = sum(1 for record in records if record.get("error"))
+        rows.append((sum(seconds), name, len(records), errors, percentile(seconds, 50), percentile(seconds, 95),
+                     tokens, cost, f"{hits / lookups:.0%}" if lookups else "-"))
+    # 총 소요 시간이 큰 단계(핫스팟)부터 출력
+    for total, name, n, errors, p50, p95, tokens, cost, hit_rate in sorted(rows, reverse=True):
+        print(f"{name:<24}{n:>6}{errors:>5}{p50:>9.2f}{p95:>9.2f}{total:>10.1f}{tokens:>10}{cost:>10.4f}{hit_rate:>7}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "report":
+        report(sys.argv[2] if len(sys.argv) > 2 else METRICS_PATH)
+    else:
+        print(__doc__)
@@ -0,0 +1,210 @@
+import os, re, time, sqlite3, threading, unicodedata
+from collections import OrderedDict
+import config  # .env는 config에서 한 번만 읽는다
+
+MERCHANT_CACHE_PATH = os.getenv("MERCHANT-CACHE-PATH", "../cache/merchant_cache.sqlite3")
+MERCHANT_CACHE_SIZE = int(os.getenv("MERCHANT-CACHE-SIZE", "2048"))
+
+# 상호명 앞뒤에 붙는 법인 표기
+_CORPORATE_MARKERS = re.compile(r"\(주\)|㈜|\(유\)|주식회사|유한회사|co\.?,?\s*ltd\.?|inc\.?", re.IGNORECASE)
+# 지점 표기: 단어 전체가 지점 표기이거나("본점", "매장") 지역명 뒤에 붙은 경우("강남점", "서울역지점")
+_BRANCH_TOKEN = re.compile(r"본점|지점|직영점|매장|센터")
+_BRANCH_SUFFIX = re.compile(r"(지점|직영점|점)$")
+# "점"으로 끝나지만 지점이 아니라 업종인 단어 ("분식점", "매점", "편의점" 등)
+_SHOP_TYPE_SUFFIX = re.compile(r"(식점|매점|상점|서점|편의점|백화점|대리점|판매점|할인점|전문점|주점|제과점)$")
+_PUNCTUATION = re.compile(r"[^\w\s]")
+# 상호명 뒤에 붙는 지역 단어: 행정구역 접미사로 끝나는 세 글자 이상 단어("강남구", "역삼동", "서울역")와 자주 쓰는 지역명
+_REGION_SUFFIX = re.compile(r"\w{2,}(특별시|광역시|시|군|구|동|읍|면|역)")
+_REGION_NAMES = frozenset((
+    "서울 부산 대구 인천 광주 대전 울산 세종 경기 강원 충북 충남 전북 전남 경북 경남 제주 "
+    "강남 강북 강서 강동 서초 송파 마포 용산 종로 중구 명동 홍대 신촌 잠실 역삼 삼성 선릉 여의도 성수 건대 "
+    "판교 분당 일산 수원 용인 부천 안양 해운대 서면 센텀 기장 동래 수성 유성 둔산 청주 천안 전주 창원 김해 포항"
+).split())
+
+
+def _merchant_tokens(name):
+    """
+    정규화한 상호명의 단어 목록과 마지막 단어에서 지점 표기를 떼어 냈는지 여부를 반환.
+    """
+    if not name:
+        return [], False
+    name = unicodedata.normalize("NFKC", str(name)).lower()
+    name = _CORPORATE_MARKERS.sub(" ", name)
+    name = _PUNCTUATION.sub(" ", name)
+    tokens = name.split()
+    if len(tokens) < 2:
+        return tokens, False
+    last = tokens[-1]
+    if _BRANCH_TOKEN.fullmatch(last):
+        return tokens[:-1], True
+    if _SHOP_TYPE_SUFFIX.search(last):
+        return tokens, False
+    stripped = _BRANCH_SUFFIX.sub("", last)
+    if not stripped or stripped == last:
+        return tokens, False
+    return tokens[:-1] + [stripped], True
+
+
+def normalize_merchant_name(name):
+    """
+    상호명을 캐시 키로 쓰기 위해 정규화.
+    대소문자/전각문자/공백/구두점/법인 표기를 통일하고, 마지막 단어의 지점 표기를 제거한다.
+    예: "(주)스타벅스 강남점" -> "스타벅스 강남", " WAVEON  기장 " -> "waveon 기장", "할매 분식점" -> "할매 분식점"
+    """
+    return " ".join(_merchant_tokens(name)[0])
+
+
+def compact_key(key):
+    """
+    띄어쓰기만 다른 상호명("스타 벅스", "스타벅스")이 같은 항목을 찾도록 공백을 모두 뺀 조회용 키.
+    """
+    return key.replace(" ", "")
+
+
+def is_region_token(token):
+    return token in _REGION_NAMES or bool(_REGION_SUFFIX.fullmatch(token))
+
+
+def candidate_keys(name):
+    """
+    조회할 키 후보를 가장 구체적인 것부터 반환.
+    뒤쪽 단어는 지점 표기가 있던 단어이거나 지역명일 때만 떼어 내므로 "waveon 기장"과 "스타벅스 강남점"은
+    "waveon", "스타벅스"로 저장된 값과도 일치하지만 "김밥 천국"은 "김밥"과 일치하지 않는다.
+    조회(get)는 각 후보를 compact_key로 비교하므로 띄어쓰기 차이도 무시된다.
+    """
+    tokens, branch = _merchant_tokens(name)
+    keys = [" ".join(tokens)] if tokens else []
+    while len(tokens) > 1 and (branch or is_region_token(tokens[-1])):
+        tokens, branch = tokens[:-1], False
+        keys.append(" ".join(tokens))
+    return keys
+
+
+class MerchantCategoryCache:
+    """
+    정규화된 상호명 → 업종 캐시.
+    메모리 LRU를 앞에 두고 SQLite에 영구 저장한다. 사람이 지정한 값(override)은 자동 결과로 덮어쓰지 않는다.
+    행은 정규화된 상호명(key)으로 저장하고, 조회는 공백을 뺀 compact 열과 메모리 LRU(compact 키)로 한다.
+    """
+    def __init__(self, path=MERCHANT_CACHE_PATH, max_size=MERCHANT_CACHE_SIZE):
+        self.path = path
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._lru = OrderedDict()  # key -> (category, search_results)
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS merchant_category ("
+            " key TEXT PRIMARY KEY, category TEXT NOT NULL, search_results TEXT,"
+            " overridden INTEGER NOT NULL DEFAULT 0, updated REAL NOT NULL)"
+        )
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(merchant_category)")]
+        if "compact" not in columns:
+            # 이전 버전에서 만든 DB에는 compact 열이 없으므로 추가하고 채운다
+            self._conn.execute("ALTER TABLE merchant_category ADD COLUMN compact TEXT")
+            self._conn.execute("UPDATE merchant_category SET compact = REPLACE(key, ' ', '')")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS merchant_category_compact ON merchant_category (compact)")
+        self._conn.commit()
+
+    def get(self, name):
+        """
+        상호명에 해당하는 (업종, 검색결과)를 반환. 없으면 None.
+        """
+        keys = [compact_key(key) for key in candidate_keys(name)]
+        with self._lock:
+            for key in keys:
+                value = self._lru.get(key)
+                if value is None:
+                    # 띄어쓰기만 다른 항목이 여럿이면 사람이 지정한 것, 최근 것 순으로 고른다
+                    row = self._conn.execute(
+                        "SELECT category, search_results FROM merchant_category WHERE compact = ?"
+                        " ORDER BY overridden DESC, updated DESC LIMIT 1", (key,)
+                    ).fetchone()
+                    if row is None:
+                        continue
+                    value = (row[0], row[1])
+                self._remember(key, value)
+                self.hits += 1
+                return value
+            self.misses += 1
+        return None
+
+    def put(self, name, category, search_results=None):
+        """
+        자동으로 판단한 업종을 저장. 같은 키에 override가 있으면 유지한다.
+        """
+        key = normalize_merchant_name(name)
+        if not key or not category:
+            return
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT overridden FROM merchant_category WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and row[0]:
+                return
+            self._conn.execute(
+                "INSERT OR REPLACE INTO merchant_category (key, compact, category, search_results, overridden, updated)"
+                " VALUES (?, ?, ?, ?, 0, ?)",
+                (key, compact_key(key), category, search_results, time.time()),
+            )
+            self._conn.commit()
+            self._remember(compact_key(key), (category, search_results))
+
+    def override(self, name, category):
+        """
+        상호명의 업종을 사람이 직접 지정. 이후 자동 결과가 이 값을 덮어쓰지 않는다.
+        """
+        key = normalize_merchant_name(name)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO merchant_category (key, compact, category, search_results, overridden, updated)"
+                " VALUES (?, ?, ?, NULL, 1, ?)",
+                (key, compact_key(key), category, time.time()),
+            )
+            self._conn.commit()
+            self._remember(compact_key(key), (category, None))
+
+    def invalidate(self, name):
+        """
+        상호명에 대한 캐시 항목(override, 띄어쓰기만 다른 항목 포함)을 삭제. 다음 영수증부터 다시 검색/분석한다.
+        """
+        key = compact_key(normalize_merchant_name(name))
+        with self._lock:
+            self._lru.pop(key, None)
+            self._conn.execute("DELETE FROM merchant_category WHERE compact = ?", (key,))
+            self._conn.commit()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "memory_entries": len(self._lru),
+        }
+
+    def _remember(self, key, value):
+        self._lru[key] = value
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_size:
+            self._lru.popitem(last=False)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_merchant_cache():
+    """
+    프로세스 전체에서 공유하는 상호명 캐시를 반환.
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = MerchantCategoryCache()
+    return _cache
@@ -0,0 +1,305 @@
+import os, json, time, queue, random, hashlib, threading
+import config  # .env는 config에서 한 번만 읽는다
+
+from clients import get_notion_client
+from utils import NOTION_DATABASE_ID, build_notion_receipt_page
+from instrumentation import stage, add, copy_context
+from resilience import call
+
+NOTION_RATE = float(os.getenv("NOTION-RATE", "3"))  # Notion API 권장 한도: 초당 약 3건
+NOTION_BATCH_SIZE = int(os.getenv("NOTION-BATCH-SIZE", "10"))
+NOTION_FLUSH_INTERVAL = float(os.getenv("NOTION-FLUSH-INTERVAL", "1.0"))
+NOTION_MAX_RETRIES = int(os.getenv("NOTION-MAX-RETRIES", "5"))
+# 중복 저장 방지용 rich_text 속성 이름. DB에 없으면 처음 저장할 때 만들고, 만들 수 없을 때만 중복 검사를 끈다.
+# 빈 값으로 설정하면 중복 검사를 하지 않는다 (재시도하면 같은 영수증이 두 번 저장될 수 있음).
+NOTION_HASH_PROPERTY = os.getenv("NOTION-HASH-PROPERTY", "영수증해시")
+NOTION_DEAD_LETTER_PATH = os.getenv("NOTION-DEAD-LETTER-PATH", "../cache/notion_dead_letter.jsonl")
+
+RETRYABLE_STATUSES = {409, 429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """
+    초당 rate개의 토큰이 채워지는 버킷. acquire()는 토큰이 생길 때까지 기다린다.
+    """
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def receipt_hash(data, file_bytes=None):
+    """
+    영수증을 식별하는 해시. 파일 내용이 있으면 그것으로, 없으면 추출된 정보로 만든다.
+    """
+    if file_bytes is not None:
+        return hashlib.sha256(file_bytes).hexdigest()
+    return hashlib.sha256(json.dumps(data, ensure_ascii=False, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class NotionWriteTicket:
+    """
+    대기열에 넣은 저장 요청의 결과. wait()로 실제 저장(또는 실패)까지 기다릴 수 있다.
+    """
+    def __init__(self, page, key):
+        self.page = page
+        self.key = key
+        self.status = "queued"  # created / duplicate / failed
+        self.page_id = None
+        self.error = None
+        self.context = copy_context()  # 백그라운드 스레드에서도 같은 receipt_id로 계측
+        self._done = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def finish(self, status, page_id=None, error=None):
+        self.status, self.page_id, self.error = status, page_id, error
+        with self._lock:
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback(self)
+            except Exception as e:
+                # 기다리던 쪽의 오류가 저장 결과를 바꾸지 않도록 한다
+                print(f"Notion 저장 완료 알림 오류: {e}")
+
+    def add_done_callback(self, callback):
+        """
+        저장이 끝나면 callback(ticket)을 writer 스레드에서 호출한다. 이미 끝났으면 바로 호출한다.
+        비동기 경로는 스레드를 붙잡고 wait() 하는 대신 이것으로 결과를 받는다.
+        """
+        with self._lock:
+            if not self._done.is_set():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def wait(self, timeout=None):
+        self._done.wait(timeout)
+        return self.status
+
+
+class NotionWriter:
+    """
+    Notion 저장을 대기열에 모아 백그라운드 스레드에서 처리하는 write-behind 싱크.
+
+    - 토큰 버킷으로 초당 요청 수를 제한한다.
+    - flush_interval 동안 모인 요청을 최대 batch_size건씩 처리하며, 같은 영수증 해시는 하나로 합친다.
+    - 429/5xx는 Retry-After를 지키며 지수 백오프로 재시도한다.
+    - 영수증 해시 속성(설정하고 DB에 있을 때)으로 이미 저장된 영수증은 다시 만들지 않는다 (재시도 시 중복 방지).
+    - 끝내 실패한 요청은 dead-letter 파일에 남긴다.
+    """
+    def __init__(self, rate=NOTION_RATE, batch_size=NOTION_BATCH_SIZE, flush_interval=NOTION_FLUSH_INTERVAL,
+                 max_retries=NOTION_MAX_RETRIES, hash_property=NOTION_HASH_PROPERTY,
+                 dead_letter_path=NOTION_DEAD_LETTER_PATH):
+        self.bucket = TokenBucket(rate)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.hash_property = hash_property
+        self._hash_property_checked = not hash_property
+        self.dead_letter_path = dead_letter_path
+        self._queue = queue.Queue()
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.stats = {"queued": 0, "created": 0, "duplicate": 0, "failed": 0, "retries": 0}
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="notion-writer", daemon=True)
+                self._thread.start()
+        return self
+
+    def write(self, data, file_url, business_category, account, key=None):
+        """
+        영수증 저장을 대기열에 넣고 NotionWriteTicket을 반환.
+        Args:
+            key (str): 영수증 해시 (receipt_hash). 없으면 추출된 정보로 만든다.
+        """
+        self.start()
+        page = build_notion_receipt_page(data, file_url, business_category, account)
+        key = key or receipt_hash(data)
+        ticket = NotionWriteTicket(page, key)
+        with self._lock:
+            self.stats["queued"] += 1
+        self._queue.put(ticket)
+        return ticket
+
+    def flush(self, timeout=None):
+        """
+        지금까지 넣은 요청이 모두 처리될 때까지 기다린다.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def close(self, timeout=None):
+        self.flush(timeout)
+        self._stop.set()
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout)
+
+    def _next_batch(self):
+        try:
+            first = self._queue.get(timeout=self.flush_interval)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not (self._stop.is_set() and self._queue.empty()):
+            batch = self._next_batch()
+            if not batch:
+                continue
+            # 같은 영수증이 여러 번 들어왔으면 마지막 요청만 저장
+            latest = {}
+            for ticket in batch:
+                latest[ticket.key] = ticket
+            for ticket in batch:
+                try:
+                    if latest[ticket.key] is not ticket:
+                        ticket.finish("duplicate")
+                        self._count("duplicate")
+                    else:
+                        ticket.context.run(self._write_one, ticket)
+                finally:
+                    self._queue.task_done()
+
+    def _write_one(self, ticket):
+        with stage("notion.write"):
+            self._write_page(ticket)
+
+    def _check_hash_property(self):
+        """
+        해시 속성이 DB에 있는지 한 번만 확인하고, 없으면 rich_text 속성으로 추가한다.
+        추가할 권한이 없으면 중복 검사를 끈다 (없는 속성으로 저장하면 모든 요청이 400).
+        """
+        if self._hash_property_checked:
+            return
+        database = self._with_retry(lambda: get_notion_client().databases.retrieve(database_id=NOTION_DATABASE_ID))
+        if self.hash_property not in database.get("properties", {}):
+            try:
+                self._with_retry(lambda: get_notion_client().databases.update(
+                    database_id=NOTION_DATABASE_ID, properties={self.hash_property: {"rich_text": {}}},
+                ))
+                print(f"Notion DB에 중복 검사용 '{self.hash_property}' 속성을 추가했습니다.")
+            except Exception as e:
+                print(f"Notion DB에 '{self.hash_property}' 속성을 추가하지 못해 중복 검사를 하지 않습니다: {e}")
+                self.hash_property = ""
+        self._hash_property_checked = True
+
+    def _write_page(self, ticket):
+        try:
+            self._check_hash_property()
+            if self.hash_property:
+                ticket.page["properties"][self.hash_property] = {"rich_text": [{"text": {"content": ticket.key}}]}
+            existing = self._find_existing(ticket.key)
+            if existing is not None:
+                ticket.finish("duplicate", page_id=existing)
+                self._count("duplicate")
+                return
+            response = self._with_retry(lambda: get_notion_client().pages.create(**ticket.page))
+            ticket.finish("created", page_id=response["id"])
+            self._count("created")
+            print("데이터가 성공적으로 Notion에 저장되었습니다:", response["id"])
+        except Exception as e:
+            print("Notion 저장 오류:", e)
+            ticket.finish("failed", error=e)
+            self._count("failed")
+            self._dead_letter(ticket, e)
+
+    def _find_existing(self, key):
+        if not self.hash_property:
+            return None
+        response = self._with_retry(lambda: get_notion_client().databases.query(
+            database_id=NOTION_DATABASE_ID,
+            filter={"property": self.hash_property, "rich_text": {"equals": key}},
+            page_size=1,
+        ))
+        results = response.get("results", [])
+        return results[0]["id"] if results else None
+
+    def _with_retry(self, request):
+        delay = 1.0
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            try:
+                # 서킷이 열려 있으면 CircuitOpenError로 바로 실패하여 dead-letter로 간다
+                return call("notion", request)
+            except Exception as e:
+                status = getattr(e, "status", None)
+                timed_out = type(e).__name__ == "RequestTimeoutError"
+                if attempt == self.max_retries or not (status in RETRYABLE_STATUSES or timed_out):
+                    raise
+                headers = getattr(e, "headers", None) or {}
+                retry_after = headers.get("retry-after") or headers.get("Retry-After")
+                wait = float(retry_after) if retry_after else delay * random.uniform(0.8, 1.2)
+                print(f"Notion 요청 재시도 {attempt + 1}/{self.max_retries} ({status}), {wait:.1f}초 대기")
+                self._count("retries")
+                add(retries=1)
+                time.sleep(wait)
+                delay = min(delay * 2, 30.0)
+
+    def _dead_letter(self, ticket, error):
+        if not self.dead_letter_path:
+            return
+        directory = os.path.dirname(self.dead_letter_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        record = {"at": time.time(), "key": ticket.key, "error": repr(error), "page": ticket.page}
+        with self._lock:
+            with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_notion_writer():
+    """
+    프로세스 전체에서 공유하는 NotionWriter를 반환.
+    """
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = NotionWriter().start()
+    return _writer
@@ -0,0 +1,150 @@
+import os, hashlib, mimetypes, threading, urllib.parse
+import config  # .env는 config에서 한 번만 읽는다
+
+from clients import get_s3_client
+from utils import ReceiptFile
+from instrumentation import stage, cache_result
+from resilience import call
+
+S3_BUCKET_NAME = os.getenv("S3-BUCKET-NAME")
+S3_REGION = os.getenv("S3-BUCKET-REGION")
+S3_ENDPOINT_URL = os.getenv("S3-ENDPOINT-URL")
+S3_KEY_PREFIX = os.getenv("S3-KEY-PREFIX", "receipts/")
+
+
+
+def make_transfer_config():
+    # 8MB 이상(대용량 PDF 등)은 멀티파트로 나눠 여러 스레드에서 동시에 전송
+    # boto3는 import 비용이 크므로 저장소를 처음 만들 때 불러온다
+    from boto3.s3.transfer import TransferConfig
+    return TransferConfig(
+        multipart_threshold=8 * 1024 * 1024,
+        multipart_chunksize=8 * 1024 * 1024,
+        max_concurrency=8,
+        use_threads=True,
+    )
+
+
+def content_key(file_bytes, file_name, prefix=S3_KEY_PREFIX):
+    """
+    파일 내용의 SHA-256으로 객체 키를 만든다. 확장자는 원래 파일 이름에서 가져온다.
+    예: receipts/3f/3fa1...c9.jpg
+    """
+    return digest_key(hashlib.sha256(file_bytes).hexdigest(), file_name, prefix)
+
+
+def digest_key(digest, file_name, prefix=S3_KEY_PREFIX):
+    extension = os.path.splitext(file_name)[1].lower()
+    return f"{prefix}{digest[:2]}/{digest}{extension}"
+
+
+def file_digest(source, chunk_size=1024 * 1024):
+    """
+    파일(경로 또는 ReceiptFile)의 (SHA-256, 크기). 디스크에 있는 파일은 조각 단위로 읽어 전체를 메모리에 올리지 않는다.
+    """
+    if isinstance(source, ReceiptFile) and source.data is not None:
+        return hashlib.sha256(source.data).hexdigest(), source.size
+    digest, size = hashlib.sha256(), 0
+    with open(source.path if isinstance(source, ReceiptFile) else source, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+
+class ReceiptObjectStore:
+    """
+    영수증 원본을 내용 해시 기반 키로 S3(또는 MinIO 등 S3 호환 저장소)에 저장.
+    같은 내용은 같은 키가 되므로 HEAD 요청으로 이미 있는지 확인하고 전송을 건너뛴다.
+    이름이 같은 다른 파일(iOS의 image.jpg 등)도 서로 덮어쓰지 않는다.
+    """
+    def __init__(self, bucket=S3_BUCKET_NAME, get_client=get_s3_client, transfer_config=None):
+        self.bucket = bucket
+        self._get_client = get_client
+        self.transfer_config = transfer_config or make_transfer_config()
+        self._lock = threading.Lock()
+        self.stats = {"uploaded": 0, "skipped": 0, "bytes_uploaded": 0, "bytes_skipped": 0}
+
+    def exists(self, key):
+        from botocore.exceptions import ClientError
+        try:
+            call("s3", lambda: self._get_client().head_object(Bucket=self.bucket, Key=key))
+            return True
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    def put(self, source, file_name):
+        """
+        영수증 파일(경로 또는 ReceiptFile)을 저장하고 (객체 키, URL)을 반환.
+        """
+        with stage("s3.put") as span:
+            return self._put(source, file_name, span)
+
+    def _put(self, source, file_name, span):
+        digest, size = file_digest(source)
+        key = digest_key(digest, file_name)
+        exists = self.exists(key)
+        cache_result(exists)
+        if exists:
+            self._count("skipped", size)
+            return key, self.url(key)
+        span["bytes_sent"] = size
+        content_type = mimetypes.guess_type(file_name)[0] or "application/octet-stream"
+        extra_args = {
+            "ContentType": content_type,
+            # 원래 파일 이름은 메타데이터로 보관 (ASCII만 허용되므로 인코딩)
+            "Metadata": {"original-name": urllib.parse.quote(file_name)},
+        }
+        def upload():
+            if isinstance(source, ReceiptFile) and source.data is not None:
+                # 메모리 버퍼를 복사 없이 그대로 업로드
+                with source.open() as fileobj:
+                    self._get_client().upload_fileobj(
+                        fileobj, self.bucket, key, ExtraArgs=extra_args, Config=self.transfer_config
+                    )
+            else:
+                # 디스크의 파일은 경로로 넘겨 멀티파트 조각을 각 스레드가 파일에서 직접 읽게 한다
+                path = source.path if isinstance(source, ReceiptFile) else str(source)
+                self._get_client().upload_file(
+                    path, self.bucket, key, ExtraArgs=extra_args, Config=self.transfer_config
+                )
+
+        # 같은 키로 다시 올려도 결과가 같으므로 재시도해도 안전하다
+        call("s3", upload)
+        self._count("uploaded", size)
+        return key, self.url(key)
+
+    def url(self, key):
+        encoded_key = urllib.parse.quote(key)
+        if S3_ENDPOINT_URL:
+            return f"{S3_ENDPOINT_URL.rstrip('/')}/{self.bucket}/{encoded_key}"
+        return f"https://{self.bucket}.s3.{S3_REGION}.amazonaws.com/{encoded_key}"
+
+    def _count(self, name, size):
+        with self._lock:
+            self.stats[name] += 1
+            self.stats[f"bytes_{name}"] += size
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_object_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ReceiptObjectStore()
+    return _store
+
+
+def store_receipt(source, file_name):
+    """
+    upload_to_s3 대신 사용하는 저장 함수. 객체 URL을 반환하며, 실패하면 예외를 그대로 발생시킨다
+    (URL 없는 영수증이 Notion에 저장되지 않도록 호출한 단계가 실패로 처리한다).
+    """
+    _, file_url = get_object_store().put(source, file_name)
+    return file_url
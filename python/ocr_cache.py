@@ -0,0 +1,109 @@
+import os, json, time, sqlite3, hashlib, threading
+import config  # .env는 config에서 한 번만 읽는다
+
+OCR_CACHE_PATH = os.getenv("OCR-CACHE-PATH", "../cache/ocr_cache.sqlite3")
+OCR_CACHE_TTL = float(os.getenv("OCR-CACHE-TTL", str(90 * 24 * 3600)))  # 기본 90일
+OCR_CACHE_MAX_ENTRIES = int(os.getenv("OCR-CACHE-MAX-ENTRIES", "20000"))
+
+
+def make_cache_key(file_bytes, model, prompt):
+    """
+    파일 내용 + 모델 + 프롬프트로 캐시 키를 만든다.
+    같은 영수증이라도 모델이나 프롬프트가 바뀌면 다른 키가 된다.
+    """
+    file_hash = hashlib.sha256(file_bytes).hexdigest()
+    prompt_hash = hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:12]
+    return f"{file_hash}:{model}:{prompt_hash}"
+
+
+class OCRCache:
+    """
+    SQLite에 저장되는 OCR 결과 캐시.
+    TTL이 지난 항목은 조회 시 무시되고, 항목 수가 max_entries를 넘으면 가장 오래 쓰이지 않은 것부터 지운다.
+    """
+    def __init__(self, path=OCR_CACHE_PATH, ttl=OCR_CACHE_TTL, max_entries=OCR_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS ocr_cache ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ocr_cache_accessed ON ocr_cache (accessed)")
+        self._conn.commit()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created FROM ocr_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    self._conn.execute("DELETE FROM ocr_cache WHERE key = ?", (key,))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE ocr_cache SET accessed = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ocr_cache (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now, now),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        self._conn.execute("DELETE FROM ocr_cache WHERE created < ?", (time.time() - self.ttl,))
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM ocr_cache").fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM ocr_cache WHERE key IN (SELECT key FROM ocr_cache ORDER BY accessed LIMIT ?)",
+                (overflow,),
+            )
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM ocr_cache")
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            (size,) = self._conn.execute("SELECT COUNT(*) FROM ocr_cache").fetchone()
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": size,
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_ocr_cache():
+    """
+    프로세스 전체에서 공유하는 OCR 캐시를 반환.
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = OCRCache()
+    return _cache
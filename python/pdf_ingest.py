@@ -0,0 +1,133 @@
+import os, base64
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+import config  # .env는 config에서 한 번만 읽는다
+import pdfplumber
+from pdf2image import convert_from_path, convert_from_bytes
+
+from preprocess import PREPROCESS_ENABLED, preprocess_image
+from text_parser import parse_receipt_text
+from utils import PDF_DPI, ReceiptFile, request_receipt_ocr, request_receipt_text_ocr
+from instrumentation import copy_context
+
+PDF_WORKERS = int(os.getenv("PDF-WORKERS", "4"))  # 동시에 렌더링/OCR 할 페이지 수
+PDF_MAX_PAGES = int(os.getenv("PDF-MAX-PAGES", "20"))
+MIN_TEXT_CHARS = 30  # 텍스트 레이어로 인정할 최소 글자 수
+# 텍스트 레이어 처리 방식: local(규칙 파서 → 텍스트 LLM → 이미지), llm(텍스트 LLM → 이미지), off(항상 이미지)
+PDF_TEXT_MODE = os.getenv("PDF-TEXT-MODE", "local")
+# 상호명/날짜/총액만으로 0.8이므로, 항목을 찾고 그 합계가 총액과 맞아야(1.0) 규칙 파서 결과를 그대로 쓴다
+LOCAL_PARSE_THRESHOLD = float(os.getenv("PDF-LOCAL-PARSE-THRESHOLD", "0.95"))
+TEXT_OCR_MODEL = os.getenv("TEXT-OCR-MODEL", "gpt-4o-mini")  # 텍스트만 보낼 때 쓰는 저렴한 모델
+
+
+def extract_pdf_text(file_path, max_pages=PDF_MAX_PAGES):
+    """
+    PDF에 내장된 텍스트 레이어를 페이지별로 추출. 스캔본처럼 텍스트가 없으면 빈 문자열이 들어간다.
+    """
+    if isinstance(file_path, ReceiptFile):
+        # 임시 파일로 옮겨진 ReceiptFile은 open()이 파일 핸들을 열므로 다 읽으면 닫는다
+        with file_path.open() as source, pdfplumber.open(source) as pdf:
+            return [(page.extract_text() or "") for page in pdf.pages[:max_pages]]
+    with pdfplumber.open(file_path) as pdf:
+        return [(page.extract_text() or "") for page in pdf.pages[:max_pages]]
+
+
+def has_text_layer(page_texts):
+    return sum(len(text.strip()) for text in page_texts) >= MIN_TEXT_CHARS
+
+
+def render_page(file_path, page_number, dpi=PDF_DPI):
+    """
+    PDF의 한 페이지(1부터 시작)만 렌더링하여 base64 JPEG로 반환.
+    """
+    if isinstance(file_path, ReceiptFile) and file_path.data is not None:
+        image = convert_from_bytes(file_path.data, first_page=page_number, last_page=page_number, dpi=dpi)[0]
+    else:
+        path = file_path.path if isinstance(file_path, ReceiptFile) else file_path
+        image = convert_from_path(path, first_page=page_number, last_page=page_number, dpi=dpi)[0]
+    if PREPROCESS_ENABLED:
+        data = preprocess_image(image)
+    else:
+        buffered = BytesIO()
+        image.save(buffered, format="JPEG")
+        data = buffered.getvalue()
+    return base64.b64encode(data).decode('utf-8')
+
+
+def _ocr_page(file_path, page_number):
+    try:
+        # 페이지마다 빠진 필드가 있어도 합친 결과를 ocr_receipt_file에서 검증한다
+        return request_receipt_ocr(render_page(file_path, page_number), strict=False)
+    except Exception as e:
+        print(f"{page_number}페이지 OCR 오류: {e}")
+        return None
+
+
+def merge_page_results(page_results):
+    """
+    페이지별 OCR 결과를 하나의 영수증 정보로 합친다.
+    상호명/날짜는 처음 나온 값을, 항목은 모든 페이지의 항목을, 총액은 마지막으로 나온 값을 사용한다.
+    총액이 어느 페이지에도 없으면 항목 가격의 합으로 채운다.
+    """
+    results = [result for result in page_results if isinstance(result, dict)]
+    if not results:
+        return None
+    merged = {"상호명": None, "날짜": None, "항목": [], "총액": None}
+    for result in results:
+        merged["상호명"] = merged["상호명"] or result.get("상호명")
+        merged["날짜"] = merged["날짜"] or result.get("날짜")
+        merged["항목"].extend(result.get("항목") or [])
+        if result.get("총액") is not None:
+            merged["총액"] = result["총액"]
+    if merged["총액"] is None:
+        prices = [item.get("가격") for item in merged["항목"]]
+        merged["총액"] = sum(price for price in prices if isinstance(price, (int, float)))
+    return merged
+
+
+def is_complete(result):
+    return (
+        isinstance(result, dict)
+        and bool(result.get("상호명"))
+        and bool(result.get("날짜"))
+        and result.get("총액") is not None
+    )
+
+
+def extract_from_text_layer(text):
+    """
+    디지털 PDF의 텍스트로 영수증 정보를 추출. 규칙 파서의 신뢰도가 충분하면 API 호출 없이 끝내고,
+    낮으면 저렴한 텍스트 전용 모델로 한 번 더 시도한다. 둘 다 실패하면 None (이미지 OCR로 넘어감).
+    """
+    if PDF_TEXT_MODE == "local":
+        result, confidence = parse_receipt_text(text)
+        print(f"규칙 파서 신뢰도 {confidence}: {result}")
+        if confidence >= LOCAL_PARSE_THRESHOLD and is_complete(result):
+            return result
+    try:
+        result = request_receipt_text_ocr(text, model=TEXT_OCR_MODEL)
+    except Exception as e:
+        print(f"텍스트 OCR 오류: {e}")
+        return None
+    return result if is_complete(result) else None
+
+
+def ocr_pdf(file_path, max_workers=PDF_WORKERS):
+    """
+    PDF 영수증의 모든 페이지에서 정보를 추출.
+    텍스트 레이어가 있으면 규칙 파서/텍스트 모델로 먼저 처리하고 (extract_from_text_layer),
+    없으면 페이지마다 워커가 렌더링과 OCR을 동시에 진행한 뒤 결과를 합친다.
+    """
+    page_texts = extract_pdf_text(file_path)
+    if PDF_TEXT_MODE != "off" and has_text_layer(page_texts):
+        result = extract_from_text_layer("\n\n".join(page_texts))
+        if result is not None:
+            return result
+    page_count = len(page_texts)
+    if page_count <= 1:
+        return _ocr_page(file_path, 1)
+    with ThreadPoolExecutor(max_workers=min(max_workers, page_count)) as executor:
+        # 페이지마다 계측 컨텍스트(receipt_id)를 복사해서 넘긴다
+        futures = [executor.submit(copy_context().run, _ocr_page, file_path, page) for page in range(1, page_count + 1)]
+        page_results = [future.result() for future in futures]
+    return merge_page_results(page_results)
@@ -0,0 +1,171 @@
+import os, time, threading
+import config  # .env는 config에서 한 번만 읽는다
+
+from langchain.chains import SequentialChain, LLMChain
+from langchain.chat_models import ChatOpenAI
+
+from chains import (
+    OCRChain, SearchChain, CategoryAssistantChain, GuidelineCategoryChain, BusinessCategoryChain, KnnCategoryChain,
+    FusedReceiptChain,
+)
+from merchant_cache import get_merchant_cache
+from prompts import assistant_prompt, analysis_prompt
+from tools import search_tool
+from scheduler import Stage
+from instrumentation import stage, TokenUsageHandler
+from resilience import POLICIES
+from guideline_index import get_guideline_index
+from receipt_knn import get_receipt_knn, KNN_ENABLED
+
+OPEN_AI_KEY = os.getenv("OPEN-AI")
+# 비목 판단 방식: guideline(로컬 지침 인덱스 + chat 한 번) / assistant(원격 OpenAI Assistant 파일 검색)
+CATEGORY_BACKEND = os.getenv("CATEGORY-BACKEND", "guideline")
+# 처리 방식: chain(OCR → 업종 판단 → 비목 판단) / fused(한 번의 vision 요청, 검색은 도구로만)
+RECEIPT_MODE = os.getenv("RECEIPT-MODE", "chain")
+
+_lock = threading.Lock()
+_pipeline = None
+
+
+def build_receipt_chain(analysis_llm=None, category_backend=CATEGORY_BACKEND, use_knn=KNN_ENABLED, mode=RECEIPT_MODE):
+    """
+    OCR → (상호명 캐시 →) 검색 → 업종 분석 → 비목 판단으로 이어지는 SequentialChain을 생성.
+    mode가 "fused"이면 FusedReceiptChain 하나로 된 SequentialChain을 만든다 (출력 키는 같다).
+    체인과 내부 클라이언트(ChatOpenAI 등)는 상태를 갖지 않으므로 여러 워커 스레드에서 공유할 수 있다.
+    Args:
+        analysis_llm: 업종 분석에 쓸 LLM. 없으면 gpt-4 ChatOpenAI (벤치마크에서 기록된 응답으로 대체할 때 지정).
+        category_backend (str): 비목 판단 방식. "guideline"(기본) 또는 "assistant".
+            guideline이어도 지침 인덱스가 비어 있으면(지침 PDF 폴더가 없는 등) 근거 없는 판단을 하지 않도록 assistant를 쓴다.
+            인덱스는 여기서 열거나 만들므로, 체인을 만드는 동안 get_receipt_chain을 부른 영수증은 결정이 끝날 때까지 기다린다.
+        use_knn (bool): 이전 판단과 비슷한 영수증이면 k-NN 분류기로 업종/비목을 바로 정한다.
+        mode (str): "chain"(기본) 또는 "fused". fused에서는 category_backend/use_knn을 쓰지 않고 항상 로컬 지침 인덱스를 쓴다.
+    """
+    if mode == "fused":
+        return SequentialChain(
+            chains=[FusedReceiptChain()],
+            input_variables=["image_path"],
+            output_variables=["assistant_response", "business_category", "ocr_response"],
+            verbose=True
+        )
+    # OCRChain 초기화
+    ocr_chain = OCRChain()
+    # SearchChain 초기화
+    search_chain = SearchChain(search_tool)
+    # Analysis Chain (검색결과로부터 업종 판단) 초기화
+    analysis_chain = LLMChain(
+        llm = analysis_llm or ChatOpenAI(
+            model="gpt-4",
+            temperature=0,
+            openai_api_key = OPEN_AI_KEY,
+            request_timeout=POLICIES["openai"].timeout,
+            max_retries=POLICIES["openai"].max_retries,
+        ),
+        prompt=analysis_prompt,
+        output_key="business_category",  # 출력 키를 명시적으로 설정
+        callbacks=[TokenUsageHandler()],  # 토큰 사용량 계측
+    )
+    # 상호명 캐시에 있으면 검색과 업종 분석을 건너뜀
+    category_chain = BusinessCategoryChain(search_chain, analysis_chain, get_merchant_cache())
+    if use_knn:
+        # 비슷한 영수증을 이미 판단했으면 검색/업종 분석/비목 판단을 모두 건너뜀
+        category_chain = KnnCategoryChain(get_receipt_knn(), category_chain)
+    if category_backend == "guideline" and not len(get_guideline_index()):
+        print("지침 인덱스가 비어 있어 비목 판단은 assistant 방식으로 합니다.")
+        category_backend = "assistant"
+    # 비목 판단 체인 초기화 (출력 키는 두 방식 모두 assistant_response)
+    if category_backend == "assistant":
+        assistant_chain = CategoryAssistantChain(prompt=assistant_prompt)
+    else:
+        assistant_chain = GuidelineCategoryChain(prompt=assistant_prompt)
+    return SequentialChain(
+        chains=[ocr_chain, category_chain, assistant_chain],
+        input_variables=["image_path"],
+        output_variables=["assistant_response", "business_category", "ocr_response"],
+        verbose=True
+    )
+
+
+def get_receipt_chain():
+    """
+    프로세스 전체에서 공유하는 영수증 체인을 반환. 처음 호출될 때 한 번만 생성한다.
+    """
+    global _pipeline
+    if _pipeline is None:
+        with _lock:
+            if _pipeline is None:
+                _pipeline = build_receipt_chain()
+    return _pipeline
+
+
+def run_receipt_chain(inputs, timings=None):
+    """
+    공유 체인의 각 단계를 순서대로 실행하면서 단계별 소요 시간(초)을 timings에 기록.
+    결과는 sequential_chain.invoke(inputs)와 같다.
+    """
+    sequential_chain = get_receipt_chain()
+    outputs = dict(inputs)
+    for step in sequential_chain.chains:
+        started = time.perf_counter()
+        with stage(type(step).__name__):
+            outputs.update(step.invoke(outputs))
+        if timings is not None:
+            timings[type(step).__name__] = time.perf_counter() - started
+    return outputs
+
+
+def receipt_stages(source="image_path"):
+    """
+    공유 체인을 DAG 단계(ocr → category → assistant)로 나눠 반환.
+    source 단계의 결과(영수증 파일 경로)를 입력으로 받으며, 다른 단계(S3 업로드 등)와 함께 StageScheduler에 넣어 쓴다.
+    통합(fused) 모드에서는 체인이 하나뿐이므로 "assistant" 단계 하나만 반환한다 (뒤 단계는 assistant 결과만 쓴다).
+    """
+    chains = get_receipt_chain().chains
+    if len(chains) == 1:
+        fused_chain, = chains
+
+        def fused(**kwargs):
+            return fused_chain.invoke({"image_path": kwargs[source]})
+
+        return [Stage("assistant", fused, [source])]
+    ocr_chain, category_chain, assistant_chain = chains
+
+    def ocr(**kwargs):
+        return ocr_chain.invoke({"image_path": kwargs[source]})
+
+    def category(ocr):
+        return category_chain.invoke(ocr)
+
+    def assistant(category):
+        return assistant_chain.invoke(category)
+
+    return [
+        Stage("ocr", ocr, [source]),
+        Stage("category", category, ["ocr"]),
+        Stage("assistant", assistant, ["category"]),
+    ]
+
+
+def warm_up():
+    """
+    봇 시작 시 호출하여 체인 생성 비용(지침 인덱스 열기/갱신 포함)을 첫 영수증 처리 전에 미리 지불한다.
+    지침 인덱스가 비어 있으면 크게 경고한다. chain 모드의 비목 판단 방식은 build_receipt_chain이 이미 assistant로 정했다.
+    """
+    chain = get_receipt_chain()
+    if not len(get_guideline_index()):
+        print("=" * 60)
+        if isinstance(chain.chains[-1], FusedReceiptChain):
+            print("경고: 지침 인덱스에 청크가 없어 통합(fused) 모드가 지침 없이 비목을 판단합니다.")
+        else:
+            print("경고: 지침 인덱스에 청크가 없어 비목 판단을 assistant(원격 OpenAI Assistant)로 대신합니다.")
+        print("지침 PDF를 넣고 'python guideline_index.py build'를 실행한 뒤 다시 시작하세요.")
+        print("=" * 60)
+    return chain
+
+
+def reset_receipt_chain():
+    """
+    설정이 바뀌었을 때 다음 호출에서 체인을 새로 만들도록 캐시를 비운다.
+    """
+    global _pipeline
+    with _lock:
+        _pipeline = None
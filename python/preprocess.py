@@ -0,0 +1,139 @@
+import os, sys
+from io import BytesIO
+import config  # .env는 config에서 한 번만 읽는다
+from PIL import Image, ImageOps, ImageFilter
+
+PREPROCESS_ENABLED = os.getenv("OCR-PREPROCESS", "1") != "0"
+MAX_EDGE = int(os.getenv("OCR-MAX-EDGE", "1600"))  # 긴 변 최대 픽셀
+TARGET_BYTES = int(os.getenv("OCR-TARGET-BYTES", str(300 * 1024)))  # JPEG 목표 크기
+GRAYSCALE = os.getenv("OCR-GRAYSCALE", "1") != "0"
+MIN_QUALITY = 40
+MAX_QUALITY = 85
+DETECT_EDGE = 400  # 영수증 영역 검출용 축소 이미지의 긴 변 (용지 경계만 찾으면 되므로 작게)
+QUALITY_PROBES = 3  # 목표 크기를 맞추기 위해 JPEG를 인코딩해 보는 최대 횟수
+
+
+def preprocess_signature():
+    """
+    전처리 설정을 나타내는 문자열. 설정이 바뀌면 OCR 캐시 키도 바뀌도록 키에 포함한다.
+    """
+    if not PREPROCESS_ENABLED:
+        return "raw"
+    return f"pre:v3:{MAX_EDGE}:{TARGET_BYTES}:{int(GRAYSCALE)}"
+
+
+def crop_to_receipt(image, threshold_offset=30, min_area_ratio=0.2, margin_ratio=0.02, detect_edge=DETECT_EDGE):
+    """
+    배경보다 밝은 영수증 용지 영역만 남기도록 자른다.
+    찾은 영역이 너무 작으면(잘못 잡은 경우) 원본을 그대로 돌려준다.
+    영역 검출은 긴 변 detect_edge 픽셀 안팎으로 정수배 축소(reduce)한 흑백 사본에서 한다 (원본 해상도의 median filter는 수 초가 걸림).
+    """
+    small = image.reduce(max(1, max(image.size) // detect_edge)).convert("L")
+    gray = ImageOps.autocontrast(small.filter(ImageFilter.MedianFilter(3)))
+    histogram = gray.histogram()
+    pixels = sum(histogram)
+    mean = sum(i * count for i, count in enumerate(histogram)) / pixels
+    threshold = min(250, mean + threshold_offset)
+    mask = gray.point(lambda v: 255 if v >= threshold else 0)
+    bbox = mask.getbbox()
+    if bbox is None:
+        return image
+    width, height = image.size
+    scale_x, scale_y = width / gray.width, height / gray.height
+    left, top = int(bbox[0] * scale_x), int(bbox[1] * scale_y)
+    right, bottom = int(bbox[2] * scale_x), int(bbox[3] * scale_y)
+    if (right - left) * (bottom - top) < min_area_ratio * width * height:
+        return image
+    margin_x, margin_y = int(width * margin_ratio), int(height * margin_ratio)
+    return image.crop((
+        max(0, left - margin_x), max(0, top - margin_y),
+        min(width, right + margin_x), min(height, bottom + margin_y),
+    ))
+
+
+def _jpeg(image, quality):
+    buffered = BytesIO()
+    image.save(buffered, format="JPEG", quality=quality)
+    return buffered.getvalue()
+
+
+def encode_jpeg(image, target_bytes=TARGET_BYTES, min_quality=MIN_QUALITY, max_quality=MAX_QUALITY,
+                probes=QUALITY_PROBES):
+    """
+    target_bytes 이하가 되는 JPEG를 많아야 probes번의 인코딩으로 찾는다.
+    max_quality로 먼저 인코딩해 보고, 넘으면 min_quality 결과와의 크기 비례로 품질을 추정해 다시 인코딩한다.
+    최저 품질로도 넘으면 최저 품질 결과를 반환한다.
+    """
+    data = _jpeg(image, max_quality)
+    if len(data) <= target_bytes or probes <= 1:
+        return data
+    low, low_data = min_quality, _jpeg(image, min_quality)
+    high, high_size = max_quality, len(data)
+    best = low_data
+    for _ in range(probes - 2):
+        if len(low_data) > target_bytes or high - low <= 1:
+            break
+        # 품질에 따른 크기를 두 점 사이의 직선으로 보고 목표 크기에 해당하는 품질을 고른다
+        quality = low + int((target_bytes - len(low_data)) / (high_size - len(low_data)) * (high - low))
+        quality = max(low + 1, min(high - 1, quality))
+        data = _jpeg(image, quality)
+        if len(data) <= target_bytes:
+            low, low_data, best = quality, data, data
+        else:
+            high, high_size = quality, len(data)
+    return best
+
+
+def preprocess_image(image, max_edge=MAX_EDGE, grayscale=GRAYSCALE, target_bytes=TARGET_BYTES):
+    """
+    영수증 이미지를 OCR 요청에 맞게 줄인다: 회전 보정 → 영수증 영역 자르기 → 축소 → 흑백 → JPEG 재압축.
+    Returns:
+        bytes: 전처리된 JPEG 데이터.
+    """
+    image = ImageOps.exif_transpose(image)
+    image = crop_to_receipt(image)
+    # 흑백 변환을 먼저 하면 축소할 채널이 1개뿐이다
+    image = image.convert("L") if grayscale else image.convert("RGB")
+    image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+    return encode_jpeg(image, target_bytes=target_bytes)
+
+
+def preprocess_image_bytes(file_bytes, **kwargs):
+    """
+    이미지 파일 바이트를 전처리하고 (JPEG 바이트, 통계)를 반환.
+    """
+    with Image.open(BytesIO(file_bytes)) as image:
+        image.load()
+        size = image.size
+        data = preprocess_image(image, **kwargs)
+    stats = {
+        "bytes_before": len(file_bytes),
+        "bytes_after": len(data),
+        "ratio": len(data) / len(file_bytes) if file_bytes else 0.0,
+        "size_before": size,
+    }
+    print(f"이미지 전처리: {stats['bytes_before']:,} → {stats['bytes_after']:,} bytes ({stats['ratio']:.1%})")
+    return data, stats
+
+
+if __name__ == "__main__":
+    # 사용법: python preprocess.py [이미지 폴더] [출력 폴더]
+    # 로컬 샘플 영수증에 전처리를 적용해 크기 변화를 확인하고, 결과 이미지를 눈으로 검토할 수 있게 저장한다.
+    source_dir = sys.argv[1] if len(sys.argv) > 1 else "../image"
+    output_dir = sys.argv[2] if len(sys.argv) > 2 else None
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    total_before = total_after = 0
+    for name in sorted(os.listdir(source_dir)):
+        if not name.lower().endswith((".jpg", ".jpeg", ".png", ".heic", ".webp")):
+            continue
+        with open(os.path.join(source_dir, name), "rb") as f:
+            data, stats = preprocess_image_bytes(f.read())
+        total_before += stats["bytes_before"]
+        total_after += stats["bytes_after"]
+        print(f"  {name}: {stats['size_before']}")
+        if output_dir:
+            with open(os.path.join(output_dir, os.path.splitext(name)[0] + ".jpg"), "wb") as f:
+                f.write(data)
+    if total_before:
+        print(f"합계: {total_before:,} → {total_after:,} bytes ({total_after / total_before:.1%})")
@@ -11,6 +11,32 @@ assistant_prompt = PromptTemplate(
     output_variables=["assistant_response"],
 )
 
+# 로컬 지침 인덱스에서 찾은 내용을 넣는 system 메시지 (GuidelineCategoryChain)
+guideline_system_prompt = PromptTemplate(
+    input_variables=["context"],
+    template="""
+    너는 국가연구개발사업 연구비 집행 지침을 잘 아는 행정 전문가야.
+    아래는 지침 PDF에서 찾은 관련 내용이야. "제공한 PDF"는 이 내용을 말해.
+    판단 근거는 이 내용 안에서만 찾고, 가능하면 [파일 이름 p.쪽] 출처를 함께 적어 줘.
+
+    {context}
+    """
+)
+
+# 통합(fused) 모드: 영수증 읽기, 업종 추론, 비목 판단을 한 번에 하는 system 메시지
+fused_system_prompt = PromptTemplate(
+    input_variables=["context"],
+    template="""
+    너는 영수증을 읽고 국가연구개발사업 연구비 비목을 판단하는 행정 전문가야.
+    영수증 이미지에서 상호명, 날짜, 항목, 총액을 읽고, 상호의 업종을 추론한 뒤
+    아래 지침 내용을 근거로 회의비, 식비, 교통비 중 하나로 판단해 줘. 셋 중 하나로 판단이 안되면 "판단할 수 없음"으로 답해.
+    상호명과 품목만으로 업종을 확신할 수 없을 때만 search_business 도구로 상호명을 검색해.
+    판단 근거는 지침 내용 안에서만 찾고, 가능하면 [파일 이름 p.쪽] 출처를 함께 적어 줘.
+
+    {context}
+    """
+)
+
 # Prompt 정의
 analysis_prompt = PromptTemplate(
     input_variables=["business_name", "search_results"],
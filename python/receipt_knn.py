@@ -0,0 +1,291 @@
+"""
+이전에 판단한 영수증으로 업종/비목을 바로 정하는 k-NN 분류기.
+
+상호명(정규화) + 항목 이름을 임베딩하고, 저장된 영수증 벡터와의 코사인 유사도를 한 번의 행렬 곱으로 구해
+가장 가까운 k개의 판단으로 투표한다. 신뢰도가 기준을 넘으면 Google 검색, 업종 분석, 비목 판단을 모두 건너뛴다.
+
+- 학습 데이터: 파이프라인이 검증을 통과한 판단(자동)과 사람이 바로잡은 판단(confirm, 자동 결과로 덮어쓰지 않음)
+- 정확도: 건너뛰지 않은 영수증(신뢰도 미달 + 일부 샘플링한 적중 건)을 학습할 때, 분류기가 냈을 답과 실제 판단을 비교한다
+- 오프라인 평가: python receipt_knn.py evaluate  (저장된 데이터로 leave-one-out 적중률/정확도)
+
+이웃 하나의 판단이 틀리면 비슷한 영수증 모두에 그대로 퍼지므로, 같은 비목에 투표한 이웃이 KNN_MIN_VOTERS개 이상이거나
+사람이 확인한 이웃이 있어야 적중으로 본다. 기본값은 꺼짐(KNN-ENABLED=0)이며, confirm으로 사람이 확인한 판단을 넣고
+evaluate로 정확도를 확인한 뒤 켠다.
+"""
+import os, sys, json, time, sqlite3, hashlib, argparse, threading
+from dataclasses import dataclass, field
+from typing import List
+import config  # .env는 config에서 한 번만 읽는다
+import numpy as np
+
+from guideline_index import embed_texts, EMBEDDING_MODEL
+from merchant_cache import normalize_merchant_name
+from receipt_schema import ACCOUNT_CHOICES, CategoryDecision
+
+KNN_ENABLED = os.getenv("KNN-ENABLED", "0") != "0"
+KNN_PATH = os.getenv("KNN-PATH", "../cache/receipt_knn.sqlite3")
+KNN_K = int(os.getenv("KNN-K", "5"))
+KNN_MIN_SIMILARITY = float(os.getenv("KNN-MIN-SIMILARITY", "0.88"))  # 이보다 먼 영수증은 투표하지 않는다
+KNN_THRESHOLD = float(os.getenv("KNN-THRESHOLD", "0.8"))  # 이 신뢰도 이상이면 LLM 경로를 건너뛴다
+# 같은 비목에 투표해야 하는 이웃 수 (사람이 확인한 이웃은 혼자서 이 수를 채운다)
+KNN_MIN_VOTERS = int(os.getenv("KNN-MIN-VOTERS", "3"))
+KNN_SHADOW_RATE = float(os.getenv("KNN-SHADOW-RATE", "0.05"))  # 적중 건 중 정확도 측정을 위해 LLM 경로로 보내는 비율
+UNDECIDED = "판단할 수 없음"
+
+
+def receipt_text(ocr_response):
+    """
+    임베딩할 텍스트: 정규화한 상호명 + 항목 이름. 날짜와 금액은 업종/비목과 관계가 적으므로 넣지 않는다.
+    """
+    merchant = normalize_merchant_name(ocr_response.get("상호명"))
+    items = [item.get("이름", "") for item in ocr_response.get("항목") or [] if isinstance(item, dict)]
+    return f"{merchant} | {', '.join(name for name in items if name)}"
+
+
+def text_key(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+@dataclass
+class KnnPrediction:
+    account: str  # 비목
+    business_category: str  # 업종
+    confidence: float  # 같은 비목의 유사도 합 비율 × support
+    similarity: float  # 가장 가까운 이웃의 유사도
+    neighbours: List[dict] = field(default_factory=list)
+    support: float = 0.0  # 같은 비목에 투표한 이웃 수 / KNN_MIN_VOTERS (최대 1, 사람이 확인한 이웃은 1)
+
+    def confident(self, threshold=KNN_THRESHOLD):
+        return self.support >= 1.0 and self.confidence >= threshold and self.similarity >= KNN_MIN_SIMILARITY
+
+    def decision(self):
+        nearest = self.neighbours[0]
+        reason = (f"유사한 이전 영수증 {len(self.neighbours)}건의 판단을 따름 "
+                  f"(가장 가까운 영수증: {nearest['text']}, 유사도 {self.similarity:.2f}). {nearest['reason']}")
+        return CategoryDecision(self.account, reason.strip())
+
+
+class ReceiptKnn:
+    """
+    라벨이 붙은 영수증 벡터 저장소와 k-NN 분류기.
+    벡터는 정규화된 float32 행렬 하나에 모아 두고(용량을 두 배씩 늘림), SQLite에 영구 저장한다.
+    """
+    def __init__(self, path=KNN_PATH, model=EMBEDDING_MODEL, k=KNN_K, threshold=KNN_THRESHOLD):
+        self.path = path
+        self.model = model
+        self.k = k
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._keys = []  # 행 번호 -> 키
+        self._rows = {}  # 키 -> 행 번호
+        self._labels = []  # 행 번호 -> {"text", "account", "business_category", "reason", "confirmed"}
+        self._matrix = None
+        self._stats = {"lookups": 0, "hits": 0, "shadowed": 0, "learned": 0, "evaluated": 0, "correct": 0}
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS receipt_label ("
+            " key TEXT PRIMARY KEY, text TEXT NOT NULL, model TEXT NOT NULL, vector BLOB NOT NULL,"
+            " account TEXT NOT NULL, business_category TEXT NOT NULL, reason TEXT,"
+            " confirmed INTEGER NOT NULL DEFAULT 0, updated REAL NOT NULL)"
+        )
+        self._conn.commit()
+        rows = self._conn.execute(
+            "SELECT key, text, vector, account, business_category, reason, confirmed FROM receipt_label WHERE model = ?",
+            (model,),
+        ).fetchall()
+        for key, text, vector, account, business_category, reason, confirmed in rows:
+            self._set_row(key, np.frombuffer(vector, dtype=np.float32), {
+                "text": text, "account": account, "business_category": business_category,
+                "reason": reason or "", "confirmed": bool(confirmed),
+            })
+
+    def __len__(self):
+        return len(self._keys)
+
+    def embed(self, ocr_response):
+        text = receipt_text(ocr_response)
+        return text, embed_texts([text], self.model)[0]
+
+    def predict(self, vector, exclude=None):
+        """
+        벡터와 가장 가까운 k개 중 유사도가 KNN_MIN_SIMILARITY 이상인 영수증으로 비목을 투표한다. 없으면 None.
+        Args:
+            exclude (str): 투표에서 뺄 키 (학습/평가 중인 영수증 자신).
+        """
+        with self._lock:
+            count = len(self._keys)
+            if count == 0:
+                return None
+            similarities = self._matrix[:count] @ vector
+            if exclude in self._rows:
+                similarities[self._rows[exclude]] = -np.inf
+            k = min(self.k, count)
+            top = np.argpartition(-similarities, k - 1)[:k]
+            top = top[np.argsort(-similarities[top])]
+            neighbours = [
+                {**self._labels[row], "similarity": float(similarities[row])}
+                for row in top if similarities[row] >= KNN_MIN_SIMILARITY
+            ]
+        if not neighbours:
+            return None
+        votes = {}
+        for neighbour in neighbours:
+            # 사람이 확인한 판단은 두 배로 센다
+            weight = neighbour["similarity"] * (2.0 if neighbour["confirmed"] else 1.0)
+            votes[neighbour["account"]] = votes.get(neighbour["account"], 0.0) + weight
+        account = max(votes, key=votes.get)
+        voters = [neighbour for neighbour in neighbours if neighbour["account"] == account]
+        # 투표 비율만 보면 이웃이 하나일 때 항상 1.0이 되므로 투표한 이웃 수로 줄인다
+        support = min(1.0, sum(KNN_MIN_VOTERS if voter["confirmed"] else 1 for voter in voters) / max(KNN_MIN_VOTERS, 1))
+        return KnnPrediction(
+            account=account,
+            business_category=voters[0]["business_category"],
+            confidence=votes[account] / sum(votes.values()) * support,
+            similarity=neighbours[0]["similarity"],
+            neighbours=voters,
+            support=support,
+        )
+
+    def classify(self, ocr_response):
+        """
+        영수증의 (임베딩 텍스트, 벡터, 예측)을 반환. 예측이 없거나 신뢰도가 낮으면 예측은 None.
+        """
+        text, vector = self.embed(ocr_response)
+        prediction = self.predict(vector)
+        with self._lock:
+            self._stats["lookups"] += 1
+            if prediction is not None and prediction.confident(self.threshold):
+                self._stats["hits"] += 1
+            else:
+                prediction = None
+        return text, vector, prediction
+
+    def count_shadow(self):
+        with self._lock:
+            self._stats["hits"] -= 1
+            self._stats["shadowed"] += 1
+
+    def learn(self, ocr_response, business_category, decision, confirmed=False):
+        """
+        LLM 경로로 판단한 결과(또는 사람이 바로잡은 결과)를 저장한다.
+        저장하기 전에 분류기가 냈을 답과 비교해 정확도를 센다. 사람이 확인한 항목은 자동 결과로 덮어쓰지 않는다.
+        """
+        if decision.account not in ACCOUNT_CHOICES or decision.account == UNDECIDED or not business_category:
+            return
+        text, vector = self.embed(ocr_response)
+        key = text_key(text)
+        prediction = self.predict(vector, exclude=key)
+        with self._lock:
+            if prediction is not None and prediction.confident(self.threshold):
+                self._stats["evaluated"] += 1
+                if prediction.account == decision.account:
+                    self._stats["correct"] += 1
+            row = self._rows.get(key)
+            if row is not None and self._labels[row]["confirmed"] and not confirmed:
+                return
+            label = {"text": text, "account": decision.account, "business_category": business_category,
+                     "reason": decision.reason, "confirmed": confirmed}
+            self._conn.execute(
+                "INSERT OR REPLACE INTO receipt_label"
+                " (key, text, model, vector, account, business_category, reason, confirmed, updated)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, text, self.model, vector.astype(np.float32).tobytes(), decision.account, business_category,
+                 decision.reason, int(confirmed), time.time()),
+            )
+            self._conn.commit()
+            self._set_row(key, vector, label)
+            self._stats["learned"] += 1
+
+    def confirm(self, ocr_response, business_category, account, reason="사람이 확인한 판단"):
+        """
+        사람이 확인하거나 바로잡은 판단을 저장. 이후 자동 결과가 이 값을 덮어쓰지 않는다.
+        """
+        self.learn(ocr_response, business_category, CategoryDecision(account, reason), confirmed=True)
+
+    def evaluate(self, thresholds=(0.6, 0.7, 0.8, 0.9, 1.0)):
+        """
+        저장된 영수증마다 자신을 뺀 나머지로 예측해(leave-one-out) 기준값별 적중률과 정확도를 계산한다.
+        """
+        with self._lock:
+            keys = list(self._keys)
+            vectors = self._matrix[:len(keys)].copy() if keys else None
+            accounts = [label["account"] for label in self._labels]
+        predictions = [self.predict(vectors[row], exclude=key) for row, key in enumerate(keys)]
+        report = []
+        for threshold in thresholds:
+            hits = [(p, accounts[row]) for row, p in enumerate(predictions) if p is not None and p.confident(threshold)]
+            correct = sum(1 for p, account in hits if p.account == account)
+            report.append({
+                "threshold": threshold,
+                "hit_rate": len(hits) / len(keys) if keys else 0.0,
+                "accuracy": correct / len(hits) if hits else 0.0,
+            })
+        return {"receipts": len(keys), "levels": report}
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["entries"] = len(self)
+        stats["hit_rate"] = stats["hits"] / stats["lookups"] if stats["lookups"] else 0.0
+        stats["accuracy"] = stats["correct"] / stats["evaluated"] if stats["evaluated"] else 0.0
+        return stats
+
+    def _set_row(self, key, vector, label):
+        row = self._rows.get(key)
+        if row is None:
+            row = len(self._keys)
+            if self._matrix is None:
+                self._matrix = np.zeros((64, len(vector)), dtype=np.float32)
+            elif row == len(self._matrix):
+                self._matrix = np.vstack([self._matrix, np.zeros_like(self._matrix)])
+            self._keys.append(key)
+            self._labels.append(label)
+            self._rows[key] = row
+        self._matrix[row] = vector
+        self._labels[row] = label
+
+
+_knn = None
+_knn_lock = threading.Lock()
+
+
+def get_receipt_knn():
+    """
+    프로세스 전체에서 공유하는 k-NN 분류기를 반환.
+    """
+    global _knn
+    if _knn is None:
+        with _knn_lock:
+            if _knn is None:
+                _knn = ReceiptKnn()
+    return _knn
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="영수증 k-NN 분류기")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("evaluate", help="저장된 판단으로 leave-one-out 적중률/정확도 계산")
+    confirm_parser = commands.add_parser("confirm", help="사람이 확인한 판단 저장")
+    confirm_parser.add_argument("ocr_json", help='OCR 결과 JSON (예: {"상호명": ..., "항목": [...]})')
+    confirm_parser.add_argument("business_category")
+    confirm_parser.add_argument("account", choices=[account for account in ACCOUNT_CHOICES if account != UNDECIDED])
+    args = parser.parse_args(argv)
+
+    knn = get_receipt_knn()
+    if args.command == "evaluate":
+        report = knn.evaluate()
+        print(f"저장된 영수증 {report['receipts']}건")
+        print(f"{'기준':>6}{'적중률':>9}{'정확도':>9}")
+        for level in report["levels"]:
+            print(f"{level['threshold']:>6.2f}{level['hit_rate']:>9.1%}{level['accuracy']:>9.1%}")
+        return 0
+    knn.confirm(json.loads(args.ocr_json), args.business_category, args.account)
+    print(f"저장됨: {receipt_text(json.loads(args.ocr_json))} -> {args.business_category} / {args.account}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,308 @@
+"""
+영수증 OCR 결과(상호명/날짜/항목/총액)와 비목 판단 결과(판단/근거)의 스키마.
+통합(fused) 모드에서는 두 결과와 업종을 한 번의 응답으로 받는다 (FUSED_JSON_SCHEMA).
+
+모델 응답에서 JSON을 꺼낼 때는 탐욕적 정규식 대신 중괄호 짝을 맞추는 파서를 쓰고,
+꺼낸 값은 스키마로 검증/정규화한다. 검증에 실패한 필드 이름을 돌려주므로
+OCR 전체를 다시 돌리지 않고 그 필드만 다시 물어볼 수 있다.
+"""
+import re, json
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from text_parser import parse_date
+
+ACCOUNT_CHOICES = ("회의비", "식비", "교통비", "판단할 수 없음")
+RECEIPT_FIELDS = ("상호명", "날짜", "항목", "총액")
+_ISO_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+
+# OpenAI structured outputs(strict)용 JSON Schema
+RECEIPT_JSON_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "상호명": {"type": "string"},
+        "날짜": {"type": "string", "description": "YYYY-MM-DD"},
+        "항목": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {"이름": {"type": "string"}, "가격": {"type": "number"}},
+                "required": ["이름", "가격"],
+                "additionalProperties": False,
+            },
+        },
+        "총액": {"type": "number"},
+    },
+    "required": list(RECEIPT_FIELDS),
+    "additionalProperties": False,
+}
+
+
+# 비목 판단 결과 ({"판단": ..., "근거": ...})의 JSON Schema
+DECISION_JSON_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "판단": {"type": "string", "enum": list(ACCOUNT_CHOICES)},
+        "근거": {"type": "string"},
+    },
+    "required": ["판단", "근거"],
+    "additionalProperties": False,
+}
+
+
+# 통합 모드 응답: 영수증 필드 + 업종 + 비목 판단을 한 객체로
+FUSED_JSON_SCHEMA = {
+    "type": "object",
+    "properties": {
+        **RECEIPT_JSON_SCHEMA["properties"],
+        "업종": {"type": "string", "description": "상호의 업종 (예: 식당, 카페, 교통)"},
+        **DECISION_JSON_SCHEMA["properties"],
+    },
+    "required": list(RECEIPT_FIELDS) + ["업종", "판단", "근거"],
+    "additionalProperties": False,
+}
+
+
+class JsonObjectScanner:
+    """
+    텍스트를 조각 단위로 받아 완성된 최상위 {...} 블록을 돌려주는 증분 파서.
+    문자열 리터럴 안의 중괄호와 이스케이프를 구분하므로 값에 '{', '}'가 있어도 깨지지 않는다.
+    """
+    def __init__(self):
+        self._buffer = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, text):
+        objects = []
+        for char in text:
+            if self._depth > 0:
+                self._buffer.append(char)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"' and self._depth > 0:
+                self._in_string = True
+            elif char == "{":
+                if self._depth == 0:
+                    self._buffer = [char]
+                self._depth += 1
+            elif char == "}" and self._depth > 0:
+                self._depth -= 1
+                if self._depth == 0:
+                    objects.append("".join(self._buffer))
+                    self._buffer = []
+        return objects
+
+
+def extract_json(text):
+    """
+    문자열에서 처음으로 파싱되는 JSON 객체(dict)를 반환. 없으면 None.
+    코드 블록(```json)이나 앞뒤 설명이 섞여 있어도 되고, 끝에 붙은 쉼표 정도는 고쳐서 읽는다.
+    """
+    if not text:
+        return None
+    for candidate in JsonObjectScanner().feed(text):
+        for source in (candidate, _TRAILING_COMMA.sub(r"\1", candidate)):
+            try:
+                value = json.loads(source)
+            except ValueError:
+                continue
+            if isinstance(value, dict):
+                return value
+    return None
+
+
+def to_number(value):
+    """
+    9500, 9500.0, "9,500원" 같은 값을 숫자로. 정수로 떨어지면 int를 반환하고, 읽을 수 없으면 None.
+    """
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, str):
+        value = re.sub(r"[^\d.\-]", "", value)
+        if not value:
+            return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return int(number) if number.is_integer() else number
+
+
+class ReceiptValidationError(ValueError):
+    """
+    재질의 후에도 영수증 필수 필드(상호명/날짜/항목/총액)를 얻지 못했을 때 발생.
+    None이 섞인 결과를 넘기면 업종 검색이나 Notion 저장에서 엉뚱한 오류가 나므로 OCR 단계에서 실패시킨다.
+    """
+    def __init__(self, fields, response=None):
+        super().__init__(f"영수증에서 다음 항목을 읽지 못했습니다: {', '.join(fields)}")
+        self.fields = list(fields)
+        self.response = response  # 마지막 모델 응답 (디버깅용)
+
+
+@dataclass
+class ReceiptItem:
+    name: str
+    price: float
+
+
+@dataclass
+class Receipt:
+    """
+    영수증 OCR 결과. 검증에 실패한 필드는 None이다.
+    """
+    merchant: Optional[str] = None
+    date: Optional[str] = None
+    items: Optional[List[ReceiptItem]] = field(default_factory=list)
+    total: Optional[float] = None
+
+    def to_dict(self):
+        return {
+            "상호명": self.merchant,
+            "날짜": self.date,
+            "항목": None if self.items is None else [{"이름": item.name, "가격": item.price} for item in self.items],
+            "총액": self.total,
+        }
+
+
+def parse_receipt(data):
+    """
+    모델이 돌려준 dict를 검증/정규화하여 (Receipt, 잘못된 필드 이름 목록)을 반환.
+    날짜는 YYYY-MM-DD로 맞추고, 금액 문자열은 숫자로 바꾸며, 총액이 없으면 항목 가격의 합으로 채운다.
+    """
+    data = data if isinstance(data, dict) else {}
+    receipt, errors = Receipt(), []
+
+    merchant = data.get("상호명")
+    if isinstance(merchant, str) and merchant.strip():
+        receipt.merchant = merchant.strip()
+    else:
+        errors.append("상호명")
+
+    date = data.get("날짜")
+    if isinstance(date, str) and _ISO_DATE.match(date.strip()):
+        receipt.date = date.strip()
+    else:
+        receipt.date = parse_date([str(date)]) if date else None
+        if receipt.date is None:
+            errors.append("날짜")
+
+    items = data.get("항목", [])
+    if isinstance(items, list):
+        receipt.items = []
+        for item in items:
+            name = item.get("이름") if isinstance(item, dict) else None
+            price = to_number(item.get("가격")) if isinstance(item, dict) else None
+            if not isinstance(name, str) or price is None:
+                receipt.items = None
+                errors.append("항목")
+                break
+            receipt.items.append(ReceiptItem(name.strip(), price))
+    else:
+        receipt.items = None
+        errors.append("항목")
+
+    receipt.total = to_number(data.get("총액"))
+    if receipt.total is None:
+        if receipt.items:
+            receipt.total = sum(item.price for item in receipt.items)
+        else:
+            errors.append("총액")
+    return receipt, errors
+
+
+def receipt_errors(data):
+    return parse_receipt(data)[1]
+
+
+def merge_fields(receipt, data, fields):
+    """
+    다시 물어본 필드(fields)만 data의 값으로 바꿔 다시 검증한다.
+    """
+    merged = receipt.to_dict()
+    if isinstance(data, dict):
+        for name in fields:
+            if name in data:
+                merged[name] = data[name]
+    return parse_receipt(merged)
+
+
+def reask_prompt(fields):
+    return (
+        f"방금 답변에서 다음 필드의 값이 없거나 형식이 잘못되었습니다: {', '.join(fields)}. "
+        f"영수증을 다시 보고 이 필드만 JSON 객체로 답해 주세요. "
+        f"날짜는 YYYY-MM-DD, 가격과 총액은 숫자만, 항목은 [{{\"이름\": ..., \"가격\": ...}}] 형식입니다. "
+        f"설명은 포함하지 마세요."
+    )
+
+
+@dataclass
+class CategoryDecision:
+    """
+    Assistant의 비목 판단 결과.
+    """
+    account: Optional[str] = None  # 판단
+    reason: str = ""  # 근거
+
+    def to_dict(self):
+        return {"판단": self.account, "근거": self.reason}
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), ensure_ascii=False)
+
+
+def parse_decision(data):
+    """
+    {"판단": ..., "근거": ...}를 검증하여 (CategoryDecision, 잘못된 필드 이름 목록)을 반환.
+    """
+    data = data if isinstance(data, dict) else {}
+    decision, errors = CategoryDecision(), []
+    account = data.get("판단")
+    if isinstance(account, str) and account.strip() in ACCOUNT_CHOICES:
+        decision.account = account.strip()
+    else:
+        errors.append("판단")
+    reason = data.get("근거")
+    decision.reason = reason.strip() if isinstance(reason, str) else ""
+    return decision, errors
+
+
+def decision_reask_prompt(fields):
+    return (
+        f"답변의 {', '.join(fields)} 값이 올바르지 않습니다. "
+        f"\"판단\"은 {', '.join(ACCOUNT_CHOICES)} 중 하나여야 합니다. "
+        f"{{\"판단\": ..., \"근거\": ...}} 형식의 JSON만 다시 답해 주세요."
+    )
+
+
+def parse_fused(data):
+    """
+    통합 모드 응답을 검증하여 (Receipt, 업종, CategoryDecision, 잘못된 필드 이름 목록)을 반환.
+    업종이 비어 있으면 None이다.
+    """
+    data = data if isinstance(data, dict) else {}
+    receipt, errors = parse_receipt(data)
+    business_category = data.get("업종")
+    if isinstance(business_category, str) and business_category.strip():
+        business_category = business_category.strip()
+    else:
+        business_category = None
+        errors.append("업종")
+    decision, decision_errors = parse_decision(data)
+    return receipt, business_category, decision, errors + decision_errors
+
+
+def fused_reask_prompt(fields):
+    return (
+        f"방금 답변에서 다음 필드의 값이 없거나 형식이 잘못되었습니다: {', '.join(fields)}. "
+        f"영수증을 다시 보고 이 필드만 JSON 객체로 답해 주세요. "
+        f"날짜는 YYYY-MM-DD, 가격과 총액은 숫자만, 항목은 [{{\"이름\": ..., \"가격\": ...}}] 형식이고, "
+        f"\"판단\"은 {', '.join(ACCOUNT_CHOICES)} 중 하나입니다. 설명은 포함하지 마세요."
+    )
@@ -0,0 +1,322 @@
+"""
+외부 서비스(OpenAI, Google 검색, S3, Notion, Slack 파일 다운로드) 호출 정책.
+
+- 서비스별 타임아웃 (clients.py와 다운로드 함수가 POLICIES 값을 사용)
+- 지터를 준 지수 백오프로 제한된 횟수만 재시도 (타임아웃, 연결 오류, 429/5xx만)
+- 서킷 브레이커: 연속 실패가 쌓이면 일정 시간 동안 호출하지 않고 CircuitOpenError로 바로 실패
+- hedged 요청: 느린 OCR 요청에 한해 같은 요청을 하나 더 보내 먼저 끝난 결과 사용
+- 서비스별 통계: service_stats()
+
+사용 예:
+    response = call("openai", lambda: client.chat.completions.create(...))
+    response = hedged_call("openai", lambda: client.chat.completions.create(...), delay=OCR_HEDGE_DELAY)
+"""
+import os, time, random, asyncio, threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import config  # .env는 config에서 한 번만 읽는다
+
+from instrumentation import add, copy_context
+
+
+RETRYABLE_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+_CONNECTION_ERRORS = {
+    "ConnectionError", "APIConnectionError", "ConnectTimeout", "ReadTimeout", "RemoteDisconnected",
+    "ClientConnectorError", "ServerDisconnectedError", "EndpointConnectionError", "ConnectTimeoutError",
+    "ReadTimeoutError", "RequestTimeoutError", "APITimeoutError",
+}
+
+
+class CircuitOpenError(Exception):
+    """
+    서킷이 열려 있어 외부 서비스를 호출하지 않고 바로 실패할 때 발생.
+    """
+    def __init__(self, service, retry_in):
+        super().__init__(f"'{service}' 서비스가 응답하지 않아 호출을 중단했습니다 ({retry_in:.0f}초 후 다시 시도).")
+        self.service = service
+        self.retry_in = retry_in
+
+
+class ServicePolicy:
+    """
+    서비스 하나의 타임아웃/재시도/서킷 브레이커 설정.
+    """
+    def __init__(self, name, timeout, connect_timeout=5.0, max_retries=2, backoff=0.5, max_backoff=8.0,
+                 failure_threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+
+def _env_policy(name, timeout, max_retries):
+    # 환경 변수 예: OPENAI-TIMEOUT, OPENAI-RETRIES, OPENAI-BREAKER-FAILURES, OPENAI-BREAKER-RESET
+    prefix = name.upper()
+    return ServicePolicy(
+        name,
+        timeout=float(os.getenv(f"{prefix}-TIMEOUT", str(timeout))),
+        connect_timeout=float(os.getenv(f"{prefix}-CONNECT-TIMEOUT", "5")),
+        max_retries=int(os.getenv(f"{prefix}-RETRIES", str(max_retries))),
+        failure_threshold=int(os.getenv(f"{prefix}-BREAKER-FAILURES", "5")),
+        reset_timeout=float(os.getenv(f"{prefix}-BREAKER-RESET", "30")),
+    )
+
+
+POLICIES = {
+    "openai": _env_policy("openai", 120.0, max_retries=2),
+    "search": _env_policy("search", 10.0, max_retries=2),
+    "s3": _env_policy("s3", 30.0, max_retries=0),  # botocore standard 모드 재시도를 그대로 사용
+    "notion": _env_policy("notion", 30.0, max_retries=0),  # NotionWriter가 Retry-After를 지키며 재시도
+    "slack": _env_policy("slack", 30.0, max_retries=2),
+}
+# OCR 요청이 이 시간(초) 안에 끝나지 않으면 같은 요청을 하나 더 보낸다. 0이면 사용하지 않음
+OCR_HEDGE_DELAY = float(os.getenv("OCR-HEDGE-DELAY", "0"))
+HEDGE_WORKERS = int(os.getenv("HEDGE-WORKERS", "8"))
+
+
+class CircuitBreaker:
+    """
+    연속 실패가 failure_threshold번 쌓이면 열려(open) reset_timeout 동안 호출을 바로 거절하고,
+    그 뒤 한 번의 시험 호출(half-open)이 성공하면 다시 닫힌다(closed).
+    """
+    def __init__(self, service, failure_threshold, reset_timeout):
+        self.service = service
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.state == "open":
+                remaining = self._opened_at + self.reset_timeout - time.monotonic()
+                if remaining > 0:
+                    raise CircuitOpenError(self.service, remaining)
+                self.state = "half_open"
+                self._trial = False
+            if self.state == "half_open":
+                if self._trial:
+                    raise CircuitOpenError(self.service, 0)  # 시험 호출이 진행 중
+                self._trial = True
+
+    def on_success(self):
+        with self._lock:
+            self.state = "closed"
+            self._failures = 0
+            self._trial = False
+
+    def on_rate_limited(self):
+        """
+        429는 서비스가 살아서 응답한 것이므로 연속 실패로 세지 않는다. 시험 호출이었다면 다음 호출이 다시 시험한다.
+        """
+        with self._lock:
+            self._trial = False
+
+    def on_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == "half_open" or self._failures >= self.failure_threshold:
+                if self.state != "open":
+                    print(f"'{self.service}' 서킷 열림 ({self._failures}회 연속 실패)")
+                self.state = "open"
+                self._opened_at = time.monotonic()
+                self._trial = False
+
+
+class ServiceStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {"calls": 0, "successes": 0, "failures": 0, "retries": 0, "timeouts": 0, "rate_limited": 0,
+                       "short_circuits": 0, "hedged": 0, "hedge_wins": 0}
+        self.seconds = 0.0
+
+    def count(self, name, seconds=None):
+        with self._lock:
+            self.counts[name] += 1
+            if seconds is not None:
+                self.seconds += seconds
+
+    def snapshot(self):
+        with self._lock:
+            snapshot = dict(self.counts)
+            attempts = snapshot["successes"] + snapshot["failures"]
+            snapshot["avg_seconds"] = self.seconds / attempts if attempts else 0.0
+            return snapshot
+
+
+_breakers = {name: CircuitBreaker(name, policy.failure_threshold, policy.reset_timeout) for name, policy in POLICIES.items()}
+_stats = {name: ServiceStats() for name in POLICIES}
+_hedge_executor = None
+_hedge_lock = threading.Lock()
+
+
+def service_stats():
+    """
+    서비스별 호출 통계와 서킷 상태.
+    """
+    return {name: {**_stats[name].snapshot(), "circuit": _breakers[name].state} for name in POLICIES}
+
+
+def is_timeout(error):
+    return isinstance(error, (TimeoutError, asyncio.TimeoutError)) or "Timeout" in type(error).__name__
+
+
+def error_status(error):
+    """
+    여러 라이브러리 예외에서 HTTP 상태 코드를 꺼낸다 (openai, notion_client, googleapiclient, requests, botocore).
+    """
+    for value in (getattr(error, "status_code", None), getattr(error, "status", None)):
+        if isinstance(value, int):
+            return value
+    resp = getattr(error, "resp", None)  # googleapiclient HttpError
+    if resp is not None and getattr(resp, "status", None) is not None:
+        return int(resp.status)
+    response = getattr(error, "response", None)
+    if isinstance(response, dict):  # botocore ClientError
+        return response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+    return getattr(response, "status_code", None)
+
+
+def is_retryable(error):
+    """
+    다시 시도해서 나아질 수 있는 오류인지 (타임아웃, 연결 오류, 429/5xx). 서킷 브레이커는 이 중 429를 뺀 오류만 실패로 센다.
+    """
+    if isinstance(error, CircuitOpenError):
+        return False
+    if is_timeout(error) or isinstance(error, ConnectionError) or type(error).__name__ in _CONNECTION_ERRORS:
+        return True
+    return error_status(error) in RETRYABLE_STATUSES
+
+
+def _backoff(policy, attempt):
+    # full jitter: 0 ~ min(max_backoff, backoff * 2^attempt)
+    return random.uniform(0, min(policy.max_backoff, policy.backoff * (2 ** attempt)))
+
+
+def _before_attempt(service):
+    try:
+        _breakers[service].before_call()
+    except CircuitOpenError:
+        _stats[service].count("short_circuits")
+        raise
+    _stats[service].count("calls")
+
+
+def _after_failure(service, error, seconds, attempt, retries):
+    """
+    실패를 기록하고 재시도할지 반환.
+    """
+    breaker, stats = _breakers[service], _stats[service]
+    stats.count("failures", seconds)
+    if is_timeout(error):
+        stats.count("timeouts")
+    if not is_retryable(error):
+        breaker.on_success()  # 서비스는 응답했다 (잘못된 요청 등)
+        return False
+    if error_status(error) == 429:
+        # 속도 제한에 걸린 것이지 서비스 장애가 아니므로 서킷은 열지 않고 재시도만 한다
+        stats.count("rate_limited")
+        breaker.on_rate_limited()
+    else:
+        breaker.on_failure()
+    if attempt >= retries or breaker.state == "open":
+        return False
+    stats.count("retries")
+    add(retries=1)
+    print(f"{service} 요청 재시도 {attempt + 1}/{retries}: {type(error).__name__}: {error}")
+    return True
+
+
+def call(service, func, retries=None):
+    """
+    서비스 정책에 따라 func()를 호출한다. 재시도할 수 없는 오류나 마지막 시도의 오류는 그대로 발생시킨다.
+    Args:
+        retries (int): 재시도 횟수. None이면 정책 값 (같은 요청을 두 번 보내면 안 되는 호출은 0).
+    Raises:
+        CircuitOpenError: 서킷이 열려 있을 때.
+    """
+    policy = POLICIES[service]
+    retries = policy.max_retries if retries is None else retries
+    attempt = 0
+    while True:
+        _before_attempt(service)
+        started = time.perf_counter()
+        try:
+            result = func()
+        except Exception as e:
+            if not _after_failure(service, e, time.perf_counter() - started, attempt, retries):
+                raise
+            time.sleep(_backoff(policy, attempt))
+            attempt += 1
+            continue
+        _stats[service].count("successes", time.perf_counter() - started)
+        _breakers[service].on_success()
+        return result
+
+
+async def call_async(service, func, retries=None):
+    """
+    call의 비동기 버전. func()는 awaitable을 반환해야 한다.
+    """
+    policy = POLICIES[service]
+    retries = policy.max_retries if retries is None else retries
+    attempt = 0
+    while True:
+        _before_attempt(service)
+        started = time.perf_counter()
+        try:
+            result = await func()
+        except Exception as e:
+            if not _after_failure(service, e, time.perf_counter() - started, attempt, retries):
+                raise
+            await asyncio.sleep(_backoff(policy, attempt))
+            attempt += 1
+            continue
+        _stats[service].count("successes", time.perf_counter() - started)
+        _breakers[service].on_success()
+        return result
+
+
+def _get_hedge_executor():
+    global _hedge_executor
+    if _hedge_executor is None:
+        with _hedge_lock:
+            if _hedge_executor is None:
+                _hedge_executor = ThreadPoolExecutor(max_workers=HEDGE_WORKERS, thread_name_prefix="hedge")
+    return _hedge_executor
+
+
+def hedged_call(service, func, delay=OCR_HEDGE_DELAY):
+    """
+    call(service, func)을 실행하고 delay초 안에 끝나지 않으면 같은 요청을 하나 더 보내 먼저 성공한 결과를 쓴다.
+    꼬리 지연(p95/p99)을 줄이는 대신 느린 요청에 한해 비용이 두 배가 되며, 늦게 끝난 요청의 결과는 버린다.
+    func는 여러 번 호출해도 안전해야 한다 (OCR처럼 부수 효과가 없는 요청).
+    """
+    if delay <= 0:
+        return call(service, func)
+    executor = _get_hedge_executor()
+    first = executor.submit(copy_context().run, call, service, func)
+    done, _ = wait([first], timeout=delay)
+    if done:
+        return first.result()
+    _stats[service].count("hedged")
+    second = executor.submit(copy_context().run, call, service, func)
+    pending, error = {first, second}, None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                result = future.result()
+            except Exception as e:
+                error = e
+                continue
+            if future is second:
+                _stats[service].count("hedge_wins")
+            return result
+    raise error
@@ -0,0 +1,131 @@
+import time, threading
+
+from instrumentation import stage as metrics_stage, copy_context
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+
+class StageError(Exception):
+    """
+    DAG의 단계가 실패했을 때 발생. 실패한 단계 이름과 원래 예외를 담는다.
+    """
+    def __init__(self, stage, error):
+        super().__init__(f"'{stage}' 단계 실패: {error}")
+        self.stage = stage
+        self.error = error
+
+
+class Stage:
+    """
+    DAG의 한 단계.
+    Args:
+        name (str): 단계 이름 (결과도 이 이름으로 저장된다).
+        func: 입력 단계들의 결과를 키워드 인자로 받아 결과를 반환하는 함수.
+        inputs (list): 먼저 끝나야 하는 단계 이름들. func에 같은 이름의 키워드 인자로 전달된다.
+    """
+    def __init__(self, name, func, inputs=()):
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+
+
+class StageScheduler:
+    """
+    단계 간 의존 관계에 따라 실행 가능한 단계를 즉시 스레드 풀에 넣어 동시에 실행하는 작은 DAG 스케줄러.
+    전체 소요 시간이 모든 단계의 합이 아니라 가장 긴 의존 경로(critical path)에 가까워진다.
+    """
+    def __init__(self, stages, max_workers=4):
+        self.stages = {stage.name: stage for stage in stages}
+        self.max_workers = max_workers
+        for stage in stages:
+            for name in stage.inputs:
+                if name not in self.stages:
+                    raise ValueError(f"'{stage.name}' 단계의 입력 '{name}'이 정의되지 않았습니다.")
+        self._check_acyclic()
+
+    def _check_acyclic(self):
+        visiting, done = set(), set()
+
+        def visit(name):
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"단계 의존 관계에 순환이 있습니다: {name}")
+            visiting.add(name)
+            for dependency in self.stages[name].inputs:
+                visit(dependency)
+            visiting.discard(name)
+            done.add(name)
+
+        for name in self.stages:
+            visit(name)
+
+    def run(self, initial=None):
+        """
+        모든 단계를 실행하고 (결과 dict, 단계별 타이밍 dict)를 반환.
+        initial로 넘긴 값은 이미 끝난 단계의 결과로 취급한다.
+        Raises:
+            StageError: 어떤 단계든 실패하면 (이미 실행 중인 단계는 끝까지 기다린 뒤) 발생.
+        """
+        results = dict(initial or {})
+        timings = {}
+        lock = threading.Lock()
+        origin = time.perf_counter()
+        pending = {name: stage for name, stage in self.stages.items() if name not in results}
+        running = {}
+        failure = None
+
+        def execute(stage, kwargs):
+            started = time.perf_counter()
+            try:
+                with metrics_stage(stage.name):
+                    return stage.func(**kwargs)
+            finally:
+                finished = time.perf_counter()
+                with lock:
+                    timings[stage.name] = {
+                        "start": started - origin,
+                        "end": finished - origin,
+                        "seconds": finished - started,
+                    }
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or running:
+                if failure is None:
+                    ready = [stage for stage in pending.values() if all(name in results for name in stage.inputs)]
+                    for stage in ready:
+                        del pending[stage.name]
+                        kwargs = {name: results[name] for name in stage.inputs}
+                        # receipt_id 등 계측 컨텍스트를 워커 스레드로 넘긴다
+                        running[executor.submit(copy_context().run, execute, stage, kwargs)] = stage.name
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        results[name] = future.result()
+                    except Exception as e:
+                        if failure is None:
+                            failure = StageError(name, e)
+        if failure is not None:
+            failure.timings = timings
+            raise failure
+        return results, timings
+
+    def critical_path(self, timings):
+        """
+        실제 타이밍 기준으로 가장 늦게 끝난 단계까지 이어지는 의존 경로와 그 길이(초)를 반환.
+        """
+        def path_to(name):
+            stage = self.stages[name]
+            timed_inputs = [dependency for dependency in stage.inputs if dependency in timings]
+            if not timed_inputs:
+                return [name]
+            latest = max(timed_inputs, key=lambda dependency: timings[dependency]["end"])
+            return path_to(latest) + [name]
+
+        if not timings:
+            return [], 0.0
+        last = max(timings, key=lambda name: timings[name]["end"])
+        path = path_to(last)
+        return path, sum(timings[name]["seconds"] for name in path)
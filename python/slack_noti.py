@@ -1,35 +1,47 @@
-import os, requests
-import logging
-from openai import OpenAI
-from pathlib import Path
-from dotenv import load_dotenv
+import os, sys, time, logging, threading
+import config  # .env는 config에서 한 번만 읽는다
 
 from slack_bolt import App
 from slack_bolt.adapter.socket_mode import SocketModeHandler
 
-from langchain.tools import Tool
-from langchain.chains import SequentialChain, LLMChain
-from langchain.chains.base import Chain
-from langchain.chat_models import ChatOpenAI
-from langchain.prompts import PromptTemplate
-
-from utils import search_with_google_api, add_receipt_to_notion, upload_to_s3, download_file
-from chains import OCRChain, SearchChain, CategoryAssistantChain
-from prompts import assistant_prompt, analysis_prompt
+from utils import download_to_buffer
+from object_store import store_receipt
+from notion_sink import get_notion_writer, receipt_hash
+from scheduler import Stage, StageScheduler, StageError
+from assistant import run_wait_stats
+from ocr_cache import get_ocr_cache
+from merchant_cache import get_merchant_cache
+from worker import ReceiptWorkerPool, QueueFullError
+from instrumentation import receipt_scope
+from resilience import service_stats
+from dedup_store import get_dedup_store
+from receipt_schema import ReceiptValidationError
 
 # 로깅 설정
 logging.basicConfig(level=logging.INFO)
-current_path = Path.cwd()
 
 # App-Level Token 및 Bot Token 설정
-load_dotenv('../.env')
 SLACK_BOT_TOKEN = os.getenv("SLACK-BOT")
 CHANNEL_ID = 'C086KU2133M' # Channel ID
 SLACK_APP_TOKEN = os.getenv("SLACK-APP")
 OPEN_AI_KEY = os.getenv("OPEN-AI")
+RECEIPT_WORKERS = int(os.getenv("RECEIPT-WORKERS", "4"))
+RECEIPT_QUEUE_SIZE = int(os.getenv("RECEIPT-QUEUE-SIZE", "100"))
+NOTION_WAIT_TIMEOUT = 120  # Notion 저장 완료를 기다리는 최대 시간(초)
+# 1이면 워커 스레드 대신 이벤트 루프 하나에서 영수증 여러 건을 동시에 처리 (async_pipeline)
+RECEIPT_ASYNC = os.getenv("RECEIPT-ASYNC", "0") != "0"
+# 0이면 앱 생성 시 auth.test로 토큰을 확인하지 않는다 (import 시간 측정 등 오프라인 실행용)
+SLACK_TOKEN_VERIFY = os.getenv("SLACK-TOKEN-VERIFY", "1") != "0"
+
+# 영수증 처리 워커 풀 (리스너는 작업을 넣고 바로 ack 한다)
+worker_pool = ReceiptWorkerPool(num_workers=RECEIPT_WORKERS, max_queue_size=RECEIPT_QUEUE_SIZE)
+async_runner = None
+if RECEIPT_ASYNC:
+    from async_pipeline import AsyncReceiptRunner
+    async_runner = AsyncReceiptRunner(max_pending=RECEIPT_QUEUE_SIZE)
 
 # Slack 앱을 초기화합니다
-app = App(token=SLACK_BOT_TOKEN)
+app = App(token=SLACK_BOT_TOKEN, token_verification_enabled=SLACK_TOKEN_VERIFY)
 
 # 모든 이벤트를 로깅하는 미들웨어
 @app.middleware
@@ -37,73 +49,168 @@ def log_request(logger, body, next):
     logger.info(f"이벤트 수신: {body['event']['type']}")
     next()
         
+def dedup_keys(body, event):
+    # Slack 재전송은 event_id가 같고, 같은 파일을 여러 곳에 공유하면 file_id가 같다
+    keys = [f"event:{body['event_id']}"] if body.get("event_id") else []
+    if event.get("file_id"):
+        keys.append(f"file:{event['file_id']}")
+    return keys
+
+
 # 파일이 공유될 때 실행되는 이벤트 리스너
 @app.event("file_shared")
-def handle_file_shared(event, say, logger, client):
-    # 이미지 파일인지 확인합니다
+def handle_file_shared(event, body, say, logger, client):
+    # 리스너에서는 작업을 대기열에 넣기만 하고 실제 처리는 워커 풀에서 진행합니다
     file_id = event["file_id"]
+    keys = dedup_keys(body, event)
+    # 이미 받은 이벤트/파일이면 다운로드, OCR, 업로드, Notion 저장을 모두 건너뜁니다
+    if not get_dedup_store().claim(*keys):
+        logger.info(f"중복 이벤트를 건너뜁니다. 파일 ID: {file_id}")
+        return
     logger.info(f"새로운 이미지가 공유되었습니다. 파일 ID: {file_id}")
+    try:
+        if async_runner is not None:
+            async_runner.submit(process_shared_file_async, file_id, say, logger, client)
+        else:
+            worker_pool.submit(process_shared_file, file_id, say, logger, client, notify=say)
+    except QueueFullError as e:
+        # 다시 올리면 처리할 수 있도록 파일 등록을 취소
+        get_dedup_store().release(f"file:{file_id}")
+        logger.warning(f"영수증 작업 등록 실패: {e}")
+        say(f"처리 대기 중인 영수증이 너무 많습니다. 잠시 후 다시 올려 주세요. ({e})")
+
+
+def receipt_error_message(error):
+    """
+    영수증을 읽지 못했을 때(ReceiptValidationError) 사용자에게 보낼 안내. 다른 오류이면 None.
+    """
+    if isinstance(error, ReceiptValidationError):
+        return f"영수증에서 {', '.join(error.fields)}을(를) 읽지 못했습니다. 글자가 잘 보이도록 다시 찍어 올려 주세요."
+    return None
+
+
+def process_shared_file(file_id, say, logger, client):
+    # 어느 단계에서 실패하든 (파일 정보 조회, 체인 준비, Notion 저장 시간 초과 포함) 같은 파일을 다시 공유하면
+    # 처음부터 처리할 수 있도록 파일 등록을 취소한다 (event_id는 그대로 둔다)
+    try:
+        run_shared_file(file_id, say, logger, client)
+    except StageError as e:
+        logger.error(f"영수증 처리 중 오류 발생: {e}")
+        get_dedup_store().release(f"file:{file_id}")
+        if e.stage == "download":
+            say(f"파일 다운로드에 실패했습니다.")
+        elif receipt_error_message(e.error):
+            say(receipt_error_message(e.error))
+        else:
+            say(f"영수증 처리 중 오류가 발생했습니다 ({e.stage}): {e.error}")
+    except Exception:
+        # 실패 메시지는 워커 풀이 보낸다
+        get_dedup_store().release(f"file:{file_id}")
+        raise
+
+
+async def process_shared_file_async(file_id, say, logger, client):
+    """
+    process_shared_file의 비동기 버전 (RECEIPT-ASYNC=1). Slack API 호출은 동기 클라이언트이므로 전용 스레드 풀에서 보낸다.
+    """
+    from async_pipeline import process_receipt_async
+    from async_utils import run_blocking
+    try:
+        file_info = await run_blocking(lambda: client.files_info(file=file_id))
+        file = file_info["file"]
+        with receipt_scope(file_id):
+            result = await process_receipt_async(file["url_private_download"], file["name"], SLACK_BOT_TOKEN)
+    except Exception as e:
+        logger.error(f"영수증 처리 중 오류 발생: {e}")
+        get_dedup_store().release(f"file:{file_id}")
+        await run_blocking(say, receipt_error_message(e) or f"영수증 처리 중 오류가 발생했습니다: {e}")
+        return
+    logger.info(f"외부 서비스 지표: {service_stats()}")
+    await run_blocking(say, "데이터가 성공적으로 Notion에 저장되었습니다.")
+    await run_blocking(say, result['assistant_response'])
+
+
+def run_shared_file(file_id, say, logger, client):
+    # 체인(langchain, 지침 인덱스 등)은 봇 시작 후 백그라운드에서 불러 두므로 보통은 이미 로드되어 있다
+    from pipeline import receipt_stages
+    from receipt_knn import get_receipt_knn, KNN_ENABLED
     # 파일 정보를 가져옵니다
     file_info = client.files_info(file=file_id)
     file = file_info["file"]
     file_url = file["url_private_download"]
-    image_path = current_path / '../image' / file["name"]
-    if download_file(file_url, image_path, SLACK_BOT_TOKEN):
-        say(f"파일 '{image_path}'을 성공적으로 다운로드했습니다.")
-        print(f"파일 '{image_path}'을 성공적으로 다운로드했습니다.")
-        #####################################
-        # langchain으로 정보 처리
-        # OCRChain 초기화
-        ocr_chain = OCRChain()
-        # SearchChain 초기화
-        # Tool로 검색 기능 정의
-        search_tool = Tool(
-            name = "SearchBusinessCategory",
-            func = lambda query: "\n".join(
-                list([x['snippet'] for x in search_with_google_api(query)])
-            ),
-            description="상호명을 검색하여 관련 업종 정보를 제공합니다."
-        )
-        search_chain = SearchChain(search_tool)
-        # Analysis Chain (검색결과로부터 업종 판단) 초기화
-        analysis_chain = LLMChain(
-            llm = ChatOpenAI(
-                model="gpt-4", 
-                temperature=0,
-                openai_api_key = OPEN_AI_KEY
-            ),
-            prompt=analysis_prompt,
-            output_key="business_category",  # 출력 키를 명시적으로 설정
-        )
-        # Assistant Chain 초기화
-        assistant_chain = CategoryAssistantChain(prompt=assistant_prompt)
-        sequential_chain = SequentialChain(
-            chains=[ocr_chain, search_chain, analysis_chain, assistant_chain],
-            input_variables=["image_path"],
-            output_variables=["assistant_response", "business_category", "ocr_response"],
-            verbose=True
+    downloaded = []
+
+    def download():
+        # 디스크에 저장하지 않고 메모리로 내려받음 (큰 파일만 임시 파일로)
+        receipt_file = download_to_buffer(file_url, file["name"], SLACK_BOT_TOKEN)
+        if receipt_file is None:
+            raise RuntimeError("파일 다운로드에 실패했습니다.")
+        downloaded.append(receipt_file)
+        say(f"파일 '{receipt_file.name}'을 성공적으로 다운로드했습니다.")
+        print(f"파일 '{receipt_file.name}'을 성공적으로 다운로드했습니다. ({receipt_file.size:,} bytes)")
+        return receipt_file
+
+    def upload(download):
+        # S3 업로드는 다운로드만 끝나면 되므로 OCR/분류와 동시에 진행
+        # 내용 해시로 저장하므로 이미 올린 영수증은 다시 전송하지 않는다
+        return store_receipt(download, download.name)
+
+    def notion(download, assistant, upload):
+        # Notion DB에 정보 추가 (속도 제한/재시도/중복 방지를 하는 공유 writer를 통해 저장)
+        ticket = get_notion_writer().write(
+            assistant['ocr_response'], upload, assistant['business_category'], assistant['assistant_response'],
+            key=receipt_hash(None, download.getvalue()),
         )
+        # 시간 안에 끝나지 않은 저장(queued)도 실패로 본다 (성공 메시지는 created/duplicate일 때만)
+        status = ticket.wait(timeout=NOTION_WAIT_TIMEOUT)
+        if status == "failed":
+            raise RuntimeError(f"Notion 저장 실패: {ticket.error}")
+        if status not in ("created", "duplicate"):
+            raise RuntimeError(f"Notion 저장이 {NOTION_WAIT_TIMEOUT}초 안에 끝나지 않았습니다.")
 
-        # 실행
-        result = sequential_chain.invoke({"image_path": image_path})
-        logger.info("\n최종 결과:")
-        logger.info(result['assistant_response'])
-        #####################################
-        # Notion DB에 정보 추가
-        try:
-            s3_file_url = upload_to_s3(image_path, image_path.name)
-            add_receipt_to_notion(result['ocr_response'], s3_file_url, result['business_category'], result['assistant_response'])
-            say(f"데이터가 성공적으로 Notion에 저장되었습니다.")
-            say(result['assistant_response'])
-        except Exception as e:
-            logger.error(f"Notion에 데이터를 추가하는 중 오류 발생: {e}")
-    else:
-        say(f"파일 다운로드에 실패했습니다.")
+    #####################################
+    # langchain으로 정보 처리 (프로세스 시작 시 한 번 만들어 둔 체인을 단계별로 실행)
+    scheduler = StageScheduler([
+        Stage("download", download),
+        Stage("upload", upload, ["download"]),
+        *receipt_stages(source="download"),
+        Stage("notion", notion, ["download", "assistant", "upload"]),
+    ])
+    try:
+        # 단계별 계측 기록에 파일 ID를 붙인다
+        with receipt_scope(file_id):
+            results, timings = scheduler.run()
+    finally:
+        for receipt_file in downloaded:
+            receipt_file.close()
+    result = results["assistant"]
+    logger.info("\n최종 결과:")
+    logger.info(result['assistant_response'])
+    path, critical_seconds = scheduler.critical_path(timings)
+    logger.info(f"단계별 소요 시간: { {name: round(t['seconds'], 2) for name, t in timings.items()} }")
+    logger.info(f"critical path: {' → '.join(path)} ({critical_seconds:.2f}초)")
+    logger.info(f"Assistant run 대기 지표: {run_wait_stats.snapshot()}")
+    logger.info(f"OCR 캐시 지표: {get_ocr_cache().stats()}")
+    logger.info(f"업종 캐시 지표: {get_merchant_cache().stats()}")
+    if KNN_ENABLED:
+        logger.info(f"k-NN 분류 지표: {get_receipt_knn().stats()}")
+    logger.info(f"외부 서비스 지표: {service_stats()}")
+    logger.info(f"이벤트 중복 제거 지표: {get_dedup_store().stats()}")
+    say(f"데이터가 성공적으로 Notion에 저장되었습니다.")
+    say(result['assistant_response'])
         
 
+def is_bot_event(event, context):
+    # 봇(자기 자신 포함)이 보낸 메시지와 수정/삭제/파일 공유 같은 subtype 메시지
+    return bool(event.get("bot_id") or event.get("subtype")) or event.get("user") in (None, context.get("bot_user_id"))
+
+
 # message에 대한 처리는 필요 없음
 @app.event("message")
-def handle_message_events(event, logger, say):
+def handle_message_events(event, body, context, logger, say):
+    # 봇 메시지에 답하면 그 답이 다시 이벤트로 돌아오므로 사람이 보낸 새 메시지에만 답합니다
+    if is_bot_event(event, context) or not get_dedup_store().claim(*dedup_keys(body, event)):
+        return
     # 메시지 텍스트 추출
     message_text = event["text"]
     # 메시지 발신자 ID 추출
@@ -138,10 +245,41 @@ def custom_error_handler(error, body, logger):
    
     
     
+def warm_up_in_background():
+    """
+    무거운 의존성(langchain, faiss 등)을 불러오고 체인을 만드는 일은 별도 스레드에서 하고,
+    Slack 연결은 바로 시작한다. 준비가 끝나기 전에 들어온 영수증은 체인 생성이 끝날 때까지 기다린다.
+    """
+    def run():
+        started = time.perf_counter()
+        from pipeline import warm_up
+        from object_store import get_object_store
+        warm_up()
+        get_object_store()  # boto3
+        print(f"체인 준비 완료 ({time.perf_counter() - started:.1f}초)")
+    threading.Thread(target=run, name="warm-up", daemon=True).start()
+
+
 # 메인 함수
 if __name__ == "__main__":
     print("Slack 앱을 시작합니다")
     print(f"App Token: {SLACK_APP_TOKEN}")
     print(f'Bot Token: {SLACK_BOT_TOKEN}')
+    get_dedup_store()  # 재시작 전에 받은 이벤트/파일 ID를 먼저 불러온다
+    warm_up_in_background()
+    worker_pool.start()
+    if async_runner is not None:
+        async_runner.start()
     handler = SocketModeHandler(app, SLACK_APP_TOKEN)
-    handler.start()
\ No newline at end of file
+    try:
+        handler.start()
+    finally:
+        # 종료 시 대기 중인 영수증을 모두 처리한 뒤 끝냅니다
+        handler.close()
+        worker_pool.shutdown(drain=True)
+        if async_runner is not None:
+            async_runner.shutdown(drain=True)
+        if "chains" in sys.modules:
+            sys.modules["chains"].thread_pool.close()  # Assistant Thread를 만든 경우에만
+        get_notion_writer().close()
+        get_dedup_store().flush()
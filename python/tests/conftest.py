@@ -0,0 +1,8 @@
+"""
+python/ 아래 모듈은 패키지가 아니라 평평한 모듈이므로 tests/의 상위 폴더를 import 경로에 넣는다.
+테스트 중 계측 기록이 운영 파일(../cache/metrics.jsonl)에 쌓이지 않도록 모듈을 불러오기 전에 끈다.
+"""
+import os, sys
+
+os.environ["METRICS-PATH"] = ""
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,196 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import assistant
+from assistant import (
+    AssistantThreadPool, RunFailedError, RunWaitStats, get_run_reply, get_run_reply_async, wait_for_run, wait_for_run_async,
+)
+
+
+def make_run(status, run_id="run_1", last_error=None):
+    return SimpleNamespace(id=run_id, status=status, last_error=last_error)
+
+
+def text_message(role, text, run_id="run_1"):
+    content = SimpleNamespace(type="text", text=SimpleNamespace(value=text))
+    return SimpleNamespace(role=role, content=[content], run_id=run_id)
+
+
+class FakeRuns:
+    def __init__(self, statuses):
+        self.statuses = list(statuses)
+        self.retrieved = 0
+        self.cancelled = []
+
+    def retrieve(self, thread_id, run_id):
+        self.retrieved += 1
+        return make_run(self.statuses.pop(0), run_id)
+
+    def cancel(self, thread_id, run_id):
+        self.cancelled.append(run_id)
+
+
+class FakeMessages:
+    def __init__(self, messages):
+        self.messages = messages
+        self.calls = []
+
+    def list(self, thread_id, run_id, order):
+        self.calls.append({"thread_id": thread_id, "run_id": run_id, "order": order})
+        return SimpleNamespace(data=[message for message in self.messages if message.run_id == run_id])
+
+
+def make_client(statuses=(), messages=()):
+    threads = SimpleNamespace(runs=FakeRuns(statuses), messages=FakeMessages(list(messages)))
+    return SimpleNamespace(beta=SimpleNamespace(threads=threads))
+
+
+class AsyncWrapper:
+    """
+    동기 가짜 객체의 메서드를 코루틴으로 바꿔 AsyncOpenAI처럼 쓰게 한다.
+    """
+    def __init__(self, target):
+        self._target = target
+
+    def __getattr__(self, name):
+        value = getattr(self._target, name)
+        if callable(value):
+            async def method(*args, **kwargs):
+                return value(*args, **kwargs)
+            return method
+        return AsyncWrapper(value)
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    delays = []
+    monkeypatch.setattr(assistant.time, "sleep", delays.append)
+
+    async def fake_sleep(seconds):
+        delays.append(seconds)
+
+    monkeypatch.setattr(assistant.asyncio, "sleep", fake_sleep)
+    return delays
+
+
+def test_backoff_schedule_grows_to_max_delay(sleeps):
+    client = make_client(["queued"] + ["in_progress"] * 6 + ["completed"])
+    stats = RunWaitStats()
+    run = wait_for_run(client, "thread_1", make_run("queued"), jitter=0, stats=stats)
+    assert run.status == "completed"
+    assert sleeps == pytest.approx([0.5, 0.8, 1.28, 2.048, 3.2768, 5.0, 5.0, 5.0])
+    assert stats.snapshot()["polls"] == 8
+    assert stats.snapshot()["failures"] == 0
+
+
+def test_completed_run_is_returned_without_polling(sleeps):
+    client = make_client()
+    run = wait_for_run(client, "thread_1", make_run("completed"), stats=None)
+    assert run.status == "completed"
+    assert sleeps == []
+    assert client.beta.threads.runs.retrieved == 0
+
+
+@pytest.mark.parametrize("status", ["failed", "cancelled", "expired", "incomplete"])
+def test_terminal_failure_raises(sleeps, status):
+    client = make_client(["in_progress", status])
+    stats = RunWaitStats()
+    with pytest.raises(RunFailedError) as excinfo:
+        wait_for_run(client, "thread_1", make_run("queued"), jitter=0, stats=stats)
+    assert excinfo.value.run.status == status
+    assert stats.snapshot()["failures"] == 1
+
+
+def test_requires_action_cancels_run(sleeps):
+    client = make_client(["requires_action"])
+    with pytest.raises(RunFailedError, match="requires_action"):
+        wait_for_run(client, "thread_1", make_run("queued"), jitter=0, stats=None)
+    assert client.beta.threads.runs.cancelled == ["run_1"]
+
+
+def test_timeout_cancels_run(sleeps):
+    client = make_client()
+    with pytest.raises(RunFailedError, match="끝나지 않았습니다"):
+        wait_for_run(client, "thread_1", make_run("in_progress"), timeout=0, stats=None)
+    assert client.beta.threads.runs.cancelled == ["run_1"]
+
+
+def test_async_wait_matches_sync_schedule(sleeps):
+    client = AsyncWrapper(make_client(["in_progress", "in_progress", "completed"]))
+    run = asyncio.run(wait_for_run_async(client, "thread_1", make_run("queued"), jitter=0, stats=None))
+    assert run.status == "completed"
+    assert sleeps == pytest.approx([0.5, 0.8, 1.28])
+
+
+def test_async_requires_action_cancels_run(sleeps):
+    fake = make_client(["requires_action"])
+    with pytest.raises(RunFailedError):
+        asyncio.run(wait_for_run_async(AsyncWrapper(fake), "thread_1", make_run("queued"), stats=None))
+    assert fake.beta.threads.runs.cancelled == ["run_1"]
+
+
+def test_reply_only_includes_assistant_messages_of_the_run():
+    client = make_client(messages=[
+        text_message("user", "질문"),
+        text_message("assistant", '{"판단": "식비",'),
+        text_message("assistant", '"근거": "식당"}'),
+        text_message("assistant", "이전 답변", run_id="run_0"),
+    ])
+    assert get_run_reply(client, "thread_1", "run_1") == '{"판단": "식비",\n"근거": "식당"}'
+    assert client.beta.threads.messages.calls == [{"thread_id": "thread_1", "run_id": "run_1", "order": "asc"}]
+    assert asyncio.run(get_run_reply_async(AsyncWrapper(client), "thread_1", "run_0")) == "이전 답변"
+
+
+class FakeThreads:
+    def __init__(self):
+        self.created = 0
+        self.deleted = []
+
+    def create(self):
+        self.created += 1
+        return SimpleNamespace(id=f"thread_{self.created}")
+
+    def delete(self, thread_id):
+        self.deleted.append(thread_id)
+
+
+def make_pool(**kwargs):
+    threads = FakeThreads()
+    client = SimpleNamespace(beta=SimpleNamespace(threads=threads))
+    return AssistantThreadPool(lambda: client, **kwargs), threads
+
+
+def test_lease_reuses_released_thread_and_counts_runs():
+    pool, threads = make_pool(max_runs_per_thread=3)
+    with pool.lease() as lease:
+        lease.record_run()
+        first = lease.thread_id
+    with pool.lease() as lease:
+        # 다시 묻기까지 한 영수증에서 Run 두 번
+        lease.record_run()
+        lease.record_run()
+        assert lease.thread_id == first
+    assert pool.stats == {"created": 1, "reused": 1, "retired": 1}
+    # 사용 횟수(3)를 채운 Thread는 반납 대신 삭제된다
+    assert threads.deleted == [first]
+
+
+def test_lease_retires_thread_after_failure():
+    pool, threads = make_pool()
+    with pytest.raises(RuntimeError):
+        with pool.lease() as lease:
+            lease.record_run()
+            raise RuntimeError("run failed")
+    assert threads.deleted == ["thread_1"]
+    with pool.lease() as lease:
+        assert lease.thread_id == "thread_2"
+
+
+def test_concurrent_leases_get_different_threads():
+    pool, _ = make_pool()
+    with pool.lease() as first, pool.lease() as second:
+        assert first.thread_id != second.thread_id
+    pool.close()
+    assert pool.stats["retired"] == 2
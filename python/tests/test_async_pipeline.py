@@ -0,0 +1,189 @@
+import io
+import json
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+from PIL import Image
+
+import async_utils
+import async_pipeline
+import clients
+from async_pipeline import AsyncReceiptRunner
+from notion_sink import NotionWriteTicket
+from receipt_schema import ReceiptValidationError
+from utils import ReceiptFile
+from worker import QueueFullError
+
+RECEIPT = {"상호명": "복성각", "날짜": "2024-03-05", "항목": [{"이름": "짜장면", "가격": 9000}], "총액": 9000}
+
+
+class FakeAsyncCompletions:
+    """응답마다 delay초 걸리는 AsyncOpenAI chat.completions. 동시에 기다린 요청 수의 최댓값을 기록한다."""
+    def __init__(self, replies, delay=0.05):
+        self.replies = list(replies)
+        self.delay = delay
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def create(self, **kwargs):
+        self.calls.append(kwargs)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        content = self.replies.pop(0) if len(self.replies) > 1 else self.replies[0]
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=None)
+
+
+@pytest.fixture
+def completions(monkeypatch):
+    fake = FakeAsyncCompletions([json.dumps(RECEIPT, ensure_ascii=False)])
+    clients.override_client("async_openai", SimpleNamespace(chat=SimpleNamespace(completions=fake)))
+    yield fake
+    clients.reset_clients()
+
+
+def jpeg_receipt(name="receipt.jpg"):
+    buffered = io.BytesIO()
+    Image.new("RGB", (60, 80), (240, 240, 240)).save(buffered, format="JPEG")
+    return ReceiptFile(name, data=buffered.getvalue())
+
+
+def test_ocr_requests_are_not_capped_by_a_thread_pool(completions):
+    async def run():
+        return await asyncio.gather(*(async_utils.request_receipt_ocr_async("aGVsbG8=") for _ in range(64)))
+
+    results = asyncio.run(run())
+    assert results == [RECEIPT] * 64
+    assert completions.max_in_flight == 64
+
+
+def test_ocr_file_uses_the_async_client(completions):
+    result = asyncio.run(async_utils.ocr_receipt_file_async(jpeg_receipt(), use_cache=False))
+    assert result == RECEIPT
+    assert len(completions.calls) == 1
+    image_url = completions.calls[0]["messages"][1]["content"][1]["image_url"]["url"]
+    assert image_url.startswith("data:image/jpeg;base64,")
+
+
+def test_invalid_fields_are_asked_again(completions):
+    completions.replies = [json.dumps({**RECEIPT, "날짜": "어제"}, ensure_ascii=False), json.dumps({"날짜": "2024-03-05"})]
+    assert asyncio.run(async_utils.request_receipt_ocr_async("aGVsbG8=")) == RECEIPT
+    assert len(completions.calls) == 2
+
+
+def test_fields_still_invalid_after_reask_raise(completions):
+    completions.replies = [json.dumps({**RECEIPT, "날짜": "어제"}, ensure_ascii=False), json.dumps({"날짜": "모름"})]
+    with pytest.raises(ReceiptValidationError) as raised:
+        asyncio.run(async_utils.request_receipt_ocr_async("aGVsbG8="))
+    assert raised.value.fields == ["날짜"]
+
+
+class FakeContent:
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    async def iter_chunked(self, size):
+        for chunk in self.chunks:
+            yield chunk
+
+
+class FakeResponse:
+    def __init__(self, status, chunks):
+        self.status = status
+        self.content = FakeContent(chunks)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeSession:
+    def __init__(self, status, chunks):
+        self.response = FakeResponse(status, chunks)
+        self.requests = []
+
+    def get(self, url, headers=None, timeout=None):
+        self.requests.append((url, headers))
+        return self.response
+
+
+def test_download_stays_in_memory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    session = FakeSession(200, [b"%PDF-1.4 ", b"body"])
+    receipt_file = asyncio.run(async_utils.download_file_async(session, "https://files/1", "a.pdf", "xoxb"))
+    assert receipt_file.data == b"%PDF-1.4 body"
+    assert receipt_file.path is None and receipt_file.is_pdf
+    assert session.requests == [("https://files/1", {"Authorization": "Bearer xoxb"})]
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_large_download_spills_to_a_temporary_file():
+    session = FakeSession(200, [b"a" * 10, b"b" * 10])
+    receipt_file = asyncio.run(async_utils.download_file_async(session, "u", "a.jpg", "t", spill_threshold=15))
+    try:
+        assert receipt_file.data is None
+        assert receipt_file.getvalue() == b"a" * 10 + b"b" * 10
+    finally:
+        receipt_file.close()
+
+
+def test_failed_download_returns_none():
+    assert asyncio.run(async_utils.download_file_async(FakeSession(404, []), "u", "a.jpg", "t")) is None
+
+
+def test_notion_wait_does_not_hold_a_thread():
+    ticket = NotionWriteTicket({}, "key")
+    threading.Timer(0.05, ticket.finish, args=("created", "page_1")).start()
+    assert asyncio.run(async_utils.wait_ticket_async(ticket, timeout=5)) == "created"
+
+
+def test_notion_wait_times_out_with_queued_status():
+    assert asyncio.run(async_utils.wait_ticket_async(NotionWriteTicket({}, "key"), timeout=0.05)) == "queued"
+
+
+def test_slack_receipt_is_downloaded_and_processed_in_memory(monkeypatch):
+    seen = []
+
+    async def process(receipt_file):
+        seen.append(receipt_file)
+        return {"assistant_response": "회의비"}
+
+    async def session():
+        return FakeSession(200, [b"jpeg"])
+
+    monkeypatch.setattr(async_pipeline, "get_http_session", session)
+    monkeypatch.setattr(async_pipeline, "process_local_receipt_async", process)
+    assert asyncio.run(async_pipeline.process_receipt_async("u", "a.jpg", "t")) == {"assistant_response": "회의비"}
+    assert seen[0].data == b"jpeg"
+
+
+def test_runner_limits_in_flight_and_rejects_when_full():
+    runner = AsyncReceiptRunner(max_in_flight=2, max_pending=3).start()
+    release = threading.Event()
+    running = []
+
+    async def job(index):
+        running.append(index)
+        while not release.is_set():
+            await asyncio.sleep(0.01)
+        return index
+
+    futures = [runner.submit(job, index) for index in range(3)]
+    with pytest.raises(QueueFullError):
+        runner.submit(job, 3)
+    asyncio.run(asyncio.sleep(0.1))
+    assert sorted(running) == [0, 1]
+    release.set()
+    assert [future.result(timeout=5) for future in futures] == [0, 1, 2]
+    runner.shutdown(drain=True, timeout=5)
+    assert runner.stats == {"submitted": 3, "rejected": 1, "succeeded": 3, "failed": 0}
+    with pytest.raises(RuntimeError):
+        runner.submit(job, 4)
@@ -0,0 +1,86 @@
+import json
+
+import pytest
+
+pytest.importorskip("langchain.chains")
+pq = pytest.importorskip("pyarrow.parquet")
+
+import batch
+from batch import Checkpoint, JsonlSink, ParquetSink
+
+
+def result(name):
+    return {
+        "ocr_response": {"상호명": name, "날짜": "2024-03-05", "총액": 9000, "항목": []},
+        "business_category": "음식점",
+        "assistant_response": "회의비",
+    }
+
+
+def test_parquet_rows_are_reported_only_after_their_part_is_written(tmp_path, monkeypatch):
+    monkeypatch.setattr(ParquetSink, "row_group_size", 2)
+    path = str(tmp_path / "results.parquet")
+    sink = ParquetSink(path)
+    assert sink.write("a", None, result("a")) == []
+    assert sink.write("b", None, result("b")) == ["a", "b"]
+    assert sink.write("c", None, result("c")) == []
+    assert pq.read_table(path).column("id").to_pylist() == ["a", "b"]
+    assert sink.close() == ["c"]
+    assert sorted(pq.read_table(path).column("id").to_pylist()) == ["a", "b", "c"]
+    assert sink.close() == []
+
+
+def test_parquet_resume_appends_new_parts(tmp_path):
+    path = str(tmp_path / "results.parquet")
+    first = ParquetSink(path)
+    first.write("a", None, result("a"))
+    first.close()
+    second = ParquetSink(path)
+    second.write("b", None, result("b"))
+    second.close()
+    assert sorted(pq.read_table(path).column("id").to_pylist()) == ["a", "b"]
+
+
+def test_parquet_refuses_an_existing_single_file(tmp_path):
+    path = tmp_path / "results.parquet"
+    path.write_bytes(b"PAR1")
+    with pytest.raises(ValueError):
+        ParquetSink(str(path))
+
+
+def test_jsonl_rows_are_written_before_they_are_reported(tmp_path):
+    path = tmp_path / "results.jsonl"
+    sink = JsonlSink(str(path))
+    assert sink.write("a", None, result("a")) == ["a"]
+    assert json.loads(path.read_text(encoding="utf-8"))["id"] == "a"
+    assert sink.close() == []
+
+
+def test_checkpoint_marks_only_written_ids(tmp_path, monkeypatch):
+    """버퍼에 남아 있다 죽으면 체크포인트에 남지 않아 다음 실행에서 다시 처리된다."""
+    (tmp_path / "image").mkdir()
+    for name in ("a.jpg", "b.jpg", "c.jpg"):
+        (tmp_path / "image" / name).write_bytes(b"jpeg")
+    monkeypatch.setattr(ParquetSink, "row_group_size", 2)
+    monkeypatch.setattr(batch, "warm_up", lambda: None)
+    monkeypatch.setattr(batch, "KNN_ENABLED", False)
+    monkeypatch.setattr(batch, "run_receipt_chain", lambda inputs, timings: result(inputs["image_path"].name))
+    closed = []
+    monkeypatch.setattr(ParquetSink, "close", lambda self: closed.append(self._rows) or [])
+
+    checkpoint = tmp_path / "checkpoint.jsonl"
+    argv = [str(tmp_path / "image"), "--output", str(tmp_path / "out.parquet"),
+            "--checkpoint", str(checkpoint), "--concurrency", "1"]
+    assert batch.main(argv) == 0
+    assert len(Checkpoint(str(checkpoint)).done) == 2
+    assert len(closed[0]) == 1  # close에서 저장하지 못한 한 건은 기록되지 않는다
+
+
+def test_parquet_output_without_pyarrow_fails_before_processing(tmp_path, monkeypatch):
+    def missing(path):
+        raise ImportError("No module named 'pyarrow'")
+
+    monkeypatch.setattr(batch, "ParquetSink", missing)
+    monkeypatch.setattr(batch, "warm_up", lambda: pytest.fail("warm_up before the sink was opened"))
+    with pytest.raises(SystemExit):
+        batch.main([str(tmp_path), "--output", str(tmp_path / "out.parquet"), "--checkpoint", ""])
@@ -0,0 +1,82 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("langchain.chains")
+
+import chains
+import instrumentation
+from assistant import AssistantThreadPool
+from instrumentation import MetricsRecorder
+from prompts import assistant_prompt
+
+
+class SpanRecorder(MetricsRecorder):
+    def __init__(self):
+        super().__init__(path="")
+        self.spans = []
+
+    def emit(self, record):
+        super().emit(record)
+        self.spans.append(record)
+
+
+@pytest.fixture
+def spans(monkeypatch):
+    recorder = SpanRecorder()
+    monkeypatch.setattr(instrumentation, "recorder", recorder)
+    return recorder.spans
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    threads = SimpleNamespace(create=lambda: SimpleNamespace(id="thread_1"), delete=lambda thread_id: None)
+    pool = AssistantThreadPool(lambda: SimpleNamespace(beta=SimpleNamespace(threads=threads)))
+    monkeypatch.setattr(chains, "thread_pool", pool)
+    monkeypatch.setattr(chains, "get_openai_client", lambda: None)
+    monkeypatch.setattr(chains, "get_async_openai_client", lambda: None)
+    return pool
+
+
+INPUTS = {"business_category": "알 수 없음", "ocr_response": {"상호명": "복성각"}, "knn_response": None}
+REPLIES = ['{"판단": "간식비"}', '{"판단": "식비", "근거": "식당"}']
+
+
+def test_reask_counts_two_runs_and_records_fields(monkeypatch, spans, pool):
+    replies = list(REPLIES)
+    monkeypatch.setattr(chains.CategoryAssistantChain, "_ask", lambda self, client, thread_id, content: replies.pop(0))
+    outputs = chains.CategoryAssistantChain(prompt=assistant_prompt)._call(INPUTS)
+    assert outputs["assistant_response"] == '{"판단": "식비", "근거": "식당"}'
+    assert pool._idle == [("thread_1", 2)]
+    span, = [span for span in spans if span["stage"] == "openai.assistant"]
+    assert span["reask_fields"] == ["판단"]
+
+
+def test_async_reask_matches_sync_metrics(monkeypatch, spans, pool):
+    replies = list(REPLIES)
+
+    async def ask(self, client, thread_id, content):
+        return replies.pop(0)
+
+    monkeypatch.setattr(chains.CategoryAssistantChain, "_ask_async", ask)
+    outputs = asyncio.run(chains.CategoryAssistantChain(prompt=assistant_prompt)._acall(INPUTS))
+    assert outputs["assistant_response"] == '{"판단": "식비", "근거": "식당"}'
+    assert pool._idle == [("thread_1", 2)]
+    span, = [span for span in spans if span["stage"] == "openai.assistant"]
+    assert span["reask_fields"] == ["판단"]
+
+
+def test_ocr_failure_propagates_instead_of_becoming_a_response(monkeypatch):
+    def fail(image_path):
+        raise ConnectionError("OpenAI 연결 끊김")
+
+    async def fail_async(image_path):
+        fail(image_path)
+
+    monkeypatch.setattr(chains, "ocr_receipt_file", fail)
+    monkeypatch.setattr(chains, "ocr_receipt_file_async", fail_async)
+    with pytest.raises(ConnectionError):
+        chains.OCRChain().invoke({"image_path": "receipt.jpg"})
+    with pytest.raises(ConnectionError):
+        asyncio.run(chains.OCRChain().ainvoke({"image_path": "receipt.jpg"}))
@@ -0,0 +1,129 @@
+import time
+import sqlite3
+
+import pytest
+
+import dedup_store
+from dedup_store import DedupStore
+
+
+def test_claim_rejects_duplicate_keys(tmp_path):
+    store = DedupStore(path=str(tmp_path / "events.sqlite3"), ttl=60, max_entries=100)
+    assert store.claim("event:1", "file:1")
+    # 이벤트가 달라도 같은 파일이면 중복
+    assert not store.claim("event:2", "file:1")
+    assert "event:1" in store
+    assert store.stats() == {"claimed": 1, "duplicates": 1, "memory_entries": 2}
+
+
+def test_release_allows_claiming_again(tmp_path):
+    store = DedupStore(path=str(tmp_path / "events.sqlite3"), ttl=60, max_entries=100)
+    assert store.claim("file:1")
+    store.release("file:1")
+    assert "file:1" not in store
+    assert store.claim("file:1")
+
+
+def test_keys_survive_restart(tmp_path):
+    path = str(tmp_path / "events.sqlite3")
+    store = DedupStore(path=path, ttl=60, max_entries=100)
+    store.claim("event:1")
+    store.flush()
+    assert not DedupStore(path=path, ttl=60, max_entries=100).claim("event:1")
+
+
+def test_expired_keys_are_dropped(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(dedup_store.time, "time", lambda: now[0])
+    store = DedupStore(path=str(tmp_path / "events.sqlite3"), ttl=60, max_entries=100)
+    assert store.claim("event:1")
+    now[0] += 61
+    assert "event:1" not in store
+    assert store.claim("event:1")
+
+
+def test_memory_is_capped(tmp_path):
+    store = DedupStore(path=str(tmp_path / "events.sqlite3"), ttl=60, max_entries=3)
+    for i in range(5):
+        assert store.claim(f"event:{i}")
+    assert store.stats()["memory_entries"] == 3
+    assert "event:0" not in store
+    assert "event:4" in store
+
+
+class CountingConnection:
+    """sqlite3 연결을 감싸 실행한 SQL을 기록한다."""
+    def __init__(self, conn):
+        self.conn = conn
+        self.statements = []
+
+    def execute(self, sql, *args):
+        self.statements.append(sql)
+        return self.conn.execute(sql, *args)
+
+    def executemany(self, sql, rows):
+        self.statements.append(sql)
+        return self.conn.executemany(sql, rows)
+
+    def commit(self):
+        self.conn.commit()
+
+    def rollback(self):
+        self.conn.rollback()
+
+
+def rows(path):
+    with sqlite3.connect(path) as conn:
+        return sorted(key for key, in conn.execute("SELECT key FROM seen_keys"))
+
+
+def test_claim_does_not_touch_sqlite(tmp_path):
+    path = str(tmp_path / "events.sqlite3")
+    store = DedupStore(path=path, ttl=60, max_entries=100, flush_interval=3600)
+    store._conn = CountingConnection(store._conn)
+    assert store.claim("event:1", "file:1")
+    assert not store.claim("event:1")
+    store.release("file:1")
+    assert store._conn.statements == []
+    assert rows(path) == []
+    store.flush()
+    assert rows(path) == ["event:1"]
+
+
+def test_background_writer_flushes_claims(tmp_path):
+    path = str(tmp_path / "events.sqlite3")
+    store = DedupStore(path=path, ttl=60, max_entries=100, flush_interval=0.01)
+    store.claim("event:1")
+    deadline = time.time() + 5
+    while rows(path) != ["event:1"] and time.time() < deadline:
+        time.sleep(0.01)
+    assert rows(path) == ["event:1"]
+
+
+def test_release_after_claim_in_the_same_batch_is_not_written(tmp_path):
+    path = str(tmp_path / "events.sqlite3")
+    store = DedupStore(path=path, ttl=60, max_entries=100, flush_interval=3600)
+    store.claim("file:1")
+    store.flush()
+    store.release("file:1")
+    store.claim("file:2")
+    store.flush()
+    assert rows(path) == ["file:2"]
+
+
+def test_failed_flush_keeps_pending_changes(tmp_path):
+
+    class Failing(CountingConnection):
+        def executemany(self, sql, rows):
+            raise sqlite3.OperationalError("database is locked")
+
+    path = str(tmp_path / "events.sqlite3")
+    store = DedupStore(path=path, ttl=60, max_entries=100, flush_interval=3600)
+    conn = store._conn
+    store._conn = Failing(conn)
+    store.claim("event:1")
+    with pytest.raises(sqlite3.OperationalError):
+        store.flush()
+    store._conn = conn
+    store.flush()
+    assert rows(path) == ["event:1"]
@@ -0,0 +1,62 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("langchain.prompts")
+
+import clients
+import fused
+from receipt_schema import ReceiptValidationError
+
+REPLY = {
+    "상호명": "복성각", "날짜": "2024-03-05", "항목": [{"이름": "짜장면", "가격": 9000}],
+    "총액": 9000, "업종": "중식당", "판단": "식비", "근거": "식당 결제",
+}
+
+
+class FakeCompletions:
+    """정해 둔 응답을 차례로 돌려주는 OpenAI chat.completions (도구 호출 없음)."""
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.calls = []
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        message = SimpleNamespace(content=self.replies.pop(0), tool_calls=None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+@pytest.fixture
+def completions():
+    fake = FakeCompletions([])
+    clients.override_client("openai", SimpleNamespace(chat=SimpleNamespace(completions=fake)))
+    yield fake
+    clients.reset_clients()
+
+
+def reply(**fields):
+    return json.dumps({**REPLY, **fields}, ensure_ascii=False)
+
+
+def test_valid_reply_is_returned(completions):
+    completions.replies = [reply()]
+    result = fused.request_fused([fused.image_content("aGVsbG8=")], "지침")
+    assert result["errors"] == []
+    assert result["ocr_response"]["총액"] == 9000
+    assert result["decision"] == {"판단": "식비", "근거": "식당 결제"}
+
+
+def test_receipt_fields_still_invalid_after_reask_raise(completions):
+    completions.replies = [reply(날짜="어제"), json.dumps({"날짜": "모름"})]
+    with pytest.raises(ReceiptValidationError) as raised:
+        fused.request_fused([fused.image_content("aGVsbG8=")], "지침")
+    assert raised.value.fields == ["날짜"]
+    assert len(completions.calls) == 2
+
+
+def test_classification_errors_are_left_to_the_caller(completions):
+    completions.replies = [reply(판단="간식비"), json.dumps({"판단": "간식비"}, ensure_ascii=False)]
+    result = fused.request_fused([fused.image_content("aGVsbG8=")], "지침")
+    assert result["errors"] == ["판단"]
+    assert result["ocr_response"]["날짜"] == "2024-03-05"
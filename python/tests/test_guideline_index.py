@@ -0,0 +1,120 @@
+import hashlib
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+pytest.importorskip("faiss")
+
+import clients
+import guideline_index
+from guideline_index import EmbeddingCache, build_index, chunk_text, embed_texts
+
+
+class FakeEmbeddings:
+    """텍스트 해시로 정해지는 4차원 임베딩을 돌려주고 요청된 텍스트를 기록한다."""
+    def __init__(self):
+        self.inputs = []
+
+    def create(self, model, input):
+        self.inputs.append(list(input))
+        return SimpleNamespace(data=[SimpleNamespace(embedding=self.vector(text)) for text in input], usage=None)
+
+    @staticmethod
+    def vector(text):
+        digest = hashlib.sha256(text.encode("utf-8")).digest()
+        return [b + 1.0 for b in digest[:4]]
+
+
+@pytest.fixture
+def embeddings(monkeypatch):
+    fake = FakeEmbeddings()
+    clients.override_client("openai", SimpleNamespace(embeddings=fake))
+    monkeypatch.setattr(guideline_index, "_embedding_cache", EmbeddingCache(":memory:"))
+    yield fake
+    clients.reset_clients()
+
+
+@pytest.fixture
+def pdfs(tmp_path, monkeypatch):
+    """PDF 대신 텍스트 파일을 쓰고 split_pdf가 몇 번 불렸는지 센다."""
+    pdf_dir = tmp_path / "pdf"
+    pdf_dir.mkdir()
+    split = []
+
+    def split_pdf(path, chunk_size, chunk_overlap):
+        split.append(path)
+        with open(path, encoding="utf-8") as f:
+            return [{"source": path.split("/")[-1], "page": 1, "text": text}
+                    for text in chunk_text(f.read(), chunk_size, chunk_overlap)]
+
+    monkeypatch.setattr(guideline_index, "split_pdf", split_pdf)
+    return SimpleNamespace(dir=pdf_dir, split=split)
+
+
+def test_chunks_respect_size_and_overlap():
+    text = "\n".join(f"{index:02d}번째 줄입니다" for index in range(30))
+    chunks = chunk_text(text, chunk_size=40, chunk_overlap=10)
+    assert all(len(chunk) <= 40 for chunk in chunks)
+    for previous, current in zip(chunks, chunks[1:]):
+        assert current.startswith(previous[-10:])
+    assert "29번째 줄입니다" in chunks[-1]
+
+
+def test_long_lines_are_split_by_characters():
+    chunks = chunk_text("가" * 25, chunk_size=10, chunk_overlap=2)
+    assert chunks[0] == "가" * 10
+    assert all(len(chunk) <= 10 for chunk in chunks)
+    assert chunk_text("  \n\n ", chunk_size=10, chunk_overlap=2) == []
+
+
+def test_embedding_cache_skips_known_texts(embeddings):
+    first = embed_texts(["회의비", "식비"])
+    second = embed_texts(["식비", "교통비", "교통비"])
+    assert embeddings.inputs == [["회의비", "식비"], ["교통비"]]
+    np.testing.assert_allclose(first[1], second[0])
+    np.testing.assert_allclose(np.linalg.norm(second, axis=1), 1.0, rtol=1e-5)
+    assert guideline_index.get_embedding_cache().stats()["hits"] == 1
+
+
+def test_only_changed_pdfs_are_reindexed(tmp_path, pdfs, embeddings):
+    index_dir = str(tmp_path / "index")
+    (pdfs.dir / "a.pdf").write_text("회의비는 회의에 쓴 다과비", encoding="utf-8")
+    (pdfs.dir / "b.pdf").write_text("식비는 야근 식대", encoding="utf-8")
+
+    index, summary = build_index(str(pdfs.dir), index_dir)
+    assert summary["added"] == ["a.pdf", "b.pdf"]
+    assert len(index) == 2 and len(pdfs.split) == 2
+
+    pdfs.split.clear()
+    index, summary = build_index(str(pdfs.dir), index_dir)
+    assert summary["unchanged"] == ["a.pdf", "b.pdf"]
+    assert pdfs.split == []
+
+    (pdfs.dir / "b.pdf").write_text("식비는 출장 식대", encoding="utf-8")
+    (pdfs.dir / "a.pdf").unlink()
+    (pdfs.dir / "c.pdf").write_text("교통비는 택시비", encoding="utf-8")
+    requests = len(embeddings.inputs)
+    index, summary = build_index(str(pdfs.dir), index_dir)
+    assert (summary["added"], summary["changed"], summary["removed"]) == (["c.pdf"], ["b.pdf"], ["a.pdf"])
+    assert sorted(path.split("/")[-1] for path in pdfs.split) == ["b.pdf", "c.pdf"]
+    assert embeddings.inputs[requests:] == [["식비는 출장 식대", "교통비는 택시비"]]
+    assert sorted(chunk["source"] for chunk in index.chunks) == ["b.pdf", "c.pdf"]
+    score, chunk = index.search("교통비는 택시비", k=1)[0]
+    assert chunk["source"] == "c.pdf" and score == pytest.approx(1.0, abs=1e-5)
+
+
+def test_changed_settings_rebuild_every_pdf(tmp_path, pdfs, embeddings):
+    index_dir = str(tmp_path / "index")
+    (pdfs.dir / "a.pdf").write_text("회의비는 회의에 쓴 다과비", encoding="utf-8")
+    build_index(str(pdfs.dir), index_dir)
+    pdfs.split.clear()
+    _, summary = build_index(str(pdfs.dir), index_dir, chunk_size=500)
+    assert summary["added"] == ["a.pdf"]
+    assert len(pdfs.split) == 1
+
+
+def test_missing_pdf_folder_gives_an_empty_index(tmp_path, embeddings):
+    index, summary = build_index(str(tmp_path / "none"), str(tmp_path / "index"))
+    assert len(index) == 0
+    assert index.search("회의비") == []
@@ -0,0 +1,83 @@
+import json
+import time
+
+import instrumentation
+from instrumentation import MetricsRecorder, report
+
+
+def record(stage="ocr", seconds=1.0, **fields):
+    return {"stage": stage, "seconds": seconds, **fields}
+
+
+def read_lines(path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+def test_report_without_metrics_file_is_empty(tmp_path, capsys):
+    report(str(tmp_path / "missing.jsonl"))
+    assert "영수증 0건, 단계 기록 0건" in capsys.readouterr().out
+
+
+def test_report_reads_rotated_files(tmp_path, capsys):
+    path = tmp_path / "metrics.jsonl"
+    (tmp_path / "metrics.jsonl.1").write_text(json.dumps(record(receipt_id="a")) + "\n", encoding="utf-8")
+    path.write_text(json.dumps(record("notion", receipt_id="b")) + "\n", encoding="utf-8")
+    report(str(path))
+    output = capsys.readouterr().out
+    assert "영수증 2건, 단계 기록 2건" in output
+    assert "ocr" in output and "notion" in output
+
+
+def test_emit_buffers_until_flush(tmp_path):
+    path = tmp_path / "metrics.jsonl"
+    recorder = MetricsRecorder(path=str(path), flush_interval=60)
+    recorder.emit(record(prompt_tokens=10))
+    recorder.emit(record(prompt_tokens=5, error="boom"))
+    assert not path.exists()
+    recorder.flush()
+    assert [line["prompt_tokens"] for line in read_lines(path)] == [10, 5]
+    assert 'receipt_stage_errors_total{stage="ocr"} 1' in recorder.prometheus_text()
+    assert 'receipt_stage_prompt_tokens_total{stage="ocr"} 15' in recorder.prometheus_text()
+
+
+def test_full_buffer_is_written_by_the_background_thread(tmp_path, monkeypatch):
+    monkeypatch.setattr(instrumentation, "METRICS_BUFFER_SIZE", 3)
+    path = tmp_path / "metrics.jsonl"
+    recorder = MetricsRecorder(path=str(path), flush_interval=60)
+    for _ in range(3):
+        recorder.emit(record())
+    deadline = time.monotonic() + 5
+    while not path.exists() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(read_lines(path)) == 3
+
+
+def test_files_rotate_and_keep_only_backups(tmp_path):
+    path = tmp_path / "metrics.jsonl"
+    recorder = MetricsRecorder(path=str(path), flush_interval=60, max_bytes=1, backups=2)
+    for index in range(4):
+        recorder.emit(record(receipt_id=str(index)))
+        recorder.flush()
+    assert [line["receipt_id"] for line in read_lines(path)] == ["3"]
+    assert [line["receipt_id"] for line in read_lines(tmp_path / "metrics.jsonl.1")] == ["2"]
+    assert [line["receipt_id"] for line in read_lines(tmp_path / "metrics.jsonl.2")] == ["1"]
+    assert not (tmp_path / "metrics.jsonl.3").exists()
+
+
+def test_rotation_without_backups_starts_a_new_file(tmp_path):
+    path = tmp_path / "metrics.jsonl"
+    recorder = MetricsRecorder(path=str(path), flush_interval=60, max_bytes=1, backups=0)
+    recorder.emit(record(receipt_id="old"))
+    recorder.flush()
+    recorder.emit(record(receipt_id="new"))
+    recorder.flush()
+    assert [line["receipt_id"] for line in read_lines(path)] == ["new"]
+    assert list(tmp_path.iterdir()) == [path]
+
+
+def test_recorder_without_path_keeps_totals_only(tmp_path):
+    recorder = MetricsRecorder(path="")
+    recorder.emit(record())
+    recorder.flush()
+    assert 'receipt_stage_total{stage="ocr"} 1' in recorder.prometheus_text()
+    assert recorder._thread is None
@@ -0,0 +1,76 @@
+import sqlite3
+
+import pytest
+
+from merchant_cache import MerchantCategoryCache, candidate_keys, normalize_merchant_name
+
+
+@pytest.mark.parametrize("name, expected", [
+    ("(주)스타벅스 강남점", ["스타벅스 강남", "스타벅스"]),
+    ("이마트 서울역지점", ["이마트 서울역", "이마트"]),
+    ("스타벅스 본점", ["스타벅스"]),
+    # 지역명은 떼어 내지만 일반 단어는 남긴다
+    (" WAVEON  기장 ", ["waveon 기장", "waveon"]),
+    ("김밥 천국 역삼", ["김밥 천국 역삼", "김밥 천국"]),
+    ("김밥 천국", ["김밥 천국"]),
+    ("스타벅스 강남구 역삼동", ["스타벅스 강남구 역삼동", "스타벅스 강남구", "스타벅스"]),
+    # "점"으로 끝나는 업종 단어는 지점이 아니다
+    ("할매 분식점", ["할매 분식점"]),
+    ("학교 매점", ["학교 매점"]),
+    ("스타벅스", ["스타벅스"]),
+    ("", []),
+])
+def test_candidate_keys(name, expected):
+    assert candidate_keys(name) == expected
+
+
+def test_normalize_unifies_width_case_and_punctuation():
+    assert normalize_merchant_name("ＣＵ　편의점") == "cu 편의점"
+    assert normalize_merchant_name("Starbucks Co., Ltd.") == "starbucks"
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return MerchantCategoryCache(path=str(tmp_path / "merchants.sqlite3"), max_size=8)
+
+
+@pytest.mark.parametrize("stored, looked_up", [
+    ("waveon", "WAVEON 기장"),
+    ("스타벅스", "(주)스타벅스 강남점"),
+    ("스타벅스", "스타 벅스 역삼"),
+    ("스타벅스 강남", "스타 벅스 강남점"),
+])
+def test_variants_hit_stored_name(tmp_path, stored, looked_up):
+    cache = MerchantCategoryCache(path=str(tmp_path / "merchants.sqlite3"), max_size=8)
+    cache.put(stored, "카페", "검색 결과")
+    assert cache.get(looked_up) == ("카페", "검색 결과")
+    # 메모리 LRU를 비워도 SQLite에서 같은 결과를 찾는다
+    reopened = MerchantCategoryCache(path=cache.path, max_size=8)
+    assert reopened.get(looked_up) == ("카페", "검색 결과")
+
+
+def test_different_merchant_does_not_hit(cache):
+    cache.put("김밥", "분식")
+    assert cache.get("김밥 천국") is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_override_wins_and_invalidate_removes_spacing_variants(cache):
+    cache.override("스타벅스", "커피전문점")
+    cache.put("스타벅스", "카페")
+    assert cache.get("스타 벅스")[0] == "커피전문점"
+    cache.invalidate("스타 벅스")
+    assert cache.get("스타벅스") is None
+
+
+def test_old_database_gets_compact_column(tmp_path):
+    path = str(tmp_path / "merchants.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE merchant_category (key TEXT PRIMARY KEY, category TEXT NOT NULL, search_results TEXT,"
+        " overridden INTEGER NOT NULL DEFAULT 0, updated REAL NOT NULL)"
+    )
+    conn.execute("INSERT INTO merchant_category VALUES ('스타 벅스', '카페', NULL, 0, 0)")
+    conn.commit()
+    conn.close()
+    assert MerchantCategoryCache(path=path).get("스타벅스 역삼") == ("카페", None)
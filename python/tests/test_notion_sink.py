@@ -0,0 +1,168 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import clients
+import notion_sink
+import resilience
+from notion_sink import NotionWriter, NotionWriteTicket, TokenBucket
+
+RECEIPT = {"상호명": "복성각", "날짜": "2024-03-05", "항목": [{"이름": "짜장면", "가격": 9000}], "총액": 9000}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def test_token_bucket_allows_burst_then_waits(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(notion_sink.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(notion_sink.time, "sleep", clock.sleep)
+    bucket = TokenBucket(rate=3)
+    for _ in range(3):
+        bucket.acquire()
+    assert clock.sleeps == []
+    bucket.acquire()
+    assert clock.now == pytest.approx(1 / 3)
+
+
+def test_token_bucket_refills_up_to_capacity(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(notion_sink.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(notion_sink.time, "sleep", clock.sleep)
+    bucket = TokenBucket(rate=2, capacity=2)
+    bucket.acquire()
+    bucket.acquire()
+    clock.now += 10  # 오래 쉬어도 capacity개까지만 쌓인다
+    bucket.acquire()
+    bucket.acquire()
+    assert clock.sleeps == []
+    bucket.acquire()
+    assert sum(clock.sleeps) == pytest.approx(0.5)
+
+
+
+class NotionError(Exception):
+    def __init__(self, status, headers=None):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+        self.headers = headers or {}
+
+
+class FakeNotion:
+    """pages.create / databases.query / databases.retrieve / databases.update만 흉내 내는 Notion 클라이언트."""
+    def __init__(self, properties=("영수증해시",), errors=()):
+        self.pages = SimpleNamespace(create=self.create)
+        self.databases = SimpleNamespace(query=self.query, retrieve=self.retrieve, update=self.update)
+        self.properties = set(properties)
+        self.errors = list(errors)  # pages.create가 차례로 낼 예외
+        self.created = []
+
+    def create(self, **page):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.created.append(page)
+        return {"id": f"page_{len(self.created)}"}
+
+    def query(self, database_id, filter, page_size):
+        key = filter["rich_text"]["equals"]
+        return {"results": [
+            {"id": f"page_{index + 1}"} for index, page in enumerate(self.created)
+            if page["properties"].get(filter["property"], {}).get("rich_text", [{}])[0].get("text", {}).get("content") == key
+        ][:page_size]}
+
+    def retrieve(self, database_id):
+        return {"properties": {name: {} for name in self.properties}}
+
+    def update(self, database_id, properties):
+        self.properties.update(properties)
+
+
+@pytest.fixture
+def notion(monkeypatch):
+    fake = FakeNotion()
+    clients.override_client("notion", fake)
+    monkeypatch.setitem(resilience._breakers, "notion", resilience.CircuitBreaker("notion", 5, 30.0))
+    yield fake
+    clients.reset_clients()
+
+
+def make_writer(tmp_path, **kwargs):
+    kwargs.setdefault("dead_letter_path", str(tmp_path / "dead_letter.jsonl"))
+    return NotionWriter(rate=1000, flush_interval=0.01, **kwargs)
+
+
+def test_batches_are_capped_at_batch_size(tmp_path):
+    writer = make_writer(tmp_path, batch_size=2)
+    for key in ("a", "b", "c"):
+        writer._queue.put(NotionWriteTicket({}, key))
+    assert [ticket.key for ticket in writer._next_batch()] == ["a", "b"]
+    assert [ticket.key for ticket in writer._next_batch()] == ["c"]
+
+
+def test_same_receipt_in_one_batch_is_written_once(notion, tmp_path):
+    writer = make_writer(tmp_path)
+    writer.flush_interval = 0.2  # 두 요청이 같은 묶음에 들어가도록
+    first = writer.write(RECEIPT, "https://s3/a.jpg", "음식점", "회의비", key="same")
+    second = writer.write(RECEIPT, "https://s3/a.jpg", "음식점", "회의비", key="same")
+    assert second.wait(5) == "created"
+    assert first.wait(5) == "duplicate"
+    writer.close(5)
+    assert len(notion.created) == 1
+
+
+def test_receipt_already_in_notion_is_not_created_again(notion, tmp_path):
+    first = make_writer(tmp_path)
+    assert first.write(RECEIPT, "https://s3/a.jpg", "음식점", "회의비", key="hash").wait(5) == "created"
+    first.close(5)
+    # 재시작한 뒤 같은 영수증을 다시 저장해도 해시 속성으로 찾아 건너뛴다
+    second = make_writer(tmp_path)
+    ticket = second.write(RECEIPT, "https://s3/a.jpg", "음식점", "회의비", key="hash")
+    assert ticket.wait(5) == "duplicate"
+    assert ticket.page_id == "page_1"
+    second.close(5)
+    assert len(notion.created) == 1
+    assert notion.created[0]["properties"]["영수증해시"]["rich_text"][0]["text"]["content"] == "hash"
+
+
+def test_missing_hash_property_is_added_to_the_database(notion, tmp_path):
+    notion.properties.clear()
+    writer = make_writer(tmp_path)
+    assert writer.write(RECEIPT, "https://s3/a.jpg", "음식점", "회의비", key="hash").wait(5) == "created"
+    writer.close(5)
+    assert "영수증해시" in notion.properties
+    assert writer.hash_property == "영수증해시"
+
+
+def test_retry_after_is_respected_and_429_does_not_open_the_circuit(notion, tmp_path, monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(notion_sink.time, "sleep", sleeps.append)
+    notion.errors = [NotionError(429, {"retry-after": "7"}) for _ in range(6)]
+    writer = make_writer(tmp_path, max_retries=6)
+    response = writer._with_retry(lambda: notion.pages.create(properties={}))
+    assert response == {"id": "page_1"}
+    assert sleeps == [7.0] * 6
+    assert writer.stats["retries"] == 6
+    assert resilience._breakers["notion"].state == "closed"
+
+
+def test_failed_write_goes_to_dead_letter(notion, tmp_path):
+    notion.errors = [NotionError(400)]
+    writer = make_writer(tmp_path)
+    ticket = writer.write(RECEIPT, "https://s3/a.jpg", "음식점", "회의비", key="bad")
+    assert ticket.wait(5) == "failed"
+    writer.close(5)
+    records = [json.loads(line) for line in (tmp_path / "dead_letter.jsonl").read_text(encoding="utf-8").splitlines()]
+    assert [record["key"] for record in records] == ["bad"]
+    assert records[0]["page"]["properties"]["상호명"]["title"][0]["text"]["content"] == "복성각"
+    assert writer.stats["failed"] == 1
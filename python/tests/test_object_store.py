@@ -0,0 +1,100 @@
+import hashlib
+
+import boto3
+import pytest
+from moto import mock_aws
+
+import object_store
+from object_store import ReceiptObjectStore, content_key, make_transfer_config
+from utils import ReceiptFile
+
+BUCKET = "receipts-test"
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setattr(object_store, "S3_ENDPOINT_URL", None)
+    monkeypatch.setattr(object_store, "S3_REGION", "us-east-1")
+    with mock_aws():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+
+def make_store(client):
+    return ReceiptObjectStore(bucket=BUCKET, get_client=lambda: client)
+
+
+def test_content_key_uses_sha256_and_extension():
+    data = b"receipt"
+    digest = hashlib.sha256(data).hexdigest()
+    assert content_key(data, "IMAGE.JPG", prefix="receipts/") == f"receipts/{digest[:2]}/{digest}.jpg"
+    # 이름이 같아도 내용이 다르면 키가 다르다
+    assert content_key(b"other", "IMAGE.JPG") != content_key(data, "IMAGE.JPG")
+
+
+def test_put_uploads_once_and_skips_same_content(s3, tmp_path):
+    first = tmp_path / "image.jpg"
+    first.write_bytes(b"\xff\xd8 first receipt")
+    store = make_store(s3)
+
+    key, url = store.put(str(first), "image.jpg")
+    assert s3.get_object(Bucket=BUCKET, Key=key)["Body"].read() == first.read_bytes()
+    assert url == f"https://{BUCKET}.s3.us-east-1.amazonaws.com/{key}"
+    head = s3.head_object(Bucket=BUCKET, Key=key)
+    assert head["ContentType"] == "image/jpeg"
+    assert head["Metadata"]["original-name"] == "image.jpg"
+
+    again, _ = store.put(str(first), "copy.jpg")
+    assert again == key
+    assert store.stats["uploaded"] == 1
+    assert store.stats["skipped"] == 1
+    assert store.stats["bytes_skipped"] == len(first.read_bytes())
+
+
+def test_same_name_different_content_does_not_overwrite(s3, tmp_path):
+    first, second = tmp_path / "a.jpg", tmp_path / "b.jpg"
+    first.write_bytes(b"first")
+    second.write_bytes(b"second")
+    store = make_store(s3)
+
+    key_a, _ = store.put(str(first), "image.jpg")
+    key_b, _ = store.put(str(second), "image.jpg")
+    assert key_a != key_b
+    assert store.exists(key_a) and store.exists(key_b)
+    assert not store.exists("receipts/00/missing.jpg")
+
+
+def test_transfer_config_uses_multipart_for_large_files():
+    config = make_transfer_config()
+    assert config.multipart_threshold == 8 * 1024 * 1024
+    assert config.multipart_chunksize == 8 * 1024 * 1024
+    assert config.max_concurrency == 8
+    assert config.use_threads
+
+
+def test_spilled_and_path_sources_are_uploaded_without_reading_them_whole(s3, tmp_path, monkeypatch):
+    spilled = tmp_path / "spill.pdf"
+    spilled.write_bytes(b"%PDF-1.4 " + b"x" * 4096)
+    store = make_store(s3)
+    monkeypatch.setattr(ReceiptFile, "getvalue", lambda self: pytest.fail("read whole file"))
+
+    key, _ = store.put(ReceiptFile("receipt.pdf", path=str(spilled), is_pdf=True), "receipt.pdf")
+    assert s3.get_object(Bucket=BUCKET, Key=key)["Body"].read() == spilled.read_bytes()
+    assert key == content_key(spilled.read_bytes(), "receipt.pdf")
+    assert s3.head_object(Bucket=BUCKET, Key=key)["ContentType"] == "application/pdf"
+    assert store.stats["bytes_uploaded"] == spilled.stat().st_size
+
+
+def test_in_memory_receipt_is_uploaded(s3):
+    store = make_store(s3)
+    key, _ = store.put(ReceiptFile("a.jpg", data=b"\xff\xd8 memory"), "a.jpg")
+    assert s3.get_object(Bucket=BUCKET, Key=key)["Body"].read() == b"\xff\xd8 memory"
+
+
+def test_store_receipt_raises_when_upload_fails(s3, monkeypatch):
+    monkeypatch.setattr(object_store, "_store", ReceiptObjectStore(bucket="missing-bucket", get_client=lambda: s3))
+    with pytest.raises(Exception):
+        object_store.store_receipt(ReceiptFile("a.jpg", data=b"receipt"), "a.jpg")
@@ -0,0 +1,61 @@
+import pytest
+
+import ocr_cache
+from ocr_cache import OCRCache, make_cache_key
+
+RECEIPT = {"상호명": "복성각", "날짜": "2024-03-05", "항목": [{"이름": "짜장면", "가격": 9000}], "총액": 9000}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(ocr_cache.time, "time", lambda: now[0])
+    return now
+
+
+def test_key_depends_on_file_model_and_prompt():
+    key = make_cache_key(b"image", "gpt-4o", "prompt")
+    assert key == make_cache_key(b"image", "gpt-4o", "prompt")
+    assert key != make_cache_key(b"other", "gpt-4o", "prompt")
+    assert key != make_cache_key(b"image", "gpt-4o-mini", "prompt")
+    assert key != make_cache_key(b"image", "gpt-4o", "prompt v2")
+
+
+def test_hit_and_miss_counters(tmp_path):
+    cache = OCRCache(path=str(tmp_path / "ocr.sqlite3"), ttl=60, max_entries=10)
+    assert cache.get("a") is None
+    cache.put("a", RECEIPT)
+    assert cache.get("a") == RECEIPT
+    assert cache.get("a") == RECEIPT
+    assert cache.stats() == {"hits": 2, "misses": 1, "hit_rate": 2 / 3, "entries": 1}
+
+
+def test_entries_expire_after_ttl(tmp_path, clock):
+    cache = OCRCache(path=str(tmp_path / "ocr.sqlite3"), ttl=60, max_entries=10)
+    cache.put("a", RECEIPT)
+    clock[0] += 59
+    assert cache.get("a") == RECEIPT
+    clock[0] += 2  # 만든 시각 기준이므로 조회해도 연장되지 않는다
+    assert cache.get("a") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_entry_is_evicted(tmp_path, clock):
+    cache = OCRCache(path=str(tmp_path / "ocr.sqlite3"), ttl=3600, max_entries=2)
+    cache.put("a", RECEIPT)
+    clock[0] += 1
+    cache.put("b", RECEIPT)
+    clock[0] += 1
+    assert cache.get("a") == RECEIPT  # a를 최근에 썼으므로 b가 밀려난다
+    clock[0] += 1
+    cache.put("c", RECEIPT)
+    assert cache.get("b") is None
+    assert cache.get("a") == RECEIPT
+    assert cache.get("c") == RECEIPT
+    assert cache.stats()["entries"] == 2
+
+
+def test_cache_survives_reopen(tmp_path):
+    path = str(tmp_path / "ocr.sqlite3")
+    OCRCache(path=path).put("a", RECEIPT)
+    assert OCRCache(path=path).get("a") == RECEIPT
@@ -0,0 +1,47 @@
+from pdf_ingest import merge_page_results
+
+
+def test_merge_takes_first_merchant_and_date_and_last_total():
+    merged = merge_page_results([
+        {"상호명": "복성각", "날짜": "2024-03-05", "항목": [{"이름": "짜장면", "가격": 9000}], "총액": None},
+        None,
+        {"상호명": "다른 이름", "날짜": None, "항목": [{"이름": "탕수육", "가격": 20000}], "총액": 29000},
+    ])
+    assert merged == {
+        "상호명": "복성각",
+        "날짜": "2024-03-05",
+        "항목": [{"이름": "짜장면", "가격": 9000}, {"이름": "탕수육", "가격": 20000}],
+        "총액": 29000,
+    }
+
+
+def test_merge_fills_missing_total_from_items():
+    merged = merge_page_results([
+        {"상호명": "복성각", "항목": [{"이름": "짜장면", "가격": 9000}, {"이름": "메모", "가격": None}]},
+        {"항목": [{"이름": "군만두", "가격": 6000}]},
+    ])
+    assert merged["총액"] == 15000
+
+
+def test_merge_without_results_returns_none():
+    assert merge_page_results([None, "Error during OpenAI API call"]) is None
+
+
+def test_extract_pdf_text_closes_spilled_file(tmp_path, monkeypatch):
+    from PIL import Image
+    from pdf_ingest import extract_pdf_text
+    from utils import ReceiptFile
+
+    path = tmp_path / "receipt.pdf"
+    Image.new("RGB", (100, 100), "white").save(path, format="PDF")
+    receipt_file = ReceiptFile("receipt.pdf", path=str(path), is_pdf=True)
+    opened = []
+    original = ReceiptFile.open
+
+    def tracking_open(self):
+        opened.append(original(self))
+        return opened[-1]
+
+    monkeypatch.setattr(ReceiptFile, "open", tracking_open)
+    assert extract_pdf_text(receipt_file) == [""]
+    assert opened and opened[0].closed
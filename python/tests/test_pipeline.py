@@ -0,0 +1,56 @@
+import threading
+
+import pytest
+
+pytest.importorskip("langchain.chains")
+from langchain.llms.fake import FakeListLLM
+
+import pipeline
+from chains import CategoryAssistantChain, GuidelineCategoryChain
+
+
+@pytest.fixture(autouse=True)
+def fresh_chain():
+    pipeline.reset_receipt_chain()
+    yield
+    pipeline.reset_receipt_chain()
+
+
+def build(**kwargs):
+    return pipeline.build_receipt_chain(analysis_llm=FakeListLLM(responses=["음식점"]), use_knn=False, **kwargs)
+
+
+def test_empty_guideline_index_uses_the_assistant_backend(monkeypatch):
+    monkeypatch.setattr(pipeline, "get_guideline_index", lambda: [])
+    assert isinstance(build().chains[-1], CategoryAssistantChain)
+
+
+def test_guideline_backend_is_kept_when_the_index_has_chunks(monkeypatch):
+    monkeypatch.setattr(pipeline, "get_guideline_index", lambda: ["청크"])
+    assert isinstance(build().chains[-1], GuidelineCategoryChain)
+
+
+def test_receipt_during_warm_up_waits_for_the_backend_decision(monkeypatch):
+    """인덱스를 만드는 중에 들어온 영수증도 빈 인덱스로 지침 체인을 실행하지 않는다."""
+    building, release = threading.Event(), threading.Event()
+
+    def slow_empty_index():
+        building.set()
+        release.wait(5)
+        return []
+
+    monkeypatch.setattr(pipeline, "get_guideline_index", slow_empty_index)
+    original = pipeline.build_receipt_chain
+    monkeypatch.setattr(pipeline, "build_receipt_chain", lambda: original(analysis_llm=FakeListLLM(responses=["음식점"]), use_knn=False))
+    warm_up = threading.Thread(target=pipeline.warm_up)
+    warm_up.start()
+    assert building.wait(5)
+    chains = []
+    receipt = threading.Thread(target=lambda: chains.append(pipeline.get_receipt_chain()))
+    receipt.start()
+    receipt.join(0.1)
+    assert receipt.is_alive()  # 체인이 다 만들어질 때까지 기다린다
+    release.set()
+    warm_up.join(5)
+    receipt.join(5)
+    assert isinstance(chains[0].chains[-1], CategoryAssistantChain)
@@ -0,0 +1,158 @@
+from io import BytesIO
+
+import pytest
+from PIL import Image, ImageDraw, ImageFont
+
+import preprocess
+from text_parser import parse_receipt_text
+
+LINES = [
+    "MERCHANT NAME BOKSUNGGAK",
+    "DATE 05MAR2024",
+    "NOODLE KRW 9000",
+    "PORK KRW 20000",
+    "TOTAL AMOUNT KRW 29000",
+]
+EXPECTED = {
+    "상호명": "BOKSUNGGAK",
+    "날짜": "2024-03-05",
+    "항목": [{"이름": "NOODLE", "가격": 9000}, {"이름": "PORK", "가격": 20000}],
+    "총액": 29000,
+}
+ALPHABET = sorted(set("".join(LINES).replace(" ", "")))
+FONT_SIZE = 40
+PITCH = 36  # 글자마다 같은 간격으로 찍어 글자 사이가 항상 떨어지게 한다
+GLYPH_BOX = (24, 32)
+
+
+@pytest.fixture(scope="module")
+def font():
+    try:
+        return ImageFont.load_default(size=FONT_SIZE)
+    except (TypeError, ImportError, OSError):
+        pytest.skip("FreeType 기본 폰트가 없음")
+
+
+def _draw_line(draw, origin, text, font):
+    x, y = origin
+    for char in text:
+        if char != " ":
+            draw.text((x, y), char, fill=0, font=font)
+        x += PITCH
+
+
+def _receipt_photo(font):
+    """회색 책상 위에 놓인 흰 영수증을 찍은 것 같은 큰 사진."""
+    image = Image.new("RGB", (2400, 3200), (170, 165, 160))
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((500, 400, 1900, 2700), fill=(240, 240, 236))
+    for index, line in enumerate(LINES):
+        _draw_line(draw, (560, 500 + index * 120), line, font)
+    buffered = BytesIO()
+    image.save(buffered, format="JPEG", quality=95)
+    return buffered.getvalue()
+
+
+def _normalize(glyph):
+    return glyph.resize(GLYPH_BOX, Image.BILINEAR).tobytes()
+
+
+def _templates(font):
+    templates = {}
+    for char in ALPHABET:
+        image = Image.new("L", (FONT_SIZE * 2, FONT_SIZE * 2), 255)
+        ImageDraw.Draw(image).text((10, 10), char, fill=0, font=font)
+        glyph = image.crop(Image.eval(image, lambda v: 255 - v).getbbox())
+        templates[char] = (_normalize(glyph), glyph.width / glyph.height)
+    return templates
+
+
+def _runs(profile, min_length=1):
+    """profile에서 0이 아닌 구간들의 (시작, 끝)."""
+    runs, start = [], None
+    for index, value in enumerate(list(profile) + [0]):
+        if value and start is None:
+            start = index
+        elif not value and start is not None:
+            if index - start >= min_length:
+                runs.append((start, index))
+            start = None
+    return runs
+
+
+def _read_text(data, templates):
+    """
+    글자 틀 대조로 읽는 작은 판독기. 줄은 가로 투영, 글자는 세로 투영으로 나누고
+    글자 중심 간격이 가장 좁은 간격(고정 폭)의 1.5배를 넘으면 띄어쓰기로 본다.
+    """
+    with Image.open(BytesIO(data)) as image:
+        gray = image.convert("L")
+    ink = gray.point(lambda v: 255 if v < 150 else 0)
+    width, height = ink.size
+    pixels = ink.load()
+    rows = [sum(1 for x in range(width) if pixels[x, y]) for y in range(height)]
+    lines = []
+    for top, bottom in _runs(rows, min_length=3):
+        band = ink.crop((0, top, width, bottom))
+        band_pixels = band.load()
+        columns = [sum(1 for y in range(band.height) if band_pixels[x, y]) for x in range(width)]
+        glyphs = _runs(columns)
+        centers = [(left + right) / 2 for left, right in glyphs]
+        pitch = min((b - a for a, b in zip(centers, centers[1:])), default=0)
+        text, previous_center = "", None
+        for (left, right), center in zip(glyphs, centers):
+            if previous_center is not None and center - previous_center > pitch * 1.5:
+                text += " "
+            box = band.crop((left, 0, right, band.height)).getbbox()
+            glyph = gray.crop((left + box[0], top + box[1], left + box[2], top + box[3]))
+            sample, aspect = _normalize(glyph), glyph.width / glyph.height
+            text += min(templates, key=lambda char: (
+                sum(abs(a - b) for a, b in zip(sample, templates[char][0]))
+                + 2000 * abs(aspect - templates[char][1])
+            ))
+            previous_center = center
+        lines.append(text)
+    return "\n".join(lines)
+
+
+def test_fields_are_parsed_the_same_before_and_after_preprocessing(font):
+    photo = _receipt_photo(font)
+    templates = _templates(font)
+    data, stats = preprocess.preprocess_image_bytes(photo)
+
+    assert stats["bytes_after"] <= preprocess.TARGET_BYTES
+    before, _ = parse_receipt_text(_read_text(photo, templates))
+    after, confidence = parse_receipt_text(_read_text(data, templates))
+    assert before == EXPECTED
+    assert after == before
+    assert confidence == 1.0
+
+
+def test_receipt_is_cropped_and_shrunk(font):
+    data, _ = preprocess.preprocess_image_bytes(_receipt_photo(font))
+    with Image.open(BytesIO(data)) as image:
+        assert image.mode == "L"
+        assert max(image.size) <= preprocess.MAX_EDGE
+        # 용지 비율(1400x2300)에 여백만 조금 붙은 크기여야 한다
+        assert abs(image.width / image.height - 1400 / 2300) < 0.05
+
+
+def test_encode_jpeg_uses_at_most_three_probes(monkeypatch):
+    image = Image.effect_noise((800, 800), 64)
+    qualities = []
+    encode = preprocess._jpeg
+
+    def counting(image, quality):
+        qualities.append(quality)
+        return encode(image, quality)
+
+    monkeypatch.setattr(preprocess, "_jpeg", counting)
+    target = len(encode(image, 60)) + 1
+    data = preprocess.encode_jpeg(image, target_bytes=target)
+    assert len(qualities) <= 3
+    assert qualities[:2] == [preprocess.MAX_QUALITY, preprocess.MIN_QUALITY]
+    assert len(data) <= target
+
+    qualities.clear()
+    assert preprocess.encode_jpeg(image, target_bytes=10 ** 9) == encode(image, preprocess.MAX_QUALITY)
+    assert qualities == [preprocess.MAX_QUALITY]
@@ -0,0 +1,124 @@
+import numpy as np
+import pytest
+
+import receipt_knn
+from receipt_knn import KNN_MIN_VOTERS, ReceiptKnn
+from receipt_schema import CategoryDecision
+
+# 상호명마다 정해 둔 단위 벡터. 카페끼리, 식당끼리는 코사인 유사도가 0.9 이상이고 두 무리는 멀다
+DIRECTIONS = {
+    "카페 a": [1.0, 0.00, 0.0], "카페 b": [1.0, 0.10, 0.0], "카페 c": [1.0, 0.20, 0.0], "카페 d": [1.0, 0.15, 0.0], "카페 e": [1.0, 0.05, 0.0],
+    "식당 a": [0.0, 0.00, 1.0], "식당 b": [0.0, 0.10, 1.0], "식당 c": [0.0, 0.20, 1.0],
+    "먼 가게": [0.0, 1.00, 0.0],
+}
+
+
+def fake_embed_texts(texts, model=None):
+    vectors = np.array([DIRECTIONS[text.split(" | ")[0]] for text in texts], dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def receipt(name):
+    return {"상호명": name, "항목": [{"이름": "아메리카노" if name.startswith("카페") else "백반", "가격": 5000}]}
+
+
+@pytest.fixture
+def knn(monkeypatch):
+    monkeypatch.setattr(receipt_knn, "embed_texts", fake_embed_texts)
+    return ReceiptKnn(":memory:", k=5, threshold=0.8)
+
+
+def learn(knn, name, account, confirmed=False):
+    category = "카페" if name.startswith("카페") else "음식점"
+    knn.learn(receipt(name), category, CategoryDecision(account, f"{name} 판단"), confirmed=confirmed)
+
+
+def test_predict_votes_with_the_nearest_receipts(knn):
+    for name in ("카페 a", "카페 b", "카페 c"):
+        learn(knn, name, "회의비")
+    learn(knn, "식당 a", "식비")
+    _, _, prediction = knn.classify(receipt("카페 d"))
+    assert prediction.account == "회의비"
+    assert prediction.business_category == "카페"
+    assert prediction.support == 1.0 and prediction.confidence == pytest.approx(1.0)
+    assert [neighbour["text"].split(" | ")[0] for neighbour in prediction.neighbours] == ["카페 c", "카페 b", "카페 a"]
+    assert prediction.decision().account == "회의비"
+
+
+def test_too_few_voters_are_not_confident(knn):
+    for name in ("카페 a", "카페 b"):
+        learn(knn, name, "회의비")
+    _, _, prediction = knn.classify(receipt("카페 d"))
+    assert prediction is None
+    raw = knn.predict(knn.embed(receipt("카페 d"))[1])
+    assert raw.support == pytest.approx(2 / KNN_MIN_VOTERS)
+    assert not raw.confident()
+    assert knn.stats()["lookups"] == 1 and knn.stats()["hits"] == 0
+
+
+def test_split_votes_lower_the_confidence(knn):
+    learn(knn, "카페 a", "회의비")
+    learn(knn, "카페 b", "회의비")
+    learn(knn, "카페 c", "회의비")
+    learn(knn, "카페 e", "식비")
+    prediction = knn.predict(knn.embed(receipt("카페 d"))[1])
+    assert prediction.account == "회의비" and prediction.support == 1.0
+    assert 0.5 < prediction.confidence < 0.8
+    assert not prediction.confident(0.8)
+
+
+def test_distant_receipts_do_not_vote(knn):
+    for name in ("카페 a", "카페 b", "카페 c"):
+        learn(knn, name, "회의비")
+    assert knn.predict(knn.embed(receipt("먼 가게"))[1]) is None
+    assert knn.predict(knn.embed(receipt("식당 b"))[1]) is None
+
+
+def test_one_confirmed_neighbour_is_enough(knn):
+    knn.confirm(receipt("식당 a"), "음식점", "식비")
+    _, _, prediction = knn.classify(receipt("식당 b"))
+    assert prediction.account == "식비"
+    assert prediction.support == 1.0
+
+
+def test_confirmed_labels_are_not_overwritten_by_the_pipeline(knn):
+    knn.confirm(receipt("식당 a"), "음식점", "식비")
+    learn(knn, "식당 a", "회의비")
+    assert knn._labels[0]["account"] == "식비" and knn._labels[0]["confirmed"]
+    knn.confirm(receipt("식당 a"), "음식점", "회의비", reason="다시 확인")
+    assert knn._labels[0]["account"] == "회의비"
+    assert len(knn) == 1
+
+
+def test_undecided_judgements_are_not_learned(knn):
+    learn(knn, "카페 a", receipt_knn.UNDECIDED)
+    assert len(knn) == 0
+
+
+def test_learn_counts_accuracy_of_confident_predictions(knn):
+    for name in ("카페 a", "카페 b", "카페 c"):
+        learn(knn, name, "회의비")
+    learn(knn, "카페 d", "식비")
+    stats = knn.stats()
+    assert (stats["evaluated"], stats["correct"], stats["accuracy"]) == (1, 0, 0.0)
+
+
+def test_evaluate_leaves_each_receipt_out(knn):
+    for name in ("카페 a", "카페 b", "카페 c", "카페 d"):
+        learn(knn, name, "회의비")
+    for name in ("식당 a", "식당 b"):
+        learn(knn, name, "식비")
+    report = knn.evaluate(thresholds=(0.8,))
+    assert report["receipts"] == 6
+    level, = report["levels"]
+    # 카페 4건은 나머지 3건으로 맞히고, 식당 2건은 이웃이 1건뿐이라 건너뛰지 않는다
+    assert level == {"threshold": 0.8, "hit_rate": pytest.approx(4 / 6), "accuracy": 1.0}
+
+
+def test_labels_survive_a_restart(tmp_path, monkeypatch):
+    monkeypatch.setattr(receipt_knn, "embed_texts", fake_embed_texts)
+    path = str(tmp_path / "knn.sqlite3")
+    learn(ReceiptKnn(path), "카페 a", "회의비")
+    reopened = ReceiptKnn(path)
+    assert len(reopened) == 1
+    assert reopened.predict(reopened.embed(receipt("카페 b"))[1]).account == "회의비"
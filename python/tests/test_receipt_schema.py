@@ -0,0 +1,97 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import clients
+import utils
+from receipt_schema import JsonObjectScanner, ReceiptValidationError, extract_json, parse_fused
+
+RECEIPT = {"상호명": "복성각", "날짜": "2024-03-05", "항목": [{"이름": "짜장면", "가격": 9000}], "총액": 9000}
+
+
+class FakeCompletions:
+    """정해 둔 응답을 차례로 돌려주는 OpenAI chat.completions."""
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.calls = []
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        content = self.replies.pop(0)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=None)
+
+
+@pytest.fixture
+def completions():
+    fake = FakeCompletions([])
+    clients.override_client("openai", SimpleNamespace(chat=SimpleNamespace(completions=fake)))
+    yield fake
+    clients.reset_clients()
+
+
+def test_scanner_returns_objects_split_across_chunks():
+    scanner = JsonObjectScanner()
+    assert scanner.feed('설명 {"상호명": "복성') == []
+    assert scanner.feed('각", "항목": [{"이름": "짜장면"}]} 그리고 {"a"') == [
+        '{"상호명": "복성각", "항목": [{"이름": "짜장면"}]}'
+    ]
+    assert scanner.feed(': 1}') == ['{"a": 1}']
+
+
+def test_scanner_ignores_braces_and_escapes_inside_strings():
+    text = '{"근거": "중괄호 } 와 { 그리고 \\"따옴표\\"", "n": 1}'
+    objects = JsonObjectScanner().feed(text)
+    assert objects == [text]
+    assert json.loads(objects[0])["근거"] == '중괄호 } 와 { 그리고 "따옴표"'
+
+
+def test_extract_json_reads_code_block_with_trailing_comma():
+    assert extract_json('```json\n{"총액": 9000,}\n```') == {"총액": 9000}
+    assert extract_json("JSON 없음") is None
+
+
+def test_parse_fused_accepts_valid_response():
+    receipt, business_category, decision, errors = parse_fused({
+        "상호명": " 복성각 ", "날짜": "2024-03-05", "항목": [{"이름": "짜장면", "가격": "9,000원"}],
+        "총액": 9000, "업종": "중식당", "판단": "식비", "근거": "식당 결제",
+    })
+    assert errors == []
+    assert receipt.to_dict() == {"상호명": "복성각", "날짜": "2024-03-05", "항목": [{"이름": "짜장면", "가격": 9000}], "총액": 9000}
+    assert business_category == "중식당"
+    assert decision.to_dict() == {"판단": "식비", "근거": "식당 결제"}
+
+
+def test_parse_fused_reports_invalid_fields():
+    receipt, business_category, decision, errors = parse_fused({
+        "상호명": "복성각", "날짜": "언젠가", "항목": [], "총액": 9000, "업종": " ", "판단": "간식비", "근거": "",
+    })
+    assert business_category is None
+    assert decision.account is None
+    assert errors == ["날짜", "업종", "판단"]
+
+
+def test_fields_still_invalid_after_reask_raise(completions):
+    completions.replies = [
+        json.dumps({**RECEIPT, "상호명": " ", "날짜": "어제"}, ensure_ascii=False),
+        json.dumps({"상호명": "복성각", "날짜": "여전히 모름"}, ensure_ascii=False),
+    ]
+    with pytest.raises(ReceiptValidationError) as raised:
+        utils.request_receipt_ocr("aGVsbG8=")
+    assert raised.value.fields == ["날짜"]
+    assert "여전히 모름" in raised.value.response
+    assert len(completions.calls) == 2
+
+
+def test_response_without_json_raises(completions):
+    completions.replies = ["영수증이 아닙니다."]
+    with pytest.raises(ReceiptValidationError) as raised:
+        utils.request_receipt_ocr("aGVsbG8=")
+    assert raised.value.fields == ["상호명", "날짜", "항목", "총액"]
+
+
+def test_non_strict_request_returns_partial_receipt(completions):
+    """PDF 페이지 병합용 경로는 예외 대신 읽지 못한 필드를 None으로 돌려준다."""
+    completions.replies = [json.dumps({**RECEIPT, "날짜": "어제"}, ensure_ascii=False), "{}"]
+    result = utils.request_receipt_ocr("aGVsbG8=", strict=False)
+    assert result == {**RECEIPT, "날짜": None}
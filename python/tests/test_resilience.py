@@ -0,0 +1,167 @@
+import time
+import asyncio
+import threading
+
+import pytest
+
+import resilience
+from resilience import CircuitBreaker, CircuitOpenError, ServicePolicy, ServiceStats
+
+
+class HTTPError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+class Flaky:
+    """처음 errors만큼은 차례로 예외를 내고 그 뒤로는 result를 돌려주는 가짜 호출."""
+    def __init__(self, errors, result="ok"):
+        self.errors = list(errors)
+        self.result = result
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return self.result
+
+
+@pytest.fixture
+def service(monkeypatch):
+    """백오프 없이 재시도 2번, 연속 실패 3번에 열리는 시험용 서비스."""
+    policy = ServicePolicy("fake", timeout=1.0, max_retries=2, backoff=0, failure_threshold=3, reset_timeout=0.05)
+    monkeypatch.setitem(resilience.POLICIES, "fake", policy)
+    monkeypatch.setitem(resilience._breakers, "fake", CircuitBreaker("fake", 3, 0.05))
+    monkeypatch.setitem(resilience._stats, "fake", ServiceStats())
+    return "fake"
+
+
+def stats(service):
+    return resilience.service_stats()[service]
+
+
+def test_retryable_errors_are_retried_until_success(service):
+    func = Flaky([HTTPError(503), TimeoutError()])
+    assert resilience.call(service, func) == "ok"
+    assert func.calls == 3
+    assert stats(service)["retries"] == 2
+    assert stats(service)["timeouts"] == 1
+    assert stats(service)["circuit"] == "closed"
+
+
+def test_retries_are_limited(service):
+    func = Flaky([ConnectionError()] * 5)
+    with pytest.raises(ConnectionError):
+        resilience.call(service, func, retries=1)
+    assert func.calls == 2
+
+
+def test_client_errors_are_not_retried(service):
+    func = Flaky([HTTPError(400)])
+    with pytest.raises(HTTPError):
+        resilience.call(service, func)
+    assert func.calls == 1
+    assert stats(service)["retries"] == 0
+
+
+def test_async_call_retries_like_call(service):
+    errors = [HTTPError(502)]
+
+    async def func():
+        if errors:
+            raise errors.pop(0)
+        return "ok"
+
+    assert asyncio.run(resilience.call_async(service, func)) == "ok"
+    assert stats(service)["retries"] == 1
+
+
+def test_circuit_opens_and_short_circuits(service):
+    for _ in range(3):
+        with pytest.raises(HTTPError):
+            resilience.call(service, Flaky([HTTPError(500)]), retries=0)
+    assert stats(service)["circuit"] == "open"
+    func = Flaky([])
+    with pytest.raises(CircuitOpenError):
+        resilience.call(service, func)
+    assert func.calls == 0
+    assert stats(service)["short_circuits"] == 1
+
+
+def test_retries_stop_when_the_circuit_opens(service):
+    func = Flaky([HTTPError(500)] * 10)
+    with pytest.raises(HTTPError):
+        resilience.call(service, func, retries=5)
+    assert func.calls == 3
+
+
+def test_half_open_allows_one_trial_call(service):
+    breaker = resilience._breakers[service]
+    for _ in range(3):
+        breaker.on_failure()
+    time.sleep(0.06)
+    breaker.before_call()
+    assert breaker.state == "half_open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()  # 시험 호출이 끝나기 전의 다른 호출은 거절
+    breaker.on_success()
+    assert breaker.state == "closed"
+
+
+def test_failed_trial_reopens_the_circuit(service):
+    for _ in range(3):
+        with pytest.raises(HTTPError):
+            resilience.call(service, Flaky([HTTPError(500)]), retries=0)
+    time.sleep(0.06)
+    with pytest.raises(HTTPError):
+        resilience.call(service, Flaky([HTTPError(500)]), retries=0)
+    assert stats(service)["circuit"] == "open"
+    with pytest.raises(CircuitOpenError):
+        resilience.call(service, Flaky([]))
+
+
+def test_rate_limits_do_not_open_the_circuit(service):
+    func = Flaky([HTTPError(429)] * 2)
+    assert resilience.call(service, func) == "ok"
+    for _ in range(3):
+        with pytest.raises(HTTPError):
+            resilience.call(service, Flaky([HTTPError(429)]), retries=0)
+    assert stats(service)["circuit"] == "closed"
+    assert stats(service)["rate_limited"] == 5
+
+
+def test_hedged_call_returns_the_faster_request(service):
+    started = threading.Event()
+    calls = []
+
+    def func():
+        calls.append(1)
+        if len(calls) == 1:
+            started.set()
+            time.sleep(0.5)
+            return "slow"
+        return "fast"
+
+    assert resilience.hedged_call(service, func, delay=0.05) == "fast"
+    assert started.is_set()
+    assert stats(service)["hedged"] == 1
+    assert stats(service)["hedge_wins"] == 1
+
+
+def test_hedged_call_does_not_hedge_fast_requests(service):
+    func = Flaky([])
+    assert resilience.hedged_call(service, func, delay=1.0) == "ok"
+    assert func.calls == 1
+    assert stats(service)["hedged"] == 0
+
+
+def test_hedged_call_raises_when_both_requests_fail(service):
+    def func():
+        time.sleep(0.1)
+        raise HTTPError(400)
+
+    with pytest.raises(HTTPError):
+        resilience.hedged_call(service, func, delay=0.02)
+    assert stats(service)["hedged"] == 1
@@ -0,0 +1,59 @@
+import threading
+
+import pytest
+
+from scheduler import Stage, StageError, StageScheduler
+
+
+def test_runs_stages_in_dependency_order():
+    scheduler = StageScheduler([
+        Stage("download", lambda: 2),
+        Stage("ocr", lambda download: download * 10, inputs=["download"]),
+        Stage("upload", lambda download: f"url-{download}", inputs=["download"]),
+        Stage("notion", lambda ocr, upload: (ocr, upload), inputs=["ocr", "upload"]),
+    ])
+    results, timings = scheduler.run()
+    assert results["notion"] == (20, "url-2")
+    assert set(timings) == {"download", "ocr", "upload", "notion"}
+    path, seconds = scheduler.critical_path(timings)
+    assert path[0] == "download" and path[-1] == "notion"
+    assert seconds >= 0
+
+
+def test_independent_stages_run_concurrently():
+    barrier = threading.Barrier(2, timeout=5)
+    scheduler = StageScheduler([Stage("a", barrier.wait), Stage("b", barrier.wait)], max_workers=2)
+    results, _ = scheduler.run()
+    assert set(results) == {"a", "b"}
+
+
+def test_initial_results_skip_stages():
+    scheduler = StageScheduler([Stage("download", lambda: pytest.fail("실행되면 안 됨")),
+                                Stage("ocr", lambda download: download + "!", inputs=["download"])])
+    results, _ = scheduler.run(initial={"download": "file"})
+    assert results["ocr"] == "file!"
+
+
+def test_failure_stops_dependents():
+    ran = []
+
+    def fail():
+        raise RuntimeError("boom")
+
+    scheduler = StageScheduler([
+        Stage("ocr", fail),
+        Stage("notion", lambda ocr: ran.append(ocr), inputs=["ocr"]),
+    ])
+    with pytest.raises(StageError) as excinfo:
+        scheduler.run()
+    assert excinfo.value.stage == "ocr"
+    assert isinstance(excinfo.value.error, RuntimeError)
+    assert "ocr" in excinfo.value.timings
+    assert ran == []
+
+
+def test_rejects_unknown_inputs_and_cycles():
+    with pytest.raises(ValueError):
+        StageScheduler([Stage("ocr", lambda download: None, inputs=["download"])])
+    with pytest.raises(ValueError):
+        StageScheduler([Stage("a", lambda b: None, inputs=["b"]), Stage("b", lambda a: None, inputs=["a"])])
@@ -0,0 +1,53 @@
+import os
+
+import pytest
+
+pytest.importorskip("slack_bolt")
+# 앱 생성 시 토큰 확인(auth.test)을 하지 않도록 import 전에 설정한다
+os.environ.setdefault("SLACK-BOT", "xoxb-test")
+os.environ["SLACK-TOKEN-VERIFY"] = "0"
+
+import slack_noti
+from receipt_schema import ReceiptValidationError
+from scheduler import StageError
+
+
+class FakeDedupStore:
+    def __init__(self):
+        self.released = []
+
+    def release(self, *keys):
+        self.released.extend(keys)
+
+
+class FakeLogger:
+    def error(self, message):
+        pass
+
+
+@pytest.fixture
+def dedup_store(monkeypatch):
+    store = FakeDedupStore()
+    monkeypatch.setattr(slack_noti, "get_dedup_store", lambda: store)
+    return store
+
+
+def test_unreadable_receipt_is_reported_to_the_user(monkeypatch, dedup_store):
+    def run(file_id, say, logger, client):
+        raise StageError("chain", ReceiptValidationError(["날짜", "총액"], "{}"))
+
+    monkeypatch.setattr(slack_noti, "run_shared_file", run)
+    said = []
+    slack_noti.process_shared_file("F1", said.append, FakeLogger(), None)
+    assert said == ["영수증에서 날짜, 총액을(를) 읽지 못했습니다. 글자가 잘 보이도록 다시 찍어 올려 주세요."]
+    assert dedup_store.released == ["file:F1"]
+
+
+def test_other_stage_errors_keep_the_generic_message(monkeypatch, dedup_store):
+    def run(file_id, say, logger, client):
+        raise StageError("s3", RuntimeError("연결 끊김"))
+
+    monkeypatch.setattr(slack_noti, "run_shared_file", run)
+    said = []
+    slack_noti.process_shared_file("F1", said.append, FakeLogger(), None)
+    assert said == ["영수증 처리 중 오류가 발생했습니다 (s3): 연결 끊김"]
@@ -0,0 +1,41 @@
+from text_parser import parse_receipt_text
+
+RECEIPT = """
+가맹점명: (주)복성각
+거래일시: 2024.03.05 12:31
+짜장면            9,000원
+탕수육           20,000원
+부가세            2,636
+합계금액         29,000원
+카드번호 1234-****-****-5678
+"""
+
+
+def test_parse_full_receipt():
+    result, confidence = parse_receipt_text(RECEIPT)
+    assert result == {
+        "상호명": "복성각",
+        "날짜": "2024-03-05",
+        "항목": [{"이름": "짜장면", "가격": 9000}, {"이름": "탕수육", "가격": 20000}],
+        "총액": 29000,
+    }
+    assert confidence == 1.0
+
+
+def test_items_that_do_not_add_up_lower_confidence():
+    _, confidence = parse_receipt_text(RECEIPT.replace("20,000원", "19,000원"))
+    assert confidence == 0.9
+
+
+def test_receipt_without_items_scores_below_full():
+    result, confidence = parse_receipt_text("상호: 스타벅스\n2024년 3월 5일\n총액 4,500원")
+    assert result["항목"] == []
+    assert result["총액"] == 4500
+    assert confidence == 0.8
+
+
+def test_english_ticket_date():
+    result, _ = parse_receipt_text("Merchant Name KOREAN AIR\nDate 05MAR2024\nTotal Amount KRW 120,000")
+    assert result["상호명"] == "KOREAN AIR"
+    assert result["날짜"] == "2024-03-05"
+    assert result["총액"] == 120000
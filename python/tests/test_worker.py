@@ -0,0 +1,75 @@
+import threading
+
+import pytest
+
+from worker import QueueFullError, ReceiptWorkerPool
+
+
+def test_runs_jobs_and_reports_status():
+    messages = []
+    done = threading.Event()
+    pool = ReceiptWorkerPool(num_workers=1, max_queue_size=4)
+    pool.start()
+    job = pool.submit(lambda value: done.set() if value == "receipt" else None, "receipt", notify=messages.append)
+    assert done.wait(5)
+    pool.shutdown(drain=True, timeout=5)
+    assert job.status == "succeeded"
+    assert messages[0].startswith(f"영수증 처리 작업 #{job.job_id}이 대기열에 등록되었습니다.")
+    assert pool.stats == {"submitted": 1, "rejected": 0, "succeeded": 1, "failed": 0}
+
+
+def test_failed_job_is_reported():
+    messages = []
+    pool = ReceiptWorkerPool(num_workers=1)
+    pool.start()
+
+    def fail():
+        raise RuntimeError("boom")
+
+    job = pool.submit(fail, notify=messages.append)
+    pool.shutdown(drain=True, timeout=5)
+    assert job.status == "failed"
+    assert messages[-1] == f"영수증 처리 작업 #{job.job_id}이 실패했습니다: boom"
+    assert pool.stats["failed"] == 1
+
+
+def test_full_queue_raises_backpressure():
+    release = threading.Event()
+    started = threading.Event()
+    pool = ReceiptWorkerPool(num_workers=1, max_queue_size=1, enqueue_timeout=0.05)
+    pool.start()
+    pool.submit(lambda: (started.set(), release.wait(5)))
+    assert started.wait(5)  # 워커가 첫 작업을 잡고 있는 동안
+    pool.submit(lambda: None)  # 대기열 한 칸을 채운다
+    with pytest.raises(QueueFullError):
+        pool.submit(lambda: None)
+    assert pool.stats["rejected"] == 1
+    release.set()
+    pool.shutdown(drain=True, timeout=5)
+
+
+def test_submit_before_start_or_after_shutdown_is_rejected():
+    pool = ReceiptWorkerPool(num_workers=1)
+    with pytest.raises(QueueFullError):
+        pool.submit(lambda: None)
+    pool.start()
+    pool.shutdown(timeout=5)
+    with pytest.raises(QueueFullError):
+        pool.submit(lambda: None)
+
+
+@pytest.mark.parametrize("drain, expected", [(True, "succeeded"), (False, "cancelled")])
+def test_shutdown_drains_or_cancels_pending_jobs(drain, expected):
+    release = threading.Event()
+    started = threading.Event()
+    pool = ReceiptWorkerPool(num_workers=1, max_queue_size=4)
+    pool.start()
+    first = pool.submit(lambda: (started.set(), release.wait(5)))
+    assert started.wait(5)
+    pending = [pool.submit(lambda: None) for _ in range(2)]
+    # 워커가 첫 작업을 끝내기 전에 종료를 요청한다
+    threading.Timer(0.1, release.set).start()
+    pool.shutdown(drain=drain, timeout=5)
+    assert first.status == "succeeded"
+    assert [job.status for job in pending] == [expected, expected]
+    assert pool.pending() == 0
@@ -0,0 +1,131 @@
+import re
+
+
+_MONTHS = {
+    "JAN": 1, "FEB": 2, "MAR": 3, "APR": 4, "MAY": 5, "JUN": 6,
+    "JUL": 7, "AUG": 8, "SEP": 9, "OCT": 10, "NOV": 11, "DEC": 12,
+}
+
+# "가맹점명: 복성각", "가맹점명 / Merchant Name (주)대한항공", "상호 : 스타벅스" 등
+_MERCHANT_LINE = re.compile(
+    r"^\s*(?:가\s*맹\s*점\s*명|상\s*호\s*명|상\s*호|가\s*맹\s*점|판\s*매\s*자|merchant(?:\s*name)?)"
+    r"(?:\s*/\s*merchant(?:\s*name)?)?\s*(?:[:：]\s*|\s+)(?P<value>\S.*)$",
+    re.IGNORECASE,
+)
+_CORPORATE_PREFIX = re.compile(r"^\s*(?:\(주\)|㈜|주식회사)\s*")
+
+_DATE_PATTERNS = [
+    re.compile(r"(?P<y>20\d{2})\s*[-./]\s*(?P<m>\d{1,2})\s*[-./]\s*(?P<d>\d{1,2})"),
+    re.compile(r"(?P<y>20\d{2})\s*년\s*(?P<m>\d{1,2})\s*월\s*(?P<d>\d{1,2})\s*일"),
+    re.compile(r"(?P<d>\d{1,2})(?P<mon>JAN|FEB|MAR|APR|MAY|JUN|JUL|AUG|SEP|OCT|NOV|DEC)(?P<y>20\d{2})", re.IGNORECASE),
+]
+_DATE_LABEL = re.compile(r"일시|일자|날짜|date", re.IGNORECASE)
+
+# 우선순위 순서의 총액 표기
+_TOTAL_LABELS = [
+    re.compile(r"총\s*결\s*제\s*금\s*액|total\s*amount", re.IGNORECASE),
+    re.compile(r"합\s*계|총\s*액|총\s*금\s*액|받\s*을\s*금\s*액", re.IGNORECASE),
+    re.compile(r"승\s*인\s*금\s*액|결\s*제\s*금\s*액|total", re.IGNORECASE),
+]
+# 줄 끝의 금액: 천 단위 콤마가 있거나 원/KRW/₩ 표기가 있어야 금액으로 인정
+_AMOUNT = re.compile(
+    r"(?P<currency>KRW|₩|\\)?\s*(?P<number>\d{1,3}(?:,\d{3})+|\d+)\s*(?P<won>원)?\s*$",
+    re.IGNORECASE,
+)
+# 항목이 아닌 줄 (합계/결제/카드/세금 정보 등)
+_NOT_ITEM = re.compile(
+    r"총|합\s*계|금\s*액|결\s*제|지\s*불\s*수\s*단|승\s*인|부\s*가|과\s*세|면\s*세|공\s*급\s*가|카\s*드|할\s*부|번\s*호|"
+    r"전\s*화|사\s*업\s*자|거\s*스\s*름|받\s*을|받\s*은|payment|total|card|number|vat",
+    re.IGNORECASE,
+)
+
+
+def _parse_amount(line):
+    match = _AMOUNT.search(line)
+    if not match:
+        return None, None
+    number = match.group("number")
+    if "," not in number and not match.group("currency") and not match.group("won"):
+        return None, None
+    label = line[:match.start()].strip()
+    return int(number.replace(",", "")), label
+
+
+def parse_merchant(lines):
+    for line in lines:
+        match = _MERCHANT_LINE.match(line)
+        if match:
+            value = _CORPORATE_PREFIX.sub("", match.group("value")).strip()
+            if value:
+                return value
+    return None
+
+
+def parse_date(lines):
+    """
+    날짜 표기가 있는 줄을 먼저 보고, 없으면 전체에서 처음 나오는 날짜를 YYYY-MM-DD로 반환.
+    """
+    labeled = [line for line in lines if _DATE_LABEL.search(line)]
+    for line in labeled + lines:
+        for pattern in _DATE_PATTERNS:
+            match = pattern.search(line)
+            if not match:
+                continue
+            groups = match.groupdict()
+            month = _MONTHS[groups["mon"].upper()] if groups.get("mon") else int(groups["m"])
+            day = int(groups["d"])
+            if 1 <= month <= 12 and 1 <= day <= 31:
+                return f"{int(groups['y']):04d}-{month:02d}-{day:02d}"
+    return None
+
+
+def parse_total(lines):
+    for label_pattern in _TOTAL_LABELS:
+        for line in lines:
+            if label_pattern.search(line):
+                amount, _ = _parse_amount(line)
+                if amount is not None:
+                    return amount
+    return None
+
+
+def parse_items(lines):
+    items = []
+    for line in lines:
+        if _NOT_ITEM.search(line):
+            continue
+        amount, label = _parse_amount(line)
+        if amount is None or not label:
+            continue
+        # "지불운임 / Fare KRW" → "지불운임"
+        name = re.sub(r"\s*(KRW|₩|\\)\s*$", "", label, flags=re.IGNORECASE).split(" / ")[0].strip()
+        if re.search(r"[^\W\d_]", name):
+            items.append({"이름": name, "가격": amount})
+    return items
+
+
+def parse_receipt_text(text):
+    """
+    영수증 텍스트에서 상호명/날짜/항목/총액을 규칙 기반으로 추출.
+    Returns:
+        (dict, float): 추출된 영수증 정보와 0~1 사이의 신뢰도.
+            상호명 0.25, 날짜 0.25, 총액 0.3, 항목 0.2 (항목 합계가 총액과 다르면 0.1).
+    """
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    result = {
+        "상호명": parse_merchant(lines),
+        "날짜": parse_date(lines),
+        "항목": parse_items(lines),
+        "총액": parse_total(lines),
+    }
+    confidence = 0.0
+    if result["상호명"]:
+        confidence += 0.25
+    if result["날짜"]:
+        confidence += 0.25
+    if result["총액"] is not None:
+        confidence += 0.3
+    if result["항목"]:
+        items_total = sum(item["가격"] for item in result["항목"])
+        confidence += 0.2 if items_total == result["총액"] else 0.1
+    return result, round(confidence, 2)
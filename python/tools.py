@@ -1,10 +1,19 @@
 from langchain.tools import Tool
 from utils import search_with_google_api
+from async_utils import get_http_session, search_with_google_api_async
+
+
+async def search_snippets_async(query):
+    session = await get_http_session()
+    results = await search_with_google_api_async(session, query)
+    return "\n".join([x['snippet'] for x in results])
+
 
 search_tool = Tool(
     name = "SearchBusinessCategory",
     func = lambda query: "\n".join(
         list([x['snippet'] for x in search_with_google_api(query)])
     ),
-    description="상호명을 검색하여 관련 업종 정보를 제공합니다."
-)
\ No newline at end of file
+    description="상호명을 검색하여 관련 업종 정보를 제공합니다.",
+    coroutine = search_snippets_async,
+)
@@ -1,14 +1,18 @@
-import os, re, json, base64, openai, boto3, requests
+import os, base64, tempfile, requests
 from io import BytesIO
-from dotenv import load_dotenv
-from pdf2image import convert_from_path
-from googleapiclient.discovery import build
-from notion_client import Client
+import config  # .env는 config에서 한 번만 읽는다
 import urllib.parse
+from ocr_cache import get_ocr_cache, make_cache_key
+from instrumentation import stage, add, record_usage, cache_result
+from clients import get_openai_client, get_s3_client, get_notion_client, get_search_service
+from preprocess import PREPROCESS_ENABLED, preprocess_image, preprocess_image_bytes, preprocess_signature
+from resilience import POLICIES, RETRYABLE_STATUSES, call, hedged_call
+from receipt_schema import (
+    RECEIPT_FIELDS, RECEIPT_JSON_SCHEMA, ReceiptValidationError, extract_json, parse_receipt, receipt_errors, merge_fields,
+    reask_prompt,
+)
 
 
-load_dotenv('../.env')
-openai.api_key = os.getenv("OPEN-AI")
 GOOGLE_API_KEY = os.getenv("GOOGLE-SEARCH-API-KEY")
 SEARCH_ENGINE_ID = os.getenv("SEARCH-ENGINE-ID")
 NOTION_DATABASE_ID = os.getenv("NOTION-DB")
@@ -17,10 +21,31 @@ AWS_ACCESS_KEY = os.getenv("AWS-ACCESS-KEY")
 AWS_SECRET_KEY = os.getenv("AWS-SECRET-KEY")
 S3_BUCKET_NAME = os.getenv("S3-BUCKET-NAME")
 S3_REGION = os.getenv("S3-BUCKET-REGION")
+PDF_DPI = int(os.getenv("PDF-DPI", "150"))  # 영수증 글자를 읽기에 충분한 해상도
+SPOOL_MAX_BYTES = int(os.getenv("RECEIPT-SPOOL-MAX-BYTES", str(16 * 1024 * 1024)))  # 이보다 크면 임시 파일에 저장
+
+
+def slack_get(file_url, SLACK_BOT_TOKEN, stream=False):
+    """
+    Slack 파일 다운로드 요청. 타임아웃을 지정하고 연결 오류/429/5xx는 slack 정책에 따라 재시도한다.
+    """
+    policy = POLICIES["slack"]
+
+    def request():
+        response = requests.get(
+            file_url, headers={"Authorization": f"Bearer {SLACK_BOT_TOKEN}"}, stream=stream,
+            timeout=(policy.connect_timeout, policy.timeout),
+        )
+        if response.status_code in RETRYABLE_STATUSES:
+            response.close()
+            response.raise_for_status()
+        return response
+
+    return call("slack", request)
 
 
 def download_file(file_url, file_name, SLACK_BOT_TOKEN):   # 파일을 다운로드합니다
-    response = requests.get(file_url, headers={"Authorization": f"Bearer {SLACK_BOT_TOKEN}"})
+    response = slack_get(file_url, SLACK_BOT_TOKEN)
     if response.status_code == 200:
         # 파일을 저장합니다
         with open(file_name, "wb") as f:
@@ -30,10 +55,80 @@ def download_file(file_url, file_name, SLACK_BOT_TOKEN):   # 파일을 다운로
         return False
     
     
+class ReceiptFile:
+    """
+    메모리에 내려받은 영수증 파일. 크기가 spill 기준을 넘으면 임시 파일에 저장된다.
+    내용은 불변 bytes로 보관하므로 OCR, 해시, S3 업로드가 같은 버퍼를 복사 없이 동시에 읽을 수 있다.
+    """
+    def __init__(self, name, data=None, path=None, is_pdf=False):
+        self.name = name
+        self.data = data  # 메모리에 있을 때의 내용 (bytes)
+        self.path = path  # 임시 파일로 옮겨졌을 때의 경로
+        self.is_pdf = is_pdf
+        self.size = len(data) if data is not None else os.path.getsize(path)
+
+    def getvalue(self):
+        if self.data is not None:
+            return self.data
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def open(self):
+        """
+        독립된 읽기 스트림을 반환 (여러 스레드가 각자 위치를 가지고 읽을 수 있음).
+        bytes로 만든 BytesIO는 내용을 복사하지 않는다.
+        """
+        if self.data is not None:
+            return BytesIO(self.data)
+        return open(self.path, "rb")
+
+    def close(self):
+        if self.path is not None and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __str__(self):
+        return self.name
+
+
+def download_to_buffer(file_url, file_name, SLACK_BOT_TOKEN, spill_threshold=SPOOL_MAX_BYTES):
+    """
+    파일을 디스크에 저장하지 않고 조각 단위로 메모리에 내려받는다.
+    PDF 여부는 첫 조각의 시그니처로 판단하고, spill_threshold를 넘으면 나머지는 임시 파일에 쓴다.
+    Returns:
+        ReceiptFile: 다운로드한 파일. 200이 아닌 응답이면 None (연결 오류/타임아웃은 재시도 후 예외 발생).
+    """
+    response = slack_get(file_url, SLACK_BOT_TOKEN, stream=True)
+    if response.status_code != 200:
+        return None
+    chunks, size, is_pdf, spill = [], 0, None, None
+    try:
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+            if is_pdf is None:
+                is_pdf = chunk[:4] == b'%PDF'
+            size += len(chunk)
+            if spill is None and size > spill_threshold:
+                spill = tempfile.NamedTemporaryFile(prefix="receipt-", suffix=os.path.splitext(file_name)[1], delete=False)
+                spill.write(b"".join(chunks))
+                chunks = []
+            if spill is not None:
+                spill.write(chunk)
+            else:
+                chunks.append(chunk)
+    finally:
+        response.close()
+        if spill is not None:
+            spill.close()
+    if spill is not None:
+        return ReceiptFile(file_name, path=spill.name, is_pdf=bool(is_pdf))
+    return ReceiptFile(file_name, data=b"".join(chunks), is_pdf=bool(is_pdf))
+
+
 def is_pdf_by_signature(file_path):
     """
     파일의 첫 4바이트를 읽어 PDF Signature('%PDF')인지 확인.
     """
+    if isinstance(file_path, ReceiptFile):
+        return file_path.is_pdf
     try:
         with open(file_path, 'rb') as file:
             header = file.read(4)  # 첫 4바이트 읽기
@@ -44,19 +139,29 @@ def is_pdf_by_signature(file_path):
     
     
 def encode_image(image_path):
-    with open(image_path, "rb") as img_file:
-        return base64.b64encode(img_file.read()).decode('utf-8')
+    data = read_file_bytes(image_path)
+    if PREPROCESS_ENABLED:
+        # 회전 보정/자르기/축소/재압축으로 전송량을 줄인다
+        try:
+            data, _ = preprocess_image_bytes(data)
+        except Exception as e:
+            print(f"이미지 전처리 실패, 원본을 사용합니다: {e}")
+    return base64.b64encode(data).decode('utf-8')
     
     
 def pdf_to_image(file_path):
+    from pdf2image import convert_from_path  # PDF를 받을 때만 필요하므로 여기서 불러온다
     try:
-        image = convert_from_path(file_path, first_page=0, last_page=1)[0]
-        buffered = BytesIO()
-        image.save(buffered, format="JPEG")  # JPEG 포맷으로 저장
-        buffered.seek(0)
+        image = convert_from_path(file_path, first_page=0, last_page=1, dpi=PDF_DPI)[0]
+        if PREPROCESS_ENABLED:
+            data = preprocess_image(image)
+        else:
+            buffered = BytesIO()
+            image.save(buffered, format="JPEG")  # JPEG 포맷으로 저장
+            data = buffered.getvalue()
 
         # Base64 인코딩
-        base64_image = base64.b64encode(buffered.read()).decode('utf-8')
+        base64_image = base64.b64encode(data).decode('utf-8')
         return base64_image
     except Exception as e:
         print(e)
@@ -66,51 +171,21 @@ def pdf_to_image(file_path):
 def extract_json_from_string(input_string):
     """
     문자열에서 JSON 객체를 추출하여 Python dict로 변환.
+    중괄호 짝을 맞춰 찾으므로 앞뒤 설명이나 여러 JSON 블록이 섞여 있어도 첫 번째 객체만 정확히 꺼낸다.
     Args:
         input_string (str): 입력 문자열 (JSON 포함).
     Returns:
-        dict: 추출된 JSON 객체.
+        dict: 추출된 JSON 객체. 없으면 None.
     """
-    try:
-        # JSON 추출을 위한 정규식
-        json_match = re.search(r'\{.*\}', input_string, re.DOTALL)
-        if json_match:
-            json_str = json_match.group(0)  # JSON 부분만 추출
-            json_obj = json.loads(json_str)  # JSON 문자열을 Python dict로 변환
-            return json_obj
-        else:
-            raise ValueError("JSON 객체를 찾을 수 없습니다.")
-    except Exception as e:
-        print(f"오류 발생: {e}")
-        return None
+    json_obj = extract_json(input_string)
+    if json_obj is None:
+        print("오류 발생: JSON 객체를 찾을 수 없습니다.")
+    return json_obj
     
     
-def extract_receipt_info(image_path):
-    """
-    영수증 이미지를 ChatGPT로 분석하여 정보를 추출합니다.
-    
-    Args:
-        image_path (str): 영수증 이미지 파일 경로.
-    
-    Returns:
-        dict: 추출된 영수증 정보 (상호명, 날짜, 항목, 총액).
-    """
-    try:
-        # 이미지 파일 열기
-        if is_pdf_by_signature(image_path):
-            base64_image = pdf_to_image(image_path)
-        else:
-            base64_image = encode_image(image_path)
-        response = openai.chat.completions.create(
-            model="gpt-4o",  # GPT-4 Vision 모델 사용
-            messages=[
-                {"role": "system", "content": "You are an assistant that extracts information from receipt images."},
-                {
-                    "role": "user", 
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": '''다음 텍스트는 영수증의 정보입니다. 이 텍스트에서 가게 이름, 날짜, 항목, 총액을 분석하고, 아래의 JSON형식으로 결과를 반환해 주세요.
+OCR_MODEL = "gpt-4o"  # GPT-4 Vision 모델 사용
+OCR_SYSTEM_PROMPT = "You are an assistant that extracts information from receipt images."
+OCR_USER_PROMPT = '''다음 텍스트는 영수증의 정보입니다. 이 텍스트에서 가게 이름, 날짜, 항목, 총액을 분석하고, 아래의 JSON형식으로 결과를 반환해 주세요.
                             JSON 형식:
                             {
                                 "상호명": "가게 이름",
@@ -126,58 +201,231 @@ def extract_receipt_info(image_path):
                             """
                             [여기에 영수증의 텍스트 또는 OCR로 추출한 내용이 들어갑니다]
                             """
-                            결과:''' 
-                        },{
-                            "type": "image_url",
-                            "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"},
-                        }
-                    ],
-                },
+                            결과:'''
+OCR_TEXT_PLACEHOLDER = "[여기에 영수증의 텍스트 또는 OCR로 추출한 내용이 들어갑니다]"
+OCR_RESPONSE_FORMAT = os.getenv("OCR-RESPONSE-FORMAT", "json_schema")  # json_schema / json_object / text
+OCR_REASK = os.getenv("OCR-REASK", "1") != "0"  # 잘못된 필드만 다시 묻기
+
+
+def read_file_bytes(file_path):
+    if isinstance(file_path, ReceiptFile):
+        return file_path.getvalue()
+    with open(file_path, "rb") as f:
+        return f.read()
+
+
+def ocr_response_format():
+    """
+    OCR 요청의 response_format 인자. json_schema(기본)는 스키마에 맞는 JSON만 생성하도록 강제한다.
+    """
+    if OCR_RESPONSE_FORMAT == "json_schema":
+        return {"response_format": {
+            "type": "json_schema",
+            "json_schema": {"name": "receipt", "strict": True, "schema": RECEIPT_JSON_SCHEMA},
+        }}
+    if OCR_RESPONSE_FORMAT == "json_object":
+        return {"response_format": {"type": "json_object"}}
+    return {}
+
+
+def build_ocr_messages(base64_image):
+    return [
+        {"role": "system", "content": OCR_SYSTEM_PROMPT},
+        {
+            "role": "user", 
+            "content": [
+                {
+                    "type": "text",
+                    "text": OCR_USER_PROMPT
+                },{
+                    "type": "image_url",
+                    "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"},
+                }
             ],
-        )
-        # 응답 데이터 파싱
-        result = extract_json_from_string(response.choices[0].message.content)
-        return result
+        },
+    ]
+
+
+def build_text_ocr_messages(receipt_text):
+    return [
+        {"role": "system", "content": "You are an assistant that extracts information from receipt text."},
+        {"role": "user", "content": OCR_USER_PROMPT.replace(OCR_TEXT_PLACEHOLDER, receipt_text)},
+    ]
+
+
+def reask_messages(messages, content, fields):
+    """
+    직전 대화에 이어 잘못된 필드만 다시 묻는 메시지 목록.
+    """
+    return messages + [
+        {"role": "assistant", "content": content},
+        {"role": "user", "content": reask_prompt(fields)},
+    ]
+
+
+def request_receipt_json(messages, model, stage_name, bytes_sent, strict=True):
+    """
+    영수증 JSON을 요청하고 스키마로 검증/정규화한다. 잘못된 필드가 있으면 그 필드만 한 번 더 물어본다.
+    Args:
+        strict (bool): False이면 검증에 실패해도 예외 대신 일부 필드가 None인 결과(JSON이 없으면 None)를 반환한다.
+            PDF 페이지처럼 여러 결과를 합칠 때만 쓴다.
+    Returns:
+        dict: 검증을 통과한 영수증 정보.
+    Raises:
+        ReceiptValidationError: strict이고 응답에 JSON이 없거나 재질의 후에도 잘못된 필드가 남았을 때.
+    """
+    client = get_openai_client()
+    with stage(stage_name, bytes_sent=bytes_sent):
+        # 느린 요청은 OCR-HEDGE-DELAY가 지나면 한 번 더 보내 먼저 끝난 응답을 쓴다
+        response = hedged_call("openai", lambda: client.chat.completions.create(
+            model=model, messages=messages, **ocr_response_format(),
+        ))
+        record_usage(response.usage, model)
+        content = response.choices[0].message.content
+        data = extract_json(content)
+        if data is None:
+            print(f"OCR 응답에서 JSON을 찾을 수 없습니다: {content!r:.200}")
+            if strict:
+                raise ReceiptValidationError(RECEIPT_FIELDS, content)
+            return None
+        receipt, errors = parse_receipt(data)
+        if errors and OCR_REASK:
+            print(f"잘못된 필드만 다시 요청: {errors}")
+            add(reask_fields=errors)
+            response = call("openai", lambda: client.chat.completions.create(
+                model=model,
+                messages=reask_messages(messages, content, errors),
+                response_format={"type": "json_object"},
+            ))
+            record_usage(response.usage, model)
+            content = response.choices[0].message.content
+            receipt, errors = merge_fields(receipt, extract_json(content), errors)
+    if errors:
+        print(f"영수증 필드 검증 실패: {errors}")
+        if strict:
+            raise ReceiptValidationError(errors, content)
+    return receipt.to_dict()
+
+
+def request_receipt_ocr(base64_image, strict=True):
+    """
+    base64로 인코딩된 영수증 이미지를 gpt-4o에 보내 JSON 정보를 추출.
+    Returns:
+        dict: 추출된 영수증 정보.
+    Raises:
+        ReceiptValidationError: 필수 필드를 읽지 못했을 때 (strict일 때).
+    """
+    return request_receipt_json(build_ocr_messages(base64_image), OCR_MODEL, "openai.ocr", len(base64_image), strict)
+
+
+def request_receipt_text_ocr(receipt_text, model=OCR_MODEL):
+    """
+    PDF 텍스트 레이어 등 이미 추출된 영수증 텍스트에서 JSON 정보를 추출 (이미지 없이 텍스트만 전송).
+    """
+    return request_receipt_json(
+        build_text_ocr_messages(receipt_text), model, "openai.text_ocr", len(receipt_text.encode('utf-8')),
+    )
+
+
+def ocr_cache_key(image_path):
+    """
+    OCR 캐시 키. 파일 내용, 모델, 프롬프트, 전처리 설정이 모두 같아야 같은 키가 된다.
+    """
+    return make_cache_key(
+        read_file_bytes(image_path), OCR_MODEL,
+        OCR_SYSTEM_PROMPT + OCR_USER_PROMPT + preprocess_signature(),
+    )
+
+
+def ocr_receipt_file(image_path, use_cache=True):
+    """
+    영수증 파일(이미지 또는 PDF)을 OCR 하여 정보를 추출. 같은 파일은 캐시된 결과를 돌려준다.
+    Args:
+        image_path (str): 영수증 파일 경로.
+        use_cache (bool): 파일 해시 기반 OCR 캐시 사용 여부.
+    Returns:
+        dict: 추출된 영수증 정보 (상호명, 날짜, 항목, 총액).
+    Raises:
+        ReceiptValidationError: 필수 필드를 읽지 못했을 때.
+    """
+    cache = get_ocr_cache() if use_cache else None
+    if cache is not None:
+        key = ocr_cache_key(image_path)
+        cached = cache.get(key)
+        cache_result(cached is not None)
+        if cached is not None:
+            print(f"OCR 캐시 적중: {image_path}")
+            return cached
+    if is_pdf_by_signature(image_path):
+        # 순환 import를 피하기 위해 여기서 불러온다 (pdf_ingest가 utils를 사용)
+        from pdf_ingest import ocr_pdf
+        # 모든 페이지 처리 (텍스트 레이어가 있으면 이미지 변환 생략)
+        result = ocr_pdf(image_path)
+        # 페이지별 결과를 합친 뒤에 한 번만 검증한다
+        errors = receipt_errors(result) if result is not None else list(RECEIPT_FIELDS)
+        if errors:
+            raise ReceiptValidationError(errors)
+    else:
+        result = request_receipt_ocr(encode_image(image_path))
+    if cache is not None:
+        cache.put(key, result)
+    return result
+
+
+def extract_receipt_info(image_path):
+    """
+    영수증 이미지를 ChatGPT로 분석하여 정보를 추출합니다.
+    
+    Args:
+        image_path (str): 영수증 이미지 파일 경로.
     
+    Returns:
+        dict: 추출된 영수증 정보 (상호명, 날짜, 항목, 총액).
+    """
+    try:
+        return ocr_receipt_file(image_path)
     except Exception as e:
         print(f"오류 발생: {e}")
         return None
     
     
 def search_with_google_api(query, num_results=10):
+    """
+    Google Custom Search 결과를 [{"title", "snippet"}] 목록으로 반환.
+    Raises:
+        Exception: 재시도 후에도 실패하거나 서킷이 열려 있을 때 (오류 문자열을 결과처럼 돌려주지 않는다).
+    """
     api_key = GOOGLE_API_KEY  # Google API 키
     cse_id = SEARCH_ENGINE_ID   # Custom Search Engine ID
-    try:
-        service = build("customsearch", "v1", developerKey=api_key)
-        results = service.cse().list(q=query, cx=cse_id, num=num_results).execute()
-        items = results.get("items", [])
-        return [
-            {
-                "title": item["title"], "snippet": item.get("snippet")  # 본문 내용 추가
-            } 
-            for item in items
-            if item.get("snippet") is not None
-        ]
-    except Exception as e:
-        return f'Google Search API Error: {e}'
+    service = get_search_service()  # 스레드별로 한 번 만든 서비스 객체 재사용
+    with stage("google.search"):
+        results = call("search", lambda: service.cse().list(q=query, cx=cse_id, num=num_results).execute())
+    items = results.get("items", [])
+    return [
+        {
+            "title": item["title"], "snippet": item.get("snippet")  # 본문 내용 추가
+        } 
+        for item in items
+        if item.get("snippet") is not None
+    ]
     
     
 def upload_to_s3(file_path, file_name):
-    s3_client = boto3.client(
-        "s3",
-        aws_access_key_id=AWS_ACCESS_KEY,
-        aws_secret_access_key=AWS_SECRET_KEY,
-        region_name=S3_REGION,
-    )
+    s3_client = get_s3_client()
     try:
         encoded_file_name = urllib.parse.quote(file_name)
         # S3에 파일 업로드
-        s3_client.upload_file(
-            file_path, 
-            S3_BUCKET_NAME, 
-            file_name,
-            # ExtraArgs={"ACL": "public-read"}
-        )
+        if isinstance(file_path, ReceiptFile):
+            # 메모리 버퍼를 그대로 업로드 (디스크를 거치지 않음)
+            with file_path.open() as fileobj:
+                s3_client.upload_fileobj(fileobj, S3_BUCKET_NAME, file_name)
+        else:
+            s3_client.upload_file(
+                file_path, 
+                S3_BUCKET_NAME, 
+                file_name,
+                # ExtraArgs={"ACL": "public-read"}
+            )
         # S3 URL 생성
         file_url = f"https://{S3_BUCKET_NAME}.s3.{S3_REGION}.amazonaws.com/{encoded_file_name}"
         return file_url
@@ -186,7 +434,7 @@ def upload_to_s3(file_path, file_name):
         return None
     
 def add_receipt_to_notion_no_assistant(data, file_url, business_category):
-    notion = Client(auth=NOTION_API_KEY)
+    notion = get_notion_client()
     try:
         file_name = file_url.split("/")[-1]  # URL의 마지막 부분을 파일 이름으로 사용
         encoded_file_name = urllib.parse.quote(file_name)
@@ -230,45 +478,52 @@ def add_receipt_to_notion_no_assistant(data, file_url, business_category):
         
         
     
-def add_receipt_to_notion(data, file_url, business_category, account):
-    notion = Client(auth=NOTION_API_KEY)
-    try:
-        file_name = file_url.split("/")[-1]  # URL의 마지막 부분을 파일 이름으로 사용
-        encoded_file_name = urllib.parse.quote(file_name)
-        response = notion.pages.create(
-            parent={"database_id": NOTION_DATABASE_ID},
-            properties={
-                "상호명": {"title": [{"text": {"content": data["상호명"]}}]},
-                "날짜": {"date": {"start": data["날짜"]}},
-                "총액": {"number": data["총액"]},
-                "업종": {"rich_text": [{"text": {"content": business_category}}]},
-                "비목": {"rich_text": [{"text": {"content": account}}]},
-                "영수증": {
-                    "files": [
+def build_notion_receipt_page(data, file_url, business_category, account):
+    """
+    영수증 정보를 Notion pages.create 인자(dict)로 변환. 동기/비동기 저장에서 함께 사용한다.
+    """
+    file_name = file_url.split("/")[-1]  # URL의 마지막 부분을 파일 이름으로 사용
+    encoded_file_name = urllib.parse.quote(file_name)
+    return dict(
+        parent={"database_id": NOTION_DATABASE_ID},
+        properties={
+            "상호명": {"title": [{"text": {"content": data["상호명"]}}]},
+            "날짜": {"date": {"start": data["날짜"]}},
+            "총액": {"number": data["총액"]},
+            "업종": {"rich_text": [{"text": {"content": business_category}}]},
+            "비목": {"rich_text": [{"text": {"content": account}}]},
+            "영수증": {
+                "files": [
+                    {
+                        "type": "external", 
+                        "external": {"url": file_url},
+                        "name": encoded_file_name  # 파일 이름 설정
+                    }
+                ]
+            }
+        },
+        children=[
+            {
+                "object": "block",
+                "type": "bulleted_list_item",
+                "bulleted_list_item": {
+                    "rich_text": [
                         {
-                            "type": "external", 
-                            "external": {"url": file_url},
-                            "name": encoded_file_name  # 파일 이름 설정
+                            "type": "text", 
+                            "text": {"content": f"{item['이름']}: {item['가격']}원"}
                         }
                     ]
-                }
-            },
-            children=[
-                {
-                    "object": "block",
-                    "type": "bulleted_list_item",
-                    "bulleted_list_item": {
-                        "rich_text": [
-                            {
-                                "type": "text", 
-                                "text": {"content": f"{item['이름']}: {item['가격']}원"}
-                            }
-                        ]
-                    },
-                }
-                for item in data["항목"]
-            ]
-        )
+                },
+            }
+            for item in data["항목"]
+        ]
+    )
+
+
+def add_receipt_to_notion(data, file_url, business_category, account):
+    notion = get_notion_client()
+    try:
+        response = notion.pages.create(**build_notion_receipt_page(data, file_url, business_category, account))
         print("데이터가 성공적으로 Notion에 저장되었습니다:", response["id"])
     except Exception as e:
-        print("Notion 저장 오류:", e)
\ No newline at end of file
+        print("Notion 저장 오류:", e)
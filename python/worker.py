@@ -0,0 +1,133 @@
+import itertools
+import logging
+import queue
+import threading
+
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """
+    작업 대기열이 가득 차서 새 작업을 받을 수 없을 때 발생.
+    """
+
+
+class ReceiptJob:
+    """
+    워커 풀에서 처리할 단일 영수증 작업.
+    """
+    def __init__(self, job_id, func, args=(), kwargs=None, notify=None):
+        self.job_id = job_id
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs or {}
+        self.notify = notify  # 상태 메시지를 전달할 콜백 (예: Slack say)
+        self.status = "queued"
+
+    def report(self, message):
+        if self.notify is None:
+            return
+        try:
+            self.notify(message)
+        except Exception as e:
+            logger.warning(f"[job {self.job_id}] 상태 메시지 전송 실패: {e}")
+
+
+class ReceiptWorkerPool:
+    """
+    크기가 제한된 대기열과 고정된 수의 워커 스레드로 영수증 작업을 처리하는 풀.
+
+    Slack 리스너는 submit()으로 작업을 넣고 바로 ack 하며, 실제 처리는 워커 스레드에서 진행된다.
+    대기열이 가득 차면 enqueue_timeout 동안 기다린 뒤 QueueFullError를 발생시킨다 (backpressure).
+    """
+    def __init__(self, num_workers=4, max_queue_size=100, enqueue_timeout=1.0):
+        self.num_workers = num_workers
+        self.enqueue_timeout = enqueue_timeout
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._threads = []
+        self._job_ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._accepting = False
+        self.stats = {"submitted": 0, "rejected": 0, "succeeded": 0, "failed": 0}
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            self._accepting = True
+            for i in range(self.num_workers):
+                thread = threading.Thread(target=self._worker, name=f"receipt-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        logger.info(f"워커 풀 시작: workers={self.num_workers}, queue={self._queue.maxsize}")
+
+    def submit(self, func, *args, notify=None, **kwargs):
+        """
+        작업을 대기열에 추가하고 ReceiptJob을 반환.
+        Raises:
+            QueueFullError: 풀이 종료 중이거나 대기열이 가득 찬 경우.
+        """
+        if not self._accepting:
+            raise QueueFullError("워커 풀이 작업을 받지 않는 상태입니다.")
+        job = ReceiptJob(next(self._job_ids), func, args, kwargs, notify)
+        try:
+            self._queue.put(job, timeout=self.enqueue_timeout)
+        except queue.Full:
+            with self._lock:
+                self.stats["rejected"] += 1
+            raise QueueFullError(f"대기열이 가득 찼습니다 (최대 {self._queue.maxsize}건).")
+        with self._lock:
+            self.stats["submitted"] += 1
+        position = self._queue.qsize()
+        job.report(f"영수증 처리 작업 #{job.job_id}이 대기열에 등록되었습니다. (대기 {position}건)")
+        return job
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            if job is None:  # 종료 신호
+                self._queue.task_done()
+                return
+            job.status = "running"
+            try:
+                job.func(*job.args, **job.kwargs)
+                job.status = "succeeded"
+            except Exception as e:
+                job.status = "failed"
+                logger.exception(f"[job {job.job_id}] 처리 중 오류 발생: {e}")
+                job.report(f"영수증 처리 작업 #{job.job_id}이 실패했습니다: {e}")
+            finally:
+                with self._lock:
+                    self.stats[job.status] += 1
+                self._queue.task_done()
+
+    def shutdown(self, drain=True, timeout=None):
+        """
+        새 작업을 받지 않고 워커를 종료.
+        Args:
+            drain (bool): True이면 대기 중인 작업을 모두 처리한 뒤 종료, False이면 대기 작업을 버림.
+            timeout (float): 각 워커 스레드 종료를 기다리는 최대 시간(초).
+        """
+        with self._lock:
+            self._accepting = False
+            threads = list(self._threads)
+        if not drain:
+            try:
+                while True:
+                    job = self._queue.get_nowait()
+                    job.status = "cancelled"
+                    self._queue.task_done()
+            except queue.Empty:
+                pass
+        logger.info(f"워커 풀 종료 중: 남은 작업 {self._queue.qsize()}건")
+        for _ in threads:
+            self._queue.put(None)
+        for thread in threads:
+            thread.join(timeout)
+        with self._lock:
+            self._threads = []
+        logger.info(f"워커 풀 종료: {self.stats}")